@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import logging
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever parser, OCR or prompt changes should invalidate cached results.
+PIPELINE_VERSION = "8"
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / "extraction_cache.sqlite3"
+
+
+def cache_key(*parts: Any) -> str:
+    """Stable SHA-256 over JSON-serializable key parts."""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def pipeline_config() -> Dict[str, str]:
+    """Settings that change what extract() returns for the same bytes."""
+    return {
+        "version": PIPELINE_VERSION,
+        "genai_provider": os.getenv("GENAI_PROVIDER", ""),
+        "openai_model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        "vision_max_pages": os.getenv("VISION_MAX_PAGES", "3"),
+        "llm_skip_coverage": os.getenv("LLM_SKIP_COVERAGE", "0.9"),
+    }
+
+
+class ExtractionCache:
+    """
+    Persistent, size-bounded LRU cache in a local SQLite file.
+
+    Entries are grouped by namespace ("result", "ocr", "tables", "llm", ...) and
+    hit/miss counters are kept per namespace in the same file, so they survive
+    restarts and are shared by every worker process. A connection is opened per
+    call, which keeps the cache safe to use after fork. Entries may carry a TTL;
+    callers can also record tokens a hit saved (see record_savings).
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes: int = 512 * 1024 * 1024, enabled: bool = True):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,"
+                " size INTEGER NOT NULL, last_access REAL NOT NULL, expires_at REAL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                " namespace TEXT PRIMARY KEY, hits INTEGER NOT NULL DEFAULT 0, misses INTEGER NOT NULL DEFAULT 0,"
+                " saved_input_tokens INTEGER NOT NULL DEFAULT 0, saved_output_tokens INTEGER NOT NULL DEFAULT 0)"
+            )
+            # files created before TTLs and savings were tracked
+            self._add_column(conn, "entries", "expires_at", "REAL")
+            self._add_column(conn, "stats", "saved_input_tokens", "INTEGER NOT NULL DEFAULT 0")
+            self._add_column(conn, "stats", "saved_output_tokens", "INTEGER NOT NULL DEFAULT 0")
+            self._ready = True
+        return conn
+
+    def _add_column(self, conn, table: str, column: str, decl: str):
+        if column not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+    def _count(self, conn, namespace: str, column: str):
+        conn.execute("INSERT OR IGNORE INTO stats (namespace) VALUES (?)", (namespace,))
+        conn.execute(f"UPDATE stats SET {column} = {column} + 1 WHERE namespace = ?", (namespace,))
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                now = time.time()
+                if row is not None and row[1] is not None and row[1] < now:
+                    conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+                    row = None
+                if row is None:
+                    self._count(conn, namespace, "misses")
+                    return None
+                conn.execute(
+                    "UPDATE entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key),
+                )
+                self._count(conn, namespace, "hits")
+                return pickle.loads(row[0])
+        except Exception as e:
+            logger.warning("extraction cache get failed (%s/%s): %s", namespace, key[:12], e)
+            return None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        """Store `value`; with `ttl` (seconds) it expires after that long."""
+        if not self.enabled or value is None:
+            return
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            now = time.time()
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (namespace, key, value, size, last_access, expires_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (namespace, key, blob, len(blob), now, now + ttl if ttl else None),
+                )
+                self._evict(conn)
+        except Exception as e:
+            logger.warning("extraction cache set failed (%s/%s): %s", namespace, key[:12], e)
+
+    def record_savings(self, namespace: str, input_tokens: int, output_tokens: int):
+        """Add the tokens a cache hit avoided sending/generating to the namespace counters."""
+        if not self.enabled:
+            return
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("INSERT OR IGNORE INTO stats (namespace) VALUES (?)", (namespace,))
+                conn.execute(
+                    "UPDATE stats SET saved_input_tokens = saved_input_tokens + ?,"
+                    " saved_output_tokens = saved_output_tokens + ? WHERE namespace = ?",
+                    (int(input_tokens or 0), int(output_tokens or 0), namespace),
+                )
+        except Exception as e:
+            logger.warning("extraction cache savings update failed (%s): %s", namespace, e)
+
+    def _evict(self, conn):
+        conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        doomed = []
+        for namespace, key, size in conn.execute(
+            "SELECT namespace, key, size FROM entries ORDER BY last_access"
+        ):
+            doomed.append((namespace, key))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", doomed)
+
+    def get_or_compute(self, namespace: str, key: str, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        value = self.get(namespace, key)
+        if value is None:
+            value = compute()
+            self.set(namespace, key, value, ttl=ttl)
+        return value
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with closing(self._connect()) as conn:
+            out = {
+                ns: {"hits": hits, "misses": misses, "entries": 0, "bytes": 0,
+                     "saved_input_tokens": saved_in, "saved_output_tokens": saved_out}
+                for ns, hits, misses, saved_in, saved_out in conn.execute(
+                    "SELECT namespace, hits, misses, saved_input_tokens, saved_output_tokens FROM stats"
+                )
+            }
+            for ns, n, size in conn.execute(
+                "SELECT namespace, COUNT(*), SUM(size) FROM entries GROUP BY namespace"
+            ):
+                out.setdefault(ns, {"hits": 0, "misses": 0, "saved_input_tokens": 0, "saved_output_tokens": 0})
+                out[ns].update(entries=n, bytes=size)
+        return out
+
+    def clear(self, namespace: Optional[str] = None):
+        with closing(self._connect()) as conn, conn:
+            if namespace:
+                conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+                conn.execute("DELETE FROM stats WHERE namespace = ?", (namespace,))
+            else:
+                conn.execute("DELETE FROM entries")
+                conn.execute("DELETE FROM stats")
+
+
+_cache: Optional[ExtractionCache] = None
+
+
+def get_cache() -> ExtractionCache:
+    """Process-wide cache configured from EXTRACTION_CACHE / _PATH / _MAX_MB."""
+    global _cache
+    if _cache is None:
+        _cache = ExtractionCache(
+            path=os.getenv("EXTRACTION_CACHE_PATH", str(DEFAULT_PATH)),
+            max_bytes=int(os.getenv("EXTRACTION_CACHE_MAX_MB", "512")) * 1024 * 1024,
+            enabled=os.getenv("EXTRACTION_CACHE", "1") != "0",
+        )
+    return _cache
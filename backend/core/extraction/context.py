@@ -0,0 +1,124 @@
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import fitz
+
+from .cache import file_sha256
+
+
+@dataclass(frozen=True)
+class PageText:
+    """Text of one page as streamed to consumers; source is "native", "ocr" or "mixed"."""
+    page: int
+    text: str
+    source: str = "native"
+
+
+class PdfContext:
+    """
+    One open PyMuPDF document shared by every extraction stage.
+
+    Pages and their native text, words, blocks and pixmaps are loaded lazily and
+    cached, so parsers, OCR and the LLM layer never re-open or re-parse the file.
+    Page text is small and kept for every page; page objects, words, blocks and
+    drawings are kept for the most recent `page_cache_size` pages and pixmaps for
+    the most recent `pixmap_cache_size`, so memory stays flat on long documents.
+    Consumers that read the whole document stream it with iter_text().
+    """
+
+    def __init__(self, path: str, pixmap_cache_size: int = 4, page_cache_size: int = 32):
+        self.path = path
+        self.doc = fitz.open(path)
+        self.pixmap_cache_size = pixmap_cache_size
+        self.page_cache_size = page_cache_size
+        self._pages = OrderedDict()
+        self._text = {}
+        self._words = OrderedDict()
+        self._blocks = OrderedDict()
+        self._images = {}
+        self._drawings = OrderedDict()
+        self._pixmaps = OrderedDict()
+        # OCR words keyed by (page, dpi, lang); filled by ocr.ocr_pages / ocr_words_for_page
+        self.ocr_words = {}
+        # per-page OCR diagnostics {"psm", "conf", "passes"}, same keys as ocr_words
+        self.ocr_meta = {}
+        self._sha256 = None
+        # stages whose cached artifacts must be recomputed (see pipeline.extract)
+        self.refresh = frozenset()
+        # wall seconds spent per pipeline stage, accumulated by timed()
+        self.timings = {}
+
+    @contextmanager
+    def timed(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - t0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.doc)
+
+    def close(self):
+        self._pages.clear()
+        self._pixmaps.clear()
+        self.doc.close()
+
+    @property
+    def sha256(self) -> str:
+        """Content hash of the file, used to key the extraction cache."""
+        if self._sha256 is None:
+            self._sha256 = file_sha256(self.path)
+        return self._sha256
+
+    def _lru(self, cache: OrderedDict, key, load, size: int):
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        value = cache[key] = load()
+        while len(cache) > size:
+            cache.popitem(last=False)
+        return value
+
+    def page(self, i: int) -> fitz.Page:
+        return self._lru(self._pages, i, lambda: self.doc[i], self.page_cache_size)
+
+    def text(self, i: int) -> str:
+        if i not in self._text:
+            self._text[i] = self.page(i).get_text("text") or ""
+        return self._text[i]
+
+    def words(self, i: int):
+        return self._lru(self._words, i, lambda: self.page(i).get_text("words") or [], self.page_cache_size)
+
+    def blocks(self, i: int):
+        return self._lru(self._blocks, i, lambda: self.page(i).get_text("blocks") or [], self.page_cache_size)
+
+    def images(self, i: int):
+        """Bounding boxes of images drawn on the page."""
+        if i not in self._images:
+            self._images[i] = [info["bbox"] for info in self.page(i).get_image_info()]
+        return self._images[i]
+
+    def drawings(self, i: int):
+        """Vector paths on the page (used to spot table ruling lines)."""
+        return self._lru(self._drawings, i, lambda: self.page(i).get_drawings(), self.page_cache_size)
+
+    def pixmap(self, i: int, dpi: int = 400) -> fitz.Pixmap:
+        return self._lru(self._pixmaps, (i, dpi), lambda: self.page(i).get_pixmap(dpi=dpi), self.pixmap_cache_size)
+
+    def iter_text(self):
+        """PageText records for every page, native PyMuPDF text, in page order."""
+        for i in range(len(self)):
+            yield PageText(i, self.text(i))
+
+    def fulltext(self) -> str:
+        return "\n".join(r.text for r in self.iter_text())
@@ -1,29 +1,105 @@
 import os
 import re
 import json
+import asyncio
 import logging
 import base64
+import hashlib
 from typing import Any, Dict, List, Optional, Union
 
-import fitz  
-from openai import OpenAI
+import fitz
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
 
-logger = logging.getLogger(__name__)
+from .context import PageText, PdfContext
+from .ocr import iter_page_texts
+from .cache import PIPELINE_VERSION, cache_key, get_cache
+from .llm import _CHARS_PER_TOKEN, get_llm
 
-def _page_png_b64(path: str, page_idx: int, dpi: int = 220) -> str:
-    doc = fitz.open(path)
-    pix = doc[page_idx].get_pixmap(dpi=dpi)
-    bts = bytes(pix.tobytes("png"))
-    return "data:image/png;base64," + base64.b64encode(bts).decode("ascii")
+logger = logging.getLogger(__name__)
 
-def call_openai_vision_on_pdf(path: str, max_pages: int = 3) -> Dict[str, Any]:
-    client = OpenAI()
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")  
+# map-reduce text mode: chunk size in (estimated) tokens and concurrent chunk calls
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "12000"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+
+# vision mode: target image size (the API downsizes high-detail images to a 768 px
+# short side within 2048 px anyway) and per-image byte cap
+VISION_SHORT_SIDE = int(os.getenv("VISION_SHORT_SIDE", "768"))
+VISION_LONG_SIDE = int(os.getenv("VISION_LONG_SIDE", "2048"))
+VISION_MAX_DPI = int(os.getenv("VISION_MAX_DPI", "200"))
+VISION_MAX_BYTES = int(os.getenv("VISION_MAX_BYTES", str(300 * 1024)))
+VISION_KEYWORDS = (
+    "rent", "unit", "cap rate", "sq ft", "sqft", "rsf", "noi", "price", "year built",
+    "occupancy", "lease", "tenant", "bed", "bath",
+)
+
+def _image_coverage(ctx: PdfContext, i: int) -> float:
+    page_rect = ctx.page(i).rect
+    covered = sum(abs(fitz.Rect(b) & page_rect) for b in ctx.images(i))
+    return min(1.0, covered / (abs(page_rect) or 1.0))
+
+def score_page(ctx: PdfContext, i: int) -> float:
+    """
+    How much a page is worth sending to the vision model, from signals PyMuPDF
+    already has: keyword hits, share of the page covered by images, and how little
+    native text there is (pages the text path cannot read gain the most).
+    """
+    text = ctx.text(i).lower()
+    keywords = sum(text.count(k) for k in VISION_KEYWORDS)
+    sparsity = 1.0 - min(1.0, len(text.strip()) / 2000.0)
+    return 2.0 * min(keywords, 10) / 10.0 + _image_coverage(ctx, i) + 0.5 * sparsity
+
+def select_vision_pages(ctx: PdfContext, max_pages: int, candidates: Optional[List[int]] = None) -> List[int]:
+    """The `max_pages` best-scoring pages, in document order (ties go to earlier pages)."""
+    candidates = range(len(ctx)) if candidates is None else candidates
+    ranked = sorted(candidates, key=lambda i: (-score_page(ctx, i), i))
+    return sorted(ranked[:max_pages])
+
+def content_rect(ctx: PdfContext, i: int, pad: float = 12.0) -> fitz.Rect:
+    """Union of text blocks, images and drawings on the page, padded; the full page when empty."""
+    page_rect = ctx.page(i).rect
+    rect = fitz.Rect()
+    for b in ctx.blocks(i):
+        rect |= fitz.Rect(b[:4])
+    for b in ctx.images(i):
+        rect |= fitz.Rect(b)
+    for d in ctx.drawings(i):
+        rect |= d["rect"]
+    if rect.is_empty:
+        return page_rect
+    return fitz.Rect(rect.x0 - pad, rect.y0 - pad, rect.x1 + pad, rect.y1 + pad) & page_rect
+
+def _page_image_url(ctx: PdfContext, page_idx: int, max_bytes: int = VISION_MAX_BYTES) -> str:
+    """
+    Data URL of the page's content region, rendered at the smallest DPI that still
+    gives the model its full working resolution. Pages that are mostly text go out
+    as grayscale PNG (a few KB); pages with pictures as RGB JPEG. Quality, then
+    resolution, is lowered until the image fits in `max_bytes`.
+    """
+    clip = content_rect(ctx, page_idx)
+    dpi = min(
+        VISION_MAX_DPI,
+        VISION_SHORT_SIDE * 72.0 / max(min(clip.width, clip.height), 1.0),
+        VISION_LONG_SIDE * 72.0 / max(clip.width, clip.height, 1.0),
+    )
+    photo = _image_coverage(ctx, page_idx) >= 0.1
+    while True:
+        if photo:
+            pix = ctx.page(page_idx).get_pixmap(dpi=max(36, int(dpi)), clip=clip)
+            for quality in (75, 60, 45):
+                mime, bts = "jpeg", pix.tobytes("jpeg", jpg_quality=quality)
+                if len(bts) <= max_bytes:
+                    break
+        else:
+            pix = ctx.page(page_idx).get_pixmap(dpi=max(36, int(dpi)), clip=clip, colorspace=fitz.csGRAY)
+            mime, bts = "png", pix.tobytes("png")
+        if len(bts) <= max_bytes or dpi <= 36:
+            break
+        dpi *= 0.75
+    return f"data:image/{mime};base64," + base64.b64encode(bts).decode("ascii")
 
-    doc = fitz.open(path)
-    pages = min(max_pages, len(doc))
+def call_openai_vision_on_pdf(ctx: PdfContext, max_pages: int = 3, missing: Optional[List[str]] = None,
+                              candidates: Optional[List[int]] = None) -> Dict[str, Any]:
+    pages = select_vision_pages(ctx, max_pages, candidates)
 
     content: List[Dict[str, Any]] = [{
         "type": "text",
@@ -32,24 +108,25 @@ def call_openai_vision_on_pdf(path: str, max_pages: int = 3) -> Dict[str, Any]:
             "Use numbers for sqft/rent, dates as YYYY-MM-DD. If labels appear, map them. "
             "If it's a lease/flyer/rent_roll, set doc_type accordingly. "
             "Return ONLY valid JSON, no comments or markdown fences."
+            + _missing_instruction(missing)
         )
     }]
-    for i in range(pages):
+    for i in pages:
+        content.append({"type": "text", "text": f"Page {i + 1}:"})
         content.append({
             "type": "image_url",
-            "image_url": {"url": _page_png_b64(path, i)}
+            "image_url": {"url": _page_image_url(ctx, i)}
         })
 
-    chat = client.chat.completions.create(
-        model=model,
-        temperature=0.2,
-        response_format={"type": "json_object"},
-        messages=[
+    llm = get_llm()
+    raw = llm.run(llm.chat(
+        [
             {"role": "system", "content": "You are a precise information extractor."},
             {"role": "user", "content": content},
         ],
-    )
-    return json.loads(chat.choices[0].message.content)
+        response_format={"type": "json_object"},
+    ))
+    return json.loads(raw)
 
 def _truncate(s: str, max_chars: int = 120_000) -> str:
     s = s or ""
@@ -153,84 +230,222 @@ SCHEMA: Dict[str, Any] = {
     "required": ["property", "units", "sections"],
 }
 
-def call_openai_structured(doc_text: str) -> Dict[str, Any]:
-    
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    client = OpenAI()
-
-    system = (
-        "You extract structured real estate data from the file. Read the pdf file carefully."
-        "You may need to read both the text and images to get as much information as possible, use the common sense to understand the file and get the related information. "
-        "Return STRICT JSON with these keys exactly and no extras: "
-        "{property:{name,address,city,state,zipcode,year_built,sqft,unit_count,cap_rate},"
-        "units:[{unit_number,unit_type,beds,baths,sqft,rent,status,lease_start,lease_end}],"
-        "sections:[{title,text,page,bbox}],doc_type}. "
-        "If values are numeric (sqft, unit_count, cap_rate, rent), output numbers (not strings) when obvious. "
-        "Dates may stay as strings. No commentary. No markdown fences."
+STRUCTURED_SYSTEM = (
+    "You extract structured real estate data from the file. Read the pdf file carefully."
+    "You may need to read both the text and images to get as much information as possible, use the common sense to understand the file and get the related information. "
+    "Return STRICT JSON with these keys exactly and no extras: "
+    "{property:{name,address,city,state,zipcode,year_built,sqft,unit_count,cap_rate},"
+    "units:[{unit_number,unit_type,beds,baths,sqft,rent,status,lease_start,lease_end}],"
+    "sections:[{title,text,page,bbox}],doc_type}. "
+    "If values are numeric (sqft, unit_count, cap_rate, rent), output numbers (not strings) when obvious. "
+    "Dates may stay as strings. No commentary. No markdown fences."
+)
+
+LC_SYSTEM = (
+    "You extract structured real estate data from text (flyers, rent rolls, leases). "
+    "Return data that maps to the provided Pydantic schema exactly, with no extra fields."
+)
+
+def _missing_instruction(missing: Optional[List[str]]) -> str:
+    """Prompt suffix limiting the answer to the fields the parsers could not fill."""
+    if not missing:
+        return ""
+    keep = ""
+    if any(m.startswith("units[].") for m in missing):
+        # the answer is merged into the parsed units by unit_number
+        keep = " Always include unit_number for every unit."
+    return (
+        " The other fields are already known: only fill " + ", ".join(missing)
+        + " and leave everything else null or empty." + keep
     )
+
+def _structured_messages(doc_text: str, missing: Optional[List[str]] = None) -> List[Dict[str, str]]:
     user = (
         "Document text:\n```\n"
         + _truncate(doc_text)
         + "\n```\nRespond ONLY with a JSON object."
     )
+    return [
+        {"role": "system", "content": STRUCTURED_SYSTEM + _missing_instruction(missing)},
+        {"role": "user", "content": user},
+    ]
 
-    chat = client.chat.completions.create(
-        model=model,
-        temperature=0.2,
-        response_format={"type": "json_object"},
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-    )
-    content = chat.choices[0].message.content
-    logger.info("GEN AI Response: %s",content)
+def _parse_structured(content: str) -> Dict[str, Any]:
+    logger.info("GEN AI Response: %s", content)
     try:
         return _extract_json(content)
     except Exception as e:
         logger.exception("Failed to parse OpenAI JSON: %s; raw content: %r", e, content[:5000])
         raise
 
-def call_langchain_structured(doc_text: str) -> Dict[str, Any]:
-
-    class Unit(BaseModel):
-        unit_number: Optional[str] = None
-        unit_type: Optional[str] = None
-        beds: Optional[str] = None
-        baths: Optional[str] = None
-        sqft: Optional[Union[str, float, int]] = None
-        rent: Optional[Union[str, float, int]] = None
-        status: Optional[str] = None
-        lease_start: Optional[str] = None
-        lease_end: Optional[str] = None
-
-    class PropertyModel(BaseModel):
-        name: Optional[str] = None
-        address: Optional[str] = None
-        city: Optional[str] = None
-        state: Optional[str] = None
-        zipcode: Optional[str] = None
-        year_built: Optional[str] = None
-        sqft: Optional[Union[str, float, int]] = None
-        unit_count: Optional[Union[str, float, int]] = None
-        cap_rate: Optional[Union[str, float, int]] = None
-
-    class ExtractOut(BaseModel):
-        property: PropertyModel
-        units: List[Unit] = Field(default_factory=list)
-        sections: List[dict] = Field(default_factory=list)
-        doc_type: Optional[str] = None
-
-    llm = ChatOpenAI(model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"), temperature=0.2)
-    structured_llm = llm.with_structured_output(ExtractOut)
-    out: ExtractOut = structured_llm.invoke([
-        ("system",
-         "You extract structured real estate data from text (flyers, rent rolls, leases). "
-         "Return data that maps to the provided Pydantic schema exactly, with no extra fields."),
-        ("user", _truncate(doc_text)),
-    ])
+def call_openai_structured(doc_text: str, missing: Optional[List[str]] = None) -> Dict[str, Any]:
+    return get_llm().run(acall_openai_structured(doc_text, missing))
+
+async def acall_openai_structured(doc_text: str, missing: Optional[List[str]] = None) -> Dict[str, Any]:
+    content = await get_llm().chat(_structured_messages(doc_text, missing), response_format={"type": "json_object"})
+    return _parse_structured(content)
+
+class _LcUnit(BaseModel):
+    unit_number: Optional[str] = None
+    unit_type: Optional[str] = None
+    beds: Optional[str] = None
+    baths: Optional[str] = None
+    sqft: Optional[Union[str, float, int]] = None
+    rent: Optional[Union[str, float, int]] = None
+    status: Optional[str] = None
+    lease_start: Optional[str] = None
+    lease_end: Optional[str] = None
+
+class _LcProperty(BaseModel):
+    name: Optional[str] = None
+    address: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    zipcode: Optional[str] = None
+    year_built: Optional[str] = None
+    sqft: Optional[Union[str, float, int]] = None
+    unit_count: Optional[Union[str, float, int]] = None
+    cap_rate: Optional[Union[str, float, int]] = None
+
+class _LcExtractOut(BaseModel):
+    property: _LcProperty
+    units: List[_LcUnit] = Field(default_factory=list)
+    sections: List[dict] = Field(default_factory=list)
+    doc_type: Optional[str] = None
+
+def call_langchain_structured(doc_text: str, missing: Optional[List[str]] = None) -> Dict[str, Any]:
+    return get_llm().run(acall_langchain_structured(doc_text, missing))
+
+async def acall_langchain_structured(doc_text: str, missing: Optional[List[str]] = None) -> Dict[str, Any]:
+    out: _LcExtractOut = await get_llm().structured(
+        _LcExtractOut, [("system", LC_SYSTEM + _missing_instruction(missing)), ("user", _truncate(doc_text))]
+    )
     return json.loads(out.model_dump_json())
 
+def chunk_pages(pages, max_tokens: int = LLM_CHUNK_TOKENS) -> List[str]:
+    """
+    Pack page texts into chunks of at most ~max_tokens, breaking only between
+    pages. A page that is too big on its own is split between lines. Each page
+    is prefixed with a "--- page N ---" marker so the model keeps its bearings.
+    `pages` may be plain strings or a (streamed) sequence of PageText records,
+    whose own page numbers are used in the markers.
+    """
+    max_chars = max_tokens * _CHARS_PER_TOKEN
+    pieces = []
+    for i, page in enumerate(pages):
+        if isinstance(page, PageText):
+            i, text = page.page, page.text
+        else:
+            text = page
+        text = f"--- page {i + 1} ---\n{text or ''}"
+        while len(text) > max_chars:
+            cut = text.rfind("\n", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(text[:cut])
+            text = text[cut:].lstrip("\n")
+        pieces.append(text)
+
+    chunks, current, size = [], [], 0
+    for piece in pieces:
+        if current and size + len(piece) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def _page_texts(fulltext: Optional[str], pdf: Optional[PdfContext], pages: Optional[List[int]] = None):
+    """
+    PageText stream for the text providers: the PDF's pages (native text, OCR where
+    needed, at the parsers' DPI so OCR results are reused), optionally only `pages`;
+    without a PDF, `fulltext` as a single page.
+    """
+    if pdf is None:
+        yield PageText(0, fulltext or "")
+        return
+    yield from iter_page_texts(pdf, dpi=300, pages=pages)
+
+def _unit_key(u: Dict[str, Any]):
+    number = str(u.get("unit_number") or "").strip().upper()
+    if number:
+        return number
+    return tuple(sorted((k, str(v)) for k, v in u.items()))
+
+def merge_chunk_outputs(outputs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Reduce per-chunk LLM outputs into one result. Property fields take the value
+    most chunks agree on (earliest chunk wins ties); units are de-duplicated by
+    unit_number, later duplicates only filling blanks; sections are concatenated.
+    """
+    normalized = [normalize_to_model_schema(o) for o in outputs]
+    votes: Dict[str, Dict[str, List[Any]]] = {}
+    units: Dict[Any, Dict[str, Any]] = {}
+    sections: List[Any] = []
+    doc_types: Dict[str, int] = {}
+
+    for out in normalized:
+        for k, v in out["property"].items():
+            if v in (None, "", [], {}):
+                continue
+            entry = votes.setdefault(k, {})
+            entry.setdefault(json.dumps(v, default=str), [v, 0])[1] += 1
+        for u in out["units"]:
+            key = _unit_key(u)
+            if key in units:
+                kept = units[key]
+                for k, v in u.items():
+                    if kept.get(k) in (None, "") and v not in (None, ""):
+                        kept[k] = v
+            else:
+                units[key] = dict(u)
+        sections.extend(out["sections"])
+        if out.get("doc_type"):
+            doc_types[out["doc_type"]] = doc_types.get(out["doc_type"], 0) + 1
+
+    prop = {}
+    for k, entry in votes.items():
+        best = max(entry.values(), key=lambda vc: vc[1])
+        prop[k] = best[0]
+
+    return {
+        "property": prop,
+        "units": list(units.values()),
+        "sections": sections,
+        "doc_type": max(doc_types, key=doc_types.get) if doc_types else None,
+    }
+
+async def _map_chunks(chunks: List[str], call, concurrency: int) -> List[Dict[str, Any]]:
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(i, chunk):
+        async with sem:
+            try:
+                return await call(chunk)
+            except Exception as e:
+                logger.warning("LLM chunk %s/%s failed: %s", i + 1, len(chunks), e)
+                return None
+
+    results = await asyncio.gather(*(one(i, c) for i, c in enumerate(chunks)))
+    return [r for r in results if r is not None]
+
+def map_reduce_structured(provider: str, pages, max_tokens: int = LLM_CHUNK_TOKENS,
+                          concurrency: int = LLM_CONCURRENCY,
+                          missing: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Run the text provider ("openai" or "lc") over page-bounded chunks concurrently
+    and merge the results, so long documents are covered end to end and latency is
+    close to that of a single chunk. Returns None when every chunk failed.
+    """
+    chunks = chunk_pages(pages, max_tokens)
+    acall = acall_openai_structured if provider == "openai" else acall_langchain_structured
+    outputs = get_llm().run(_map_chunks(chunks, lambda c: acall(c, missing), concurrency))
+    if not outputs:
+        return None
+    logger.info("LLM map-reduce: %s/%s chunks succeeded", len(outputs), len(chunks))
+    return merge_chunk_outputs(outputs)
+
 PROPERTY_ALLOWED = {
     "name", "address", "city", "state", "zipcode", "year_built", "sqft", "unit_count", "cap_rate"
 }
@@ -290,28 +505,130 @@ def normalize_to_model_schema(data: Dict[str, Any]) -> Dict[str, Any]:
     
     return out
 
-def genai_enrich(result: Dict[str, Any], fulltext: str, *, pdf_path: Optional[str] = None) -> Dict[str, Any]:
+# skip the LLM once the parsers filled at least this share of the expected fields
+LLM_SKIP_COVERAGE = float(os.getenv("LLM_SKIP_COVERAGE", "0.9"))
+
+# fields each deterministic parser is expected to produce
+EXPECTED_FIELDS: Dict[str, Dict[str, tuple]] = {
+    "flyer": {"property": ("name", "address", "sqft", "unit_count", "year_built", "cap_rate"), "units": ()},
+    "rent_roll": {"property": ("name", "address"), "units": ("unit_number", "rent")},
+    "lease": {"property": ("name", "address", "sqft"), "units": ()},
+}
+
+# words that mark the pages worth sending when a field is missing
+FIELD_KEYWORDS: Dict[str, tuple] = {
+    "name": ("property", "name", "tenant", "offering"),
+    "address": ("address", "located", "street", "ave"),
+    "sqft": ("sf", "sq", "square", "rsf"),
+    "unit_count": ("units",),
+    "year_built": ("built", "year"),
+    "cap_rate": ("cap",),
+    "units": ("unit", "rent"),
+}
+
+def _filled(v) -> bool:
+    return v not in (None, "", [], {})
+
+def field_coverage(result: Dict[str, Any], doc_type: Optional[str]):
+    """
+    (coverage, missing) for a parser result. Each expected property field counts
+    once; the unit list counts once, scored by how complete the expected unit
+    fields are, scaled by the parser's confidence when it reports one. `missing`
+    names what is lacking ("units[].rent" style for unit fields). Unknown doc types
+    have coverage 0, so the LLM always runs for them.
+    """
+    expected = EXPECTED_FIELDS.get(doc_type or "")
+    if not expected:
+        return 0.0, []
+    prop = result.get("property") or {}
+    missing = [k for k in expected["property"] if not _filled(prop.get(k))]
+    score = len(expected["property"]) - len(missing)
+    total = len(expected["property"])
+
+    if expected["units"]:
+        total += 1
+        units = result.get("units") or []
+        if units:
+            complete = sum(
+                sum(1 for k in expected["units"] if _filled(u.get(k))) / len(expected["units"]) for u in units
+            ) / len(units)
+            score += complete * float(result.get("confidence", 1.0))
+            missing += [f"units[].{k}" for k in expected["units"] if not all(_filled(u.get(k)) for u in units)]
+        else:
+            missing.append("units")
+    return (score / total if total else 1.0), missing
+
+def _relevant_pages(pdf: PdfContext, missing: List[str]) -> Optional[List[int]]:
+    """Pages mentioning any keyword of a missing field; None (all pages) when none do."""
+    words = {w for m in missing for w in FIELD_KEYWORDS.get(m.split("[")[0].split(".")[0], ())}
+    pages = [i for i in range(len(pdf)) if any(w in pdf.text(i).lower() for w in words)]
+    return pages or None
+
+def _fill_units(units: List[Dict[str, Any]], llm_units: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Parsed units with blank fields filled from the LLM unit of the same
+    unit_number. LLM units matching no parsed unit are dropped; with no parsed
+    units the LLM's are used as they are.
+    """
+    if not units:
+        return llm_units
+    by_number = {_unit_key(u): u for u in llm_units if str(u.get("unit_number") or "").strip()}
+    filled = []
+    for u in units:
+        u = dict(u)
+        match = by_number.get(_unit_key(u), {})
+        for k, v in match.items():
+            if u.get(k) in (None, "") and v not in (None, ""):
+                u[k] = v
+        filled.append(u)
+    return filled
+
+def genai_enrich(result: Dict[str, Any], fulltext: Optional[str] = None, *, pdf: Optional[PdfContext] = None,
+                 doc_type: Optional[str] = None) -> Dict[str, Any]:
     """
     Enrich parser result with LLM output (if GENAI_PROVIDER is set).
-      - GENAI_PROVIDER=openai        -> text-only JSON mode
-      - GENAI_PROVIDER=openai_vision -> first N pages as images
-      - GENAI_PROVIDER=lc|langchain  -> LangChain structured
+      - GENAI_PROVIDER=openai        -> text-only JSON mode, map-reduced over page chunks
+      - GENAI_PROVIDER=openai_vision -> the N most informative pages as images
+      - GENAI_PROVIDER=lc|langchain  -> LangChain structured, map-reduced over page chunks
     We always normalize LLM output to model schema BEFORE merging to avoid
     'str' object has no attribute 'items' and similar type errors.
+
+    When `doc_type` is known and the parsers already cover LLM_SKIP_COVERAGE of its
+    expected fields, the LLM is skipped; otherwise it is asked only for the missing
+    fields, over the pages that mention them. The decision is recorded under "genai".
     """
     provider = os.getenv("GENAI_PROVIDER")
     if not provider:
         return result
 
+    coverage, missing = field_coverage(result, doc_type)
+    if coverage >= LLM_SKIP_COVERAGE:
+        logger.info("genai_enrich skipped: parser coverage %.2f for %s", coverage, doc_type)
+        return {**result, "genai": {"skipped": True, "coverage": round(coverage, 3)}}
+
     try:
-        
-        if provider.lower() == "openai":
-            raw = call_openai_structured(fulltext)
-        elif provider.lower() == "openai_vision" and pdf_path:
-            raw = call_openai_vision_on_pdf(pdf_path, max_pages=int(os.getenv("VISION_MAX_PAGES", "3")))
-        elif provider.lower() in {"lc", "langchain"}:
-            raw = call_langchain_structured(fulltext)
+        provider = provider.lower()
+        pages = _relevant_pages(pdf, missing) if pdf is not None and missing else None
+        if provider == "openai":
+            call = lambda: map_reduce_structured("openai", _page_texts(fulltext, pdf, pages), missing=missing)
+        elif provider == "openai_vision" and pdf:
+            max_pages = int(os.getenv("VISION_MAX_PAGES", "3"))
+            call = lambda: call_openai_vision_on_pdf(pdf, max_pages=max_pages, missing=missing, candidates=pages)
+        elif provider in {"lc", "langchain"}:
+            call = lambda: map_reduce_structured("lc", _page_texts(fulltext, pdf, pages), missing=missing)
+        else:
+            return result
+
+        source = pdf.sha256 if pdf else hashlib.sha256((fulltext or "").encode("utf-8")).hexdigest()
+        key = cache_key(source, provider, os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+                        os.getenv("VISION_MAX_PAGES", "3"), LLM_CHUNK_TOKENS, sorted(missing), PIPELINE_VERSION)
+        if pdf is not None and "llm" in pdf.refresh:
+            # identical prompts are still answered from the llm_response cache
+            raw = call()
+            get_cache().set("llm", key, raw)
         else:
+            raw = get_cache().get_or_compute("llm", key, call)
+        if raw is None:
             return result
 
         llm_out = normalize_to_model_schema(raw)
@@ -324,13 +641,14 @@ def genai_enrich(result: Dict[str, Any], fulltext: str, *, pdf_path: Optional[st
                 if v not in (None, "", [], {}):
                     merged["property"][k] = v
 
-        if not merged.get("units") and llm_out.get("units"):
-            merged["units"] = llm_out["units"]
+        if llm_out.get("units"):
+            merged["units"] = _fill_units(merged.get("units") or [], llm_out["units"])
         if not merged.get("sections") and llm_out.get("sections"):
             merged["sections"] = llm_out["sections"]
         if not merged.get("doc_type") and llm_out.get("doc_type"):
             merged["doc_type"] = llm_out["doc_type"]
 
+        merged["genai"] = {"skipped": False, "coverage": round(coverage, 3), "requested": missing}
         return merged
 
     except Exception as e:
@@ -338,4 +656,7 @@ def genai_enrich(result: Dict[str, Any], fulltext: str, *, pdf_path: Optional[st
         return result
 
 
-__all__ = ["genai_enrich", "call_openai_structured", "call_langchain_structured", "SCHEMA"]
+__all__ = [
+    "genai_enrich", "call_openai_structured", "call_langchain_structured",
+    "map_reduce_structured", "merge_chunk_outputs", "chunk_pages", "SCHEMA",
+]
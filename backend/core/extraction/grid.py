@@ -0,0 +1,109 @@
+import os
+
+from .context import PdfContext
+from .utils import UNIT_NUMBER_FIELDS, first_number, visual_lines
+
+# share of data rows that must look complete before the word grid is trusted over Camelot
+WORDGRID_MIN_CONFIDENCE = float(os.getenv("WORDGRID_MIN_CONFIDENCE", "0.8"))
+
+def match_header(text: str, headers_map):
+    """Field for a header cell: the longest headers_map key contained in it, or None."""
+    h = (text or "").strip().lower()
+    best = None
+    for k, v in headers_map.items():
+        if k in h and (best is None or len(k) > len(best[0])):
+            best = (k, v)
+    return best[1] if best else None
+
+def _cells(line, gap=None):
+    """Split a line's words into cells at gaps wider than ~one glyph height."""
+    ws = sorted(line, key=lambda w: w[0])
+    cells = []
+    for w in ws:
+        g = gap if gap is not None else max(6.0, 0.8 * (w[3] - w[1]))
+        if cells and w[0] - cells[-1][-1][2] <= g:
+            cells[-1].append(w)
+        else:
+            cells.append([w])
+    return cells
+
+def _bbox(words):
+    return [min(w[0] for w in words), min(w[1] for w in words), max(w[2] for w in words), max(w[3] for w in words)]
+
+def _header(line, headers_map):
+    """[(field, x0, x1)] when the line reads like a table header (2+ distinct fields)."""
+    cols = []
+    for cell in _cells(line):
+        field = match_header(" ".join(w[4] for w in cell), headers_map)
+        if field and field not in {c[0] for c in cols}:
+            cols.append((field, cell[0][0], cell[-1][2]))
+    return cols if len(cols) >= 2 else None
+
+def _boundaries(cols):
+    """Column x-ranges split halfway between neighbouring header cells."""
+    edges = [float("-inf")]
+    for a, b in zip(cols, cols[1:]):
+        edges.append((a[2] + b[1]) / 2)
+    edges.append(float("inf"))
+    return [(c[0], edges[i], edges[i + 1]) for i, c in enumerate(cols)]
+
+def _column(columns, w):
+    cx = (w[0] + w[2]) / 2
+    for field, lo, hi in columns:
+        if lo <= cx < hi:
+            return field
+    return None
+
+def extract_word_grid(ctx: PdfContext, headers_map):
+    """
+    Table rows straight from PyMuPDF word tuples: find the header line by matching
+    cells against headers_map, split columns halfway between header cells, and read
+    every following line as a row. Pages without a header reuse the previous page's
+    columns, for tables whose header only appears on page one.
+
+    Returns {"units", "citations", "confidence"}; rent and sqft are floats (or None),
+    as on the Camelot path, and each unit gets a row-level citation with
+    "unit_index" so it is stored against the Unit.
+    """
+    units, citations = [], []
+    complete = 0
+    columns = None
+    for p in range(len(ctx)):
+        lines = visual_lines(ctx.words(p))
+        start = 0
+        for idx, line in enumerate(lines):
+            cols = _header(line, headers_map)
+            if cols:
+                columns, start = _boundaries(cols), idx + 1
+                break
+        if columns is None:
+            continue
+
+        for line in lines[start:]:
+            record = {}
+            straddles = False
+            for cell in _cells(line):
+                fields = {_column(columns, w) for w in cell}
+                if len(fields) > 1:
+                    straddles = True  # running text (titles, notes) crossing column edges
+                    break
+                field = fields.pop()
+                record[field] = (record.get(field, "") + " " + " ".join(w[4] for w in cell)).strip()
+            if straddles or len(record) < 2:
+                continue  # titles, footers, totals spanning one cell
+            if len(record) >= max(2, 0.6 * len(columns)) and record.get("unit_number"):
+                complete += 1
+            for field in UNIT_NUMBER_FIELDS:
+                if field in record:
+                    record[field] = first_number(record[field])
+            citations.append({
+                "field": "unit",
+                "page": p,
+                "bbox": _bbox(line),
+                "snippet": " ".join(w[4] for w in sorted(line, key=lambda w: w[0]))[:500],
+                "unit_index": len(units),
+            })
+            units.append(record)
+
+    confidence = complete / len(units) if units else 0.0
+    return {"units": units, "citations": citations, "confidence": confidence}
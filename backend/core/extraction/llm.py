@@ -0,0 +1,306 @@
+"""
+Shared LLM client layer for the openai, openai_vision and lc providers.
+
+One AsyncOpenAI client (and its pooled HTTP transport) is created lazily per
+process and lives on a dedicated event loop thread, so connections are reused
+across chunks, documents and jobs. Every request goes through a token-bucket
+limiter sized from LLM_RPM / LLM_TPM, is retried with jittered exponential
+backoff on 429, 5xx, timeouts and connection errors, and is bounded by
+LLM_TIMEOUT seconds. Sync callers use `get_llm().run(coro)`.
+
+Responses are cached in the extraction cache ("llm_response" namespace) under a
+fingerprint of model, system prompt, user-content hash and image hashes, with a
+TTL of LLM_CACHE_TTL seconds; hits record the tokens they saved. LLM_FAKE=1
+swaps the OpenAI client for FakeLLM so the whole path runs offline.
+"""
+import os
+import json
+import time
+import hashlib
+import random
+import asyncio
+import logging
+import threading
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import openai
+from openai import AsyncOpenAI
+from openai.types.chat import ParsedChatCompletion
+from langchain_openai import ChatOpenAI
+
+from .cache import cache_key, get_cache
+
+logger = logging.getLogger(__name__)
+
+LLM_RPM = float(os.getenv("LLM_RPM", "500"))
+LLM_TPM = float(os.getenv("LLM_TPM", "200000"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+# USD per million tokens, used to report what cache hits saved (defaults: gpt-4o-mini)
+LLM_PRICE_INPUT_PER_1M = float(os.getenv("LLM_PRICE_INPUT_PER_1M", "0.15"))
+LLM_PRICE_OUTPUT_PER_1M = float(os.getenv("LLM_PRICE_OUTPUT_PER_1M", "0.60"))
+
+RESPONSE_NAMESPACE = "llm_response"
+
+_CHARS_PER_TOKEN = 4
+# rough budget for one vision page plus the completion, used only for rate limiting
+IMAGE_TOKENS = 1000
+COMPLETION_TOKENS = 1500
+
+def estimate_tokens(text: str) -> int:
+    return len(text or "") // _CHARS_PER_TOKEN + 1
+
+def estimate_message_tokens(messages) -> int:
+    """Prompt tokens for OpenAI-style or LangChain (role, text) messages, plus a completion allowance."""
+    total = COMPLETION_TOKENS
+    for m in messages:
+        content = m[1] if isinstance(m, tuple) else m.get("content")
+        if isinstance(content, str):
+            total += estimate_tokens(content)
+        else:
+            for part in content or []:
+                total += IMAGE_TOKENS if part.get("type") == "image_url" else estimate_tokens(part.get("text", ""))
+    return total
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def fingerprint(model: str, messages, **params) -> str:
+    """
+    Cache key for one request: model, system prompt, a hash of the user text and
+    one hash per image, plus request params such as response_format.
+    """
+    system, user, images = [], [], []
+    for m in messages:
+        role, content = m if isinstance(m, tuple) else (m.get("role"), m.get("content"))
+        parts = [{"type": "text", "text": content}] if isinstance(content, str) else (content or [])
+        for part in parts:
+            if part.get("type") == "image_url":
+                images.append(_sha(part["image_url"]["url"]))
+            elif role == "system":
+                system.append(part.get("text", ""))
+            else:
+                user.append(part.get("text", ""))
+    return cache_key(model, system, _sha("\n".join(user)), images, params)
+
+def cost_usd(input_tokens: int, output_tokens: int) -> float:
+    return (input_tokens * LLM_PRICE_INPUT_PER_1M + output_tokens * LLM_PRICE_OUTPUT_PER_1M) / 1_000_000
+
+class FakeLLM:
+    """
+    Offline stand-in for AsyncOpenAI's chat.completions API. `responder` maps the
+    request messages to the reply text; by default it returns an empty extraction.
+    `calls` counts requests that actually reached the "model".
+    """
+
+    def __init__(self, responder: Optional[Callable[[List[Dict[str, Any]]], str]] = None):
+        self.responder = responder or (lambda messages: json.dumps({"property": {}, "units": [], "sections": []}))
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+        # LangChain's structured output calls chat.completions.with_raw_response.parse()
+        self.with_raw_response = self
+
+    def _reply(self, messages):
+        self.calls += 1
+        content = self.responder(messages)
+        return content, estimate_message_tokens(messages) - COMPLETION_TOKENS, estimate_tokens(content)
+
+    async def create(self, messages, **kwargs):
+        content, prompt_tokens, completion_tokens = self._reply(messages)
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+    async def parse(self, messages, model=None, response_format=None, **kwargs):
+        """Raw-response stand-in whose parse() is the ParsedChatCompletion of the reply."""
+        content, prompt_tokens, completion_tokens = self._reply(messages)
+        parsed = response_format.model_validate_json(content) if isinstance(response_format, type) else None
+        completion = ParsedChatCompletion.model_validate({
+            "id": "fake", "object": "chat.completion", "created": 0, "model": model or "fake",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content, "parsed": parsed}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+        return SimpleNamespace(parse=lambda: completion)
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to one minute's worth."""
+
+    def __init__(self, rate_per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(rate_per_minute)
+        self.rate = self.capacity / 60.0
+        self.clock = clock
+        self.level = self.capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 when it already is)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets; a request waits for both."""
+
+    def __init__(self, rpm: float = LLM_RPM, tpm: float = LLM_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self, tokens: int):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait == 0:
+                    self.requests.take(1)
+                    self.tokens.take(tokens)
+                    return
+                await asyncio.sleep(wait)
+
+def _retry_after(e: Exception) -> Optional[float]:
+    response = getattr(e, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except Exception:
+        return None
+
+def is_retryable(e: Exception) -> bool:
+    if isinstance(e, (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+class LLMClient:
+    def __init__(self, rpm: float = LLM_RPM, tpm: float = LLM_TPM, timeout: float = LLM_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, backend=None, cache_ttl: float = LLM_CACHE_TTL):
+        self.limiter = RateLimiter(rpm, tpm)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.cache_ttl = cache_ttl
+        # AsyncOpenAI-compatible client; FakeLLM in offline runs
+        self._openai = backend
+        self._lc: Dict[Any, Any] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="llm-loop", daemon=True).start()
+        return self._loop
+
+    def run(self, coro: Awaitable[Any]) -> Any:
+        """Run a coroutine on the client's loop from sync code and wait for it."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    @property
+    def openai(self) -> AsyncOpenAI:
+        if self._openai is None:
+            # retries are ours, so the SDK must not retry on its own
+            self._openai = AsyncOpenAI(max_retries=0, timeout=self.timeout)
+        return self._openai
+
+    def structured_lc(self, schema, model: Optional[str] = None):
+        """LangChain structured-output runnable sharing the pooled OpenAI transport."""
+        model = model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        key = (schema, model)
+        if key not in self._lc:
+            llm = ChatOpenAI(
+                model=model, temperature=0.2, max_retries=0, request_timeout=self.timeout,
+                root_async_client=self.openai, async_client=self.openai.chat.completions,
+            )
+            self._lc[key] = llm.with_structured_output(schema)
+        return self._lc[key]
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], tokens: int) -> Any:
+        """Rate-limit, time-bound and retry one request made by `fn`."""
+        attempt = 0
+        while True:
+            await self.limiter.acquire(tokens)
+            try:
+                return await asyncio.wait_for(fn(), self.timeout)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+                attempt += 1
+                logger.warning("LLM call failed (%s), retry %s/%s in %.1fs", e, attempt, self.max_retries, delay)
+                await asyncio.sleep(delay)
+
+    async def cached(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Serve `key` from the response cache or compute, store and return it.
+        `compute` returns (value, input_tokens, output_tokens); the token counts are
+        credited as savings on later hits. SQLite work runs off the event loop.
+        """
+        cache = get_cache()
+        hit = await asyncio.to_thread(cache.get, RESPONSE_NAMESPACE, key)
+        if hit is not None:
+            await asyncio.to_thread(cache.record_savings, RESPONSE_NAMESPACE, hit["input_tokens"], hit["output_tokens"])
+            return hit["value"]
+        value, input_tokens, output_tokens = await compute()
+        entry = {"value": value, "input_tokens": input_tokens, "output_tokens": output_tokens}
+        await asyncio.to_thread(cache.set, RESPONSE_NAMESPACE, key, entry, self.cache_ttl)
+        return value
+
+    async def chat(self, messages: List[Dict[str, Any]], **kwargs) -> str:
+        """Chat completion content for OpenAI-style messages."""
+        kwargs.setdefault("model", os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+        kwargs.setdefault("temperature", 0.2)
+        tokens = estimate_message_tokens(messages)
+
+        async def compute():
+            completion = await self.call(
+                lambda: self.openai.chat.completions.create(messages=messages, **kwargs), tokens
+            )
+            content = completion.choices[0].message.content
+            usage = getattr(completion, "usage", None)
+            return (
+                content,
+                getattr(usage, "prompt_tokens", None) or tokens - COMPLETION_TOKENS,
+                getattr(usage, "completion_tokens", None) or estimate_tokens(content),
+            )
+
+        params = {k: v for k, v in kwargs.items() if k != "model"}
+        return await self.cached(fingerprint(kwargs["model"], messages, **params), compute)
+
+    async def structured(self, schema, messages, model: Optional[str] = None):
+        """LangChain structured output for (role, text) messages, cached like chat()."""
+        model = model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        runnable = self.structured_lc(schema, model)
+        tokens = estimate_message_tokens(messages)
+
+        async def compute():
+            out = await self.call(lambda: runnable.ainvoke(messages), tokens)
+            return out, tokens - COMPLETION_TOKENS, estimate_tokens(out.model_dump_json())
+
+        return await self.cached(fingerprint(model, messages, schema=schema.__name__), compute)
+
+_client: Optional[LLMClient] = None
+_client_pid: Optional[int] = None
+
+def get_llm() -> LLMClient:
+    """Process-wide client; a forked worker builds its own instead of inheriting the parent's loop."""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = LLMClient(backend=FakeLLM() if os.getenv("LLM_FAKE") == "1" else None)
+        _client_pid = os.getpid()
+    return _client
@@ -1,9 +1,31 @@
-import cv2, pytesseract, fitz, numpy as np
+import os
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-def rasterize_pdf_page(path: str, page_idx: int, dpi=400):
-    doc = fitz.open(path)
-    page = doc[page_idx]
-    pix = page.get_pixmap(dpi=dpi)
+import cv2, fitz, pytesseract, numpy as np
+from .context import PageText, PdfContext
+from .cache import PIPELINE_VERSION, cache_key, get_cache
+
+logger = logging.getLogger(__name__)
+
+# worker processes for page-parallel OCR; 1 disables the pool
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+# PSM selection: a second Tesseract pass only runs below OCR_MIN_CONF mean word confidence;
+# OCR_PSM forces a single PSM and skips the layout probe
+OCR_MIN_CONF = float(os.getenv("OCR_MIN_CONF", "60"))
+OCR_MAX_PSM_PASSES = int(os.getenv("OCR_MAX_PSM_PASSES", "2"))
+OCR_PSM = int(os.getenv("OCR_PSM", "0"))
+# OCR_MODE="roi" OCRs only the images of pages without native text (or the whole page when
+# it has none), at a DPI derived from glyph size;
+# "page" rasterizes whole pages at the caller's DPI
+OCR_MODE = os.getenv("OCR_MODE", "roi")
+OCR_TARGET_GLYPH_PX = float(os.getenv("OCR_TARGET_GLYPH_PX", "20"))  # median glyph (~x-height) in pixels
+OCR_MIN_DPI = int(os.getenv("OCR_MIN_DPI", "150"))
+OCR_MIN_REGION = 0.01  # ignore images smaller than 1% of the page
+
+def rasterize_pdf_page(ctx: PdfContext, page_idx: int, dpi=400):
+    pix = ctx.pixmap(page_idx, dpi=dpi)
     img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.h, pix.w, pix.n)
     if pix.n == 4:
         img = img[:, :, :3]
@@ -50,56 +72,349 @@ def _deskew(bin_img):
     M = cv2.getRotationMatrix2D((w//2, h//2), angle, 1.0)
     return cv2.warpAffine(bin_img, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
 
-def ocr_words_for_page(path: str, page_idx: int, dpi=400, lang="eng"):
-    bgr, px_w, px_h = rasterize_pdf_page(path, page_idx, dpi=dpi)
+def ocr_words_for_page(ctx: PdfContext, page_idx: int, dpi=400, lang="eng"):
+    return next(ocr_pages(ctx, [page_idx], dpi=dpi, lang=lang, workers=1))[1]
+
+def _layout_probe(bin_img):
+    """
+    Cheap layout signals from a binarized page: ink density (share of dark pixels)
+    and the number of text columns, found as runs of ink separated by wide
+    vertical whitespace gutters in a downscaled column projection.
+    """
+    h, w = bin_img.shape[:2]
+    small = cv2.resize(bin_img, (max(1, w // 8), max(1, h // 8)), interpolation=cv2.INTER_AREA)
+    ink = small < 128
+    density = float(ink.mean()) if ink.size else 0.0
+
+    cols = ink.mean(axis=0)
+    has_ink = cols > 0.01
+    gutter = max(3, small.shape[1] // 40)
+    columns, run, gap = 0, False, 0
+    for filled in has_ink:
+        if filled:
+            if not run:
+                columns += 1
+            run, gap = True, 0
+        else:
+            gap += 1
+            if gap >= gutter:
+                run = False
+    return density, columns
+
+def _choose_psm(density, columns):
+    if OCR_PSM:
+        return OCR_PSM
+    if density < 0.01:
+        return 11   # sparse text, e.g. a flyer with a few labels
+    if columns >= 2:
+        return 3    # let Tesseract segment the columns
+    return 6        # one uniform block
+
+# second pass to try when the first one is not confident enough
+_FALLBACK_PSM = {6: 4, 4: 6, 3: 6, 11: 6}
+
+def _run_psm(bin_img, psm, lang, scale):
+    cfg = f"--psm {psm} --oem 3"
+    data = pytesseract.image_to_data(bin_img, lang=lang, config=cfg, output_type=pytesseract.Output.DICT)
+    words, confs = [], []
+    for i, txt in enumerate(data.get("text") or []):
+        txt = (txt or "").strip()
+        if not txt:
+            continue
+        x, y, w, h = data["left"][i], data["top"][i], data["width"][i], data["height"][i]
+        words.append([x*scale, y*scale, (x+w)*scale, (y+h)*scale, txt, data.get("block_num",[0])[i], data.get("line_num",[0])[i], data.get("word_num",[0])[i]])
+        try:
+            conf = float(data.get("conf", [])[i])
+        except (IndexError, TypeError, ValueError):
+            conf = -1.0
+        if conf >= 0:
+            confs.append(conf)
+    mean_conf = sum(confs) / len(confs) if confs else 0.0
+    return words, mean_conf
+
+def ocr_page_for_image(bgr, dpi=400, lang="eng"):
+    """
+    OCR one rasterized page; runs in pool workers, so it must not touch the PdfContext.
+
+    A layout probe picks one PSM up front; a second PSM is tried only when the mean
+    word confidence of the first pass is below OCR_MIN_CONF, and the better-scoring
+    pass wins. Returns {"words", "psm", "conf", "passes"}.
+    """
     rot = _osd_rotation(bgr)
     bgr = _rotate(bgr, rot)
     bin_img = _prep_bin(bgr)
     bin_img = _deskew(bin_img)
 
-    words = []
     scale = 72.0 / dpi
-    # try multiple PSMs: 6(block), 4(vertically aligned columns), 11(sparse), 3(auto)
-    for psm in (6, 4, 11, 3):
-        cfg = f"--psm {psm} --oem 3"
-        data = pytesseract.image_to_data(bin_img, lang=lang, config=cfg, output_type=pytesseract.Output.DICT)
-        if not data.get("text"): 
+    density, columns = _layout_probe(bin_img)
+    psm = _choose_psm(density, columns)
+    words, conf = _run_psm(bin_img, psm, lang, scale)
+    best = {"words": words, "psm": psm, "conf": conf, "passes": 1}
+
+    if conf < OCR_MIN_CONF and OCR_MAX_PSM_PASSES > 1:
+        alt = _FALLBACK_PSM.get(psm, 6)
+        alt_words, alt_conf = _run_psm(bin_img, alt, lang, scale)
+        best["passes"] = 2
+        if (alt_conf, len(alt_words)) > (conf, len(words)):
+            best.update(words=alt_words, psm=alt, conf=alt_conf)
+    return best
+
+def ocr_words_for_image(bgr, dpi=400, lang="eng"):
+    return ocr_page_for_image(bgr, dpi=dpi, lang=lang)["words"]
+
+def _ocr_page_safe(bgr, dpi, lang):
+    try:
+        return ocr_page_for_image(bgr, dpi=dpi, lang=lang)
+    except Exception as e:
+        logger.warning("OCR failed for page: %s", e)
+        return None
+
+def ocr_regions(ctx: PdfContext, page_idx: int):
+    """
+    Rectangles on the page that need OCR. Only pages with (almost) no native words
+    need it at all: images on a page with native text are taken to be photos and
+    are not OCRed. On such a page these are the embedded images that native words
+    do not cover, or the full page when there is no such image.
+    """
+    page = ctx.page(page_idx)
+    words = ctx.words(page_idx)
+    if len(words) >= 4:
+        return []
+    min_area = OCR_MIN_REGION * page.rect.get_area()
+    regions = []
+    for bbox in ctx.images(page_idx):
+        r = fitz.Rect(bbox) & page.rect
+        if r.is_empty or r.get_area() < min_area:
             continue
-        for i, txt in enumerate(data["text"]):
-            txt = (txt or "").strip()
-            if not txt:
-                continue
-            x, y, w, h = data["left"][i], data["top"][i], data["width"][i], data["height"][i]
-            words.append([x*scale, y*scale, (x+w)*scale, (y+h)*scale, txt, data.get("block_num",[0])[i], data.get("line_num",[0])[i], data.get("word_num",[0])[i]])
-        if len(words) > 8:
-            break
-    return words
+        covered = sum((fitz.Rect(w[:4]) & r).get_area() for w in words)
+        if covered / r.get_area() < 0.05:
+            regions.append(r)
+    # drop regions nested inside another region
+    regions = [r for r in regions if not any(o is not r and o.contains(r) for o in regions)]
+    if not regions:
+        regions = [page.rect]
+    return regions
 
-def get_page_words_with_ocr_fallback(doc: fitz.Document, path: str, page_idx: int, dpi=400):
-    page = doc[page_idx]
-    words = page.get_text("words") or []
-    if not words or len(words) < 4:
-        try:
-            words = ocr_words_for_page(path, page_idx, dpi=dpi)
-        except Exception:
-            pass
-    return words
-
-def get_fulltext_with_ocr_fallback(path: str, dpi=400, lang="eng"):
-    doc = fitz.open(path)
-    out = []
-    for p in range(len(doc)):
-        native = doc[p].get_text("text") or ""
-        if native.strip():
-            out.append(native.strip())
-        else:
-            ws = ocr_words_for_page(path, p, dpi=dpi, lang=lang)
-            if ws:
-                # reconstruct as lines by (block,line)
-                from collections import defaultdict
-                g = defaultdict(list)
-                for x0,y0,x1,y1,txt,b,l,w in ws: g[(b,l)].append((x0,txt))
-                for _, items in g.items():
-                    items.sort(key=lambda t: t[0])
-                    out.append(" ".join(t[1] for t in items))
-    return "\n".join(out)
+def estimate_dpi(ctx: PdfContext, page_idx: int, rect, max_dpi=400, probe_dpi=100):
+    """
+    Pick the lowest DPI that still renders glyphs at ~OCR_TARGET_GLYPH_PX pixels tall,
+    from the median connected-component height of a cheap low-resolution probe.
+    """
+    pix = ctx.page(page_idx).get_pixmap(dpi=probe_dpi, clip=rect, colorspace=fitz.csGRAY)
+    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.h, pix.w)
+    if gray.size == 0:
+        return max_dpi
+    _, bin_img = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    n, _, stats, _ = cv2.connectedComponentsWithStats(bin_img, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    heights = heights[(heights >= 2) & (heights <= max(3, pix.h // 10))]
+    if len(heights) < 5:
+        return max_dpi
+    glyph_pt = float(np.median(heights)) * 72.0 / probe_dpi
+    dpi = OCR_TARGET_GLYPH_PX * 72.0 / glyph_pt
+    return int(min(max_dpi, max(OCR_MIN_DPI, dpi)))
+
+def rasterize_region(ctx: PdfContext, page_idx: int, rect, dpi):
+    pix = ctx.page(page_idx).get_pixmap(dpi=dpi, clip=rect)
+    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.h, pix.w, pix.n)
+    if pix.n == 4:
+        img = img[:, :, :3]
+    return img
+
+def _page_tasks(ctx: PdfContext, p, dpi):
+    """(offset, image, dpi) for every image that has to be OCRed on page p."""
+    if OCR_MODE != "roi":
+        bgr, _, _ = rasterize_pdf_page(ctx, p, dpi=dpi)
+        return [((0.0, 0.0), bgr, dpi)]
+    tasks = []
+    for rect in ocr_regions(ctx, p):
+        rdpi = estimate_dpi(ctx, p, rect, max_dpi=dpi)
+        tasks.append(((rect.x0, rect.y0), rasterize_region(ctx, p, rect, rdpi), rdpi))
+    return tasks
+
+def _merge_regions(results):
+    """Combine per-region OCR output into one page result in page coordinates."""
+    words, scored, passes, psms, dpis = [], [], 0, [], []
+    ok = False
+    for i, ((ox, oy), rdpi, page) in enumerate(results):
+        if page is None:
+            continue
+        ok = True
+        for w in page["words"]:
+            # keep (block, line) unique across regions so line grouping still works
+            words.append([w[0] + ox, w[1] + oy, w[2] + ox, w[3] + oy, w[4], i * 1000 + w[5], w[6], w[7]])
+        scored.append((page["conf"], len(page["words"])))
+        passes += page["passes"]
+        psms.append(page["psm"])
+        dpis.append(rdpi)
+    if not ok:
+        return None if results else {"words": [], "psm": None, "conf": 0.0, "passes": 0, "regions": 0, "region_dpi": []}
+    n = sum(c for _, c in scored)
+    conf = sum(conf * c for conf, c in scored) / n if n else 0.0
+    return {
+        "words": words,
+        "psm": psms[0] if len(set(psms)) == 1 else psms,
+        "conf": conf,
+        "passes": passes,
+        "regions": len(results),
+        "region_dpi": dpis,
+    }
+
+def ocr_pages(ctx: PdfContext, page_indices, dpi=400, lang="eng", workers=None):
+    """
+    Yield (page_idx, words) for each page in order, OCRing pages across a process pool.
+    `page_indices` is read lazily: pages are rasterized in this process and streamed to
+    the workers at most 2 * workers OCR pages ahead of the consumer, and each page is
+    yielded as soon as its own results are in. A consumer that stops early cancels the
+    queued pages, so neither memory nor OCR work grows past what was consumed.
+    In OCR_MODE="roi" only regions without native text are rasterized, at a DPI picked
+    from their glyph size (capped at `dpi`); returned words are in page coordinates.
+    """
+    workers = OCR_WORKERS if workers is None else workers
+    cache = get_cache()
+
+    def disk_key(p):
+        return cache_key(ctx.sha256, p, dpi, lang, OCR_MODE, PIPELINE_VERSION)
+
+    def remember(p, page):
+        ctx.ocr_words[(p, dpi, lang)] = page["words"]
+        ctx.ocr_meta[(p, dpi, lang)] = {k: v for k, v in page.items() if k != "words"}
+
+    def store(p, page):
+        # failures (None) are not written to disk so they are retried next time
+        if page is None:
+            ctx.ocr_words[(p, dpi, lang)] = []
+            return
+        remember(p, page)
+        cache.set("ocr", disk_key(p), page)
+
+    def ready(p):
+        """True when p's words are already known, in memory or in the disk cache."""
+        if (p, dpi, lang) in ctx.ocr_words:
+            return True
+        hit = None if "ocr" in ctx.refresh else cache.get("ocr", disk_key(p))
+        if hit is not None:
+            remember(p, hit)
+            return True
+        return False
+
+    it = iter(page_indices)
+    if workers <= 1:
+        for p in it:
+            if not ready(p):
+                with ctx.timed("ocr"):
+                    results = [(off, rdpi, _ocr_page_safe(img, rdpi, lang)) for off, img, rdpi in _page_tasks(ctx, p, dpi)]
+                    store(p, _merge_regions(results))
+            yield p, ctx.ocr_words[(p, dpi, lang)]
+        return
+
+    # (page, futures) in page order; futures is None for pages that need no OCR
+    pending = deque()
+    in_flight = 0
+    exhausted = False
+    pool = None
+    try:
+        while True:
+            while not exhausted and in_flight < 2 * workers:
+                p = next(it, None)
+                if p is None:
+                    exhausted = True
+                elif ready(p):
+                    pending.append((p, None))
+                    if not in_flight:
+                        break  # nothing to wait for: hand it over right away
+                else:
+                    if pool is None:
+                        pool = ProcessPoolExecutor(max_workers=workers)
+                    with ctx.timed("ocr"):
+                        futs = [(off, rdpi, pool.submit(_ocr_page_safe, img, rdpi, lang)) for off, img, rdpi in _page_tasks(ctx, p, dpi)]
+                    pending.append((p, futs))
+                    in_flight += 1
+            if not pending:
+                return
+            p, futs = pending.popleft()
+            if futs is not None:
+                with ctx.timed("ocr"):
+                    store(p, _merge_regions([(off, rdpi, fut.result()) for off, rdpi, fut in futs]))
+                in_flight -= 1
+            yield p, ctx.ocr_words[(p, dpi, lang)]
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+def _needs_ocr(ctx: PdfContext, p):
+    # as ocr_regions: pages with native text are never OCRed, whatever images they carry
+    return len(ctx.words(p)) < 4
+
+def get_page_words_with_ocr_fallback(ctx: PdfContext, page_idx: int, dpi=400):
+    return get_words_with_ocr_fallback(ctx, [page_idx], dpi=dpi)[page_idx]
+
+def get_words_with_ocr_fallback(ctx: PdfContext, page_indices, dpi=400, lang="eng"):
+    """
+    Native words per page, plus OCR words for pages that need it (OCRed in parallel).
+    In ROI mode OCR only covers image regions, so its words are added to the native
+    ones; in page mode they replace them.
+    """
+    out = {p: ctx.words(p) for p in page_indices}
+    todo = [p for p in out if _needs_ocr(ctx, p)]
+    for p, ws in ocr_pages(ctx, todo, dpi=dpi, lang=lang):
+        if ws:
+            out[p] = list(out[p]) + ws if OCR_MODE == "roi" else ws
+    return out
+
+def _ocr_lines(ws):
+    # reconstruct as lines by (block,line)
+    from collections import defaultdict
+    g = defaultdict(list)
+    for x0,y0,x1,y1,txt,b,l,w in ws: g[(b,l)].append((x0,txt))
+    lines = []
+    for _, items in g.items():
+        items.sort(key=lambda t: t[0])
+        lines.append(" ".join(t[1] for t in items))
+    return lines
+
+def iter_page_texts(ctx: PdfContext, dpi=400, lang="eng", pages=None):
+    """
+    PageText records in page order (all pages, or just `pages`): native text plus
+    OCR lines for pages without native text (in ROI mode, of their images). Pages are
+    checked for OCR lazily and OCR runs a bounded window ahead in the pool while
+    earlier records are consumed, so a consumer that stops early (text_head)
+    only pays for the pages it read plus that window.
+    """
+    pages = range(len(ctx)) if pages is None else sorted(pages)
+    needs = {}
+
+    def needs_ocr(p):
+        if p not in needs:
+            needs[p] = _needs_ocr(ctx, p)
+        return needs[p]
+
+    ocr = ocr_pages(ctx, (p for p in pages if needs_ocr(p)), dpi=dpi, lang=lang)
+    try:
+        for p in pages:
+            native = ctx.text(p).strip()
+            lines = [native] if native else []
+            source = "native"
+            if needs_ocr(p):
+                _, ws = next(ocr)
+                if ws:
+                    lines.extend(_ocr_lines(ws))
+                    source = "mixed" if native else "ocr"
+            yield PageText(p, "\n".join(lines), source)
+    finally:
+        ocr.close()
+
+def get_fulltext_with_ocr_fallback(ctx: PdfContext, dpi=400, lang="eng"):
+    return "\n".join(r.text for r in iter_page_texts(ctx, dpi=dpi, lang=lang) if r.text)
+
+def text_head(records, limit: int) -> str:
+    """The first `limit` characters of a PageText stream, reading only as many pages as needed."""
+    out, size = [], 0
+    for r in records:
+        if not r.text:
+            continue
+        out.append(r.text)
+        size += len(r.text) + 1
+        if size >= limit:
+            break
+    return "\n".join(out)[:limit]
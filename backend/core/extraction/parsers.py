@@ -1,8 +1,10 @@
-import fitz
-import pdfplumber
-from .tables import extract_tables
-from .utils import find_value_near, sections_from_layout
-from .ocr import get_page_words_with_ocr_fallback, get_fulltext_with_ocr_fallback
+import pandas as pd
+
+from .context import PdfContext
+from .tables import extract_table_frames
+from .grid import extract_word_grid, match_header, WORDGRID_MIN_CONFIDENCE
+from .utils import NUMBER_RE, UNIT_NUMBER_FIELDS, LabelMatcher, WordIndex, sections_from_layout
+from .ocr import get_words_with_ocr_fallback, iter_page_texts, text_head
 
 LABELS = {
     "Property Name": ["name"],
@@ -13,17 +15,30 @@ LABELS = {
     "Cap Rate": ["cap_rate"],
 }
 
-def parse_flyer(path: str):
-    doc = fitz.open(path)
-    fulltext = get_fulltext_with_ocr_fallback(path, dpi=300)
-    sections = sections_from_layout(path) or []
+LABEL_MATCHER = LabelMatcher(LABELS)
+
+RENT_ROLL_HEADERS = {
+    "unit": "unit_number",
+    "unit type": "unit_type",
+    "beds": "beds",
+    "baths": "baths",
+    "rent": "rent",
+    "sqft": "sqft",
+    "status": "status",
+    "lease start": "lease_start",
+    "lease end": "lease_end",
+}
+
+def parse_flyer(ctx: PdfContext):
+    sections = sections_from_layout(ctx) or []
     property_fields = {}
     citations = []
 
-    for p in range(min(2, len(doc))):
-        words = get_page_words_with_ocr_fallback(doc, path, p, dpi=300)
+    page_words = get_words_with_ocr_fallback(ctx, range(min(2, len(ctx))), dpi=300)
+    for p, words in page_words.items():
+        hits = WordIndex(words).find_values(LABELS, matcher=LABEL_MATCHER)
         for label in LABELS:
-            hit = find_value_near(words, label)
+            hit = hits.get(label)
             if hit:
                 key = LABELS[label][0]
                 property_fields[key] = hit["value"]
@@ -39,36 +54,58 @@ def parse_flyer(path: str):
         "units": [],
         "sections": sections,
         "citations": citations,
-        "fulltext_hint": fulltext[:5000], 
+        "fulltext_hint": text_head(iter_page_texts(ctx, dpi=300), 5000),
     }
 
-def parse_rent_roll(path: str):
-    tables = extract_tables(path)
+def parse_rent_roll(ctx: PdfContext):
+    grid = extract_word_grid(ctx, RENT_ROLL_HEADERS)
+    if grid["units"] and grid["confidence"] >= WORDGRID_MIN_CONFIDENCE:
+        return {
+            "property": {}, "units": grid["units"], "sections": [], "citations": grid["citations"],
+            "confidence": grid["confidence"],
+        }
+
+    # scanned or irregular rent rolls: fall back to Camelot
     units = []
-    citations = []
-    headers_map = {
-        "unit": "unit_number",
-        "beds": "beds",
-        "baths": "baths",
-        "rent": "rent",
-        "sqft": "sqft",
-        "status": "status",
-        "lease start": "lease_start",
-        "lease end": "lease_end",
-    }
-    for t in tables:
-        df = t.df
-        header = [str(h).strip().lower() for h in list(df.iloc[0])]
-        col_idx = {}
-        for i, h in enumerate(header):
-            for k, v in headers_map.items():
-                if k in h:
-                    col_idx[v] = i
-        for ridx in range(1, len(df)):
-            row = df.iloc[ridx]
-            record = {}
-            for k, i in col_idx.items():
-                record[k] = str(row[i]).strip()
-            if any(record.values()):
-                units.append(record)
-    return {"property": {}, "units": units, "sections": [], "citations": citations}
+    columns = None
+    for t in extract_table_frames(ctx):
+        records, columns = map_rent_roll_frame(t["df"], RENT_ROLL_HEADERS, columns)
+        units.extend(records)
+    return {"property": {}, "units": units, "sections": [], "citations": []}
+
+def map_rent_roll_frame(df, headers_map, columns=None):
+    """
+    Map one table DataFrame to unit dicts with whole-frame pandas operations.
+
+    The header is resolved once from the first row. A table without a recognizable
+    header but with the same width as the previous one is treated as its
+    continuation (headers printed on page one only) and reuses `columns`.
+    Returns (records, columns) so the caller can thread columns to the next table.
+    """
+    if df is None or df.empty:
+        return [], columns
+    col_idx = {}
+    for i, h in enumerate(df.iloc[0].astype(str).str.strip().str.lower()):
+        field = match_header(h, headers_map)
+        if field and field not in col_idx:
+            col_idx[field] = i
+
+    if len(col_idx) >= 2:
+        body = df.iloc[1:]
+        columns = (df.shape[1], col_idx)
+    elif columns and columns[0] == df.shape[1]:
+        body, col_idx = df, columns[1]
+    else:
+        return [], columns
+
+    out = body.iloc[:, list(col_idx.values())].astype(str)
+    out.columns = list(col_idx.keys())
+    out = out.apply(lambda c: c.str.strip()).replace({"nan": "", "None": ""})
+    out = out[(out != "").any(axis=1)]
+    for field in UNIT_NUMBER_FIELDS:
+        if field in out:
+            # same first-number rule as persistence.to_float, applied to the whole column
+            first = out[field].str.extract(f"({NUMBER_RE.pattern})", expand=False)
+            out[field] = pd.to_numeric(first.str.replace(",", "", regex=False), errors="coerce")
+    out = out.astype(object).where(out.notna(), None)
+    return out.to_dict("records"), columns
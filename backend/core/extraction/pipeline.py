@@ -1,26 +1,57 @@
+from .context import PdfContext
+from .cache import cache_key, get_cache, pipeline_config
 from .parsers import parse_flyer, parse_rent_roll
 from .lease import parse_lease
 from .genai import genai_enrich
-import pdfplumber, fitz
-from .ocr import get_fulltext_with_ocr_fallback
 
-def extract(path: str, doc_type: str):
-    if doc_type == "flyer":
-        res = parse_flyer(path)
-    elif doc_type == "rent_roll":
-        res = parse_rent_roll(path)
-    elif doc_type == "lease":
-        res = parse_lease(path)
-    else:
-        head = (fitz.open(path)[0].get_text() or "").lower()
-        res = parse_lease(path) if "lease" in head else parse_flyer(path)
-    try:
-        with pdfplumber.open(path) as pdf:
-            fulltext = "\n".join(p.extract_text() or "" for p in pdf.pages)
-    except Exception:
-        
-        fulltext = get_fulltext_with_ocr_fallback(path, dpi=350)
+# cached stages a re-extraction can recompute; parsers and rule sets always rerun
+REEXTRACT_STAGES = ("ocr", "tables", "llm")
 
-    print("Loading Gen AI enrich")
-    res = genai_enrich(res, fulltext, pdf_path=path)
-    return res
+def extract(path: str, doc_type: str, refresh=None):
+    """
+    Run the extraction pipeline on one PDF. With `refresh` (a re-extraction) the
+    whole-result cache is bypassed, the parsers rerun, and the listed stages are
+    recomputed; every other stage reuses its cached per-page/per-document artifacts.
+    The result carries "timings": wall seconds per stage of this run (parse excludes
+    the ocr and tables time it triggered; a cached result reports only "cache").
+    """
+    with PdfContext(path) as ctx:
+        cache = get_cache()
+        key = cache_key(ctx.sha256, doc_type, pipeline_config())
+        if refresh is None:
+            with ctx.timed("cache"):
+                cached = cache.get("result", key)
+            if cached is not None:
+                return {**cached, "timings": _rounded(ctx.timings)}
+        else:
+            ctx.refresh = frozenset(refresh)
+
+        kind = doc_type
+        if kind not in ("flyer", "rent_roll", "lease"):
+            head = (ctx.text(0) if len(ctx) else "").lower()
+            kind = "lease" if "lease" in head else "flyer"
+        with ctx.timed("parse"):
+            if kind == "flyer":
+                res = parse_flyer(ctx)
+            elif kind == "rent_roll":
+                res = parse_rent_roll(ctx)
+            else:
+                res = parse_lease(ctx)
+        ctx.timings["parse"] -= ctx.timings.get("ocr", 0.0) + ctx.timings.get("tables", 0.0)
+        print("Loading Gen AI enrich")
+        # page text is streamed from ctx by whichever stage needs it; no full-text copy here
+        ocr_before = ctx.timings.get("ocr", 0.0)
+        with ctx.timed("llm"):
+            res = genai_enrich(res, pdf=ctx, doc_type=kind)
+        ctx.timings["llm"] -= ctx.timings.get("ocr", 0.0) - ocr_before
+        res["pages"] = len(ctx)
+        if ctx.ocr_meta:
+            res["ocr"] = [
+                {"page": p, "dpi": dpi, **meta} for (p, dpi, _), meta in sorted(ctx.ocr_meta.items())
+            ]
+        cache.set("result", key, res)
+        timings = _rounded(ctx.timings)
+    return {**res, "timings": timings}
+
+def _rounded(timings):
+    return {stage: round(max(s, 0.0), 4) for stage, s in timings.items()}
@@ -0,0 +1,194 @@
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .context import PdfContext
+
+
+@dataclass(frozen=True)
+class FieldRule:
+    """
+    One regex-extracted field. `pattern` must contain exactly one capturing group
+    holding the value; `kind` is "text" or "number". A rule may feed several
+    fields (e.g. the tenant is also the property name). `cite=False` keeps the
+    value out of the citations.
+    """
+    fields: Tuple[str, ...]
+    pattern: str
+    kind: str = "text"
+    flags: int = re.I
+    cite: bool = True
+
+
+def _number(s: str):
+    s = s.replace(",", "").replace("$", "").strip()
+    try:
+        return float(s)
+    except Exception:
+        return s
+
+
+def page_text_index(words):
+    """
+    Rebuild page text from PyMuPDF word tuples, one text line per (block, line),
+    and return (text, starts) where starts[i] is the offset of words[i] in text.
+    """
+    parts = []
+    starts = []
+    pos = 0
+    prev = None
+    for w in words:
+        key = (w[5], w[6])
+        if prev is not None:
+            sep = " " if key == prev else "\n"
+            parts.append(sep)
+            pos += 1
+        starts.append(pos)
+        parts.append(w[4])
+        pos += len(w[4])
+        prev = key
+    return "".join(parts), starts
+
+
+def _span_bbox(words, starts, begin: int, end: int):
+    """Union bbox of the words overlapping text[begin:end]."""
+    i = max(bisect_right(starts, begin) - 1, 0)
+    hit = []
+    while i < len(words) and starts[i] < end:
+        if starts[i] + len(words[i][4]) > begin:
+            hit.append(words[i])
+        i += 1
+    if not hit:
+        return None
+    return [
+        float(min(w[0] for w in hit)), float(min(w[1] for w in hit)),
+        float(max(w[2] for w in hit)), float(max(w[3] for w in hit)),
+    ]
+
+
+# characters of the previous page's text scanned again with the next page, so a
+# value broken by a page break still matches
+RULE_CARRY_CHARS = 300
+
+
+def _prefix_friendly(pattern: str) -> str:
+    """
+    Rewrite a leading word boundary before a letter ("\\bused") as a lookbehind after
+    it ("u(?<!\\w.)sed"). Same matches, but the alternation keeps a first-character
+    set, which lets the regex engine skip ahead instead of trying every rule at
+    every offset.
+    """
+    m = re.match(r"\\b([A-Za-z])", pattern)
+    return f"{m.group(1)}(?<!\\w.){pattern[m.end():]}" if m else pattern
+
+
+class RuleSet:
+    """
+    Field rules compiled once into a single alternation, so each page's text is
+    walked by one regex scan regardless of how many rules there are. After a
+    match the scan resumes one character past its start rather than at its end,
+    so rules whose spans overlap (two labels on one line, a clause inside
+    another rule's value) do not hide each other; a rule starting where an
+    earlier rule matched is checked at that offset directly. The tail of the
+    previous page (RULE_CARRY_CHARS) is scanned again with each page, so a value
+    split by a page break is found too. Every match carries its page and,
+    through the word offsets of the page text, its bbox. The first match of a
+    rule in document order wins.
+    """
+
+    def __init__(self, rules: List[FieldRule]):
+        self.rules = list(rules)
+        self.compiled = []
+        # flags shared by every rule apply to the whole alternation; scoped flag
+        # groups would hide the first-character set from the regex engine
+        shared = self.rules[0].flags if self.rules else 0
+        for rule in self.rules:
+            shared &= rule.flags
+        parts = []
+        for i, rule in enumerate(self.rules):
+            inner = re.compile(rule.pattern, rule.flags)
+            if inner.groups != 1:
+                raise ValueError(f"rule for {rule.fields} must have exactly one capturing group")
+            self.compiled.append(inner)
+            pattern = _prefix_friendly(rule.pattern)
+            extra = "".join(c for f, c in ((re.I, "i"), (re.S, "s"), (re.M, "m")) if rule.flags & f and not shared & f)
+            if extra:
+                pattern = f"(?{extra}:{pattern})"
+            parts.append(f"(?P<r{i}>{pattern})")
+        self.regex = re.compile("|".join(parts), shared)
+        self._value_group = {i: self.regex.groupindex[f"r{i}"] + 1 for i in range(len(self.rules))}
+
+    def _hits(self, text: str, done):
+        """(rule index, value start, value end, value) of the first match of every rule not in `done`."""
+        found = {}
+        pos = 0
+        while len(done) + len(found) < len(self.rules):
+            m = self.regex.search(text, pos)
+            if m is None:
+                break
+            i = int(m.lastgroup[1:])
+            candidates = [(i, m.start(self._value_group[i]), m.end(self._value_group[i]))]
+            # alternatives after i may match at the same offset too
+            for j in range(i + 1, len(self.rules)):
+                if j not in done and j not in found:
+                    mj = self.compiled[j].match(text, m.start())
+                    if mj:
+                        candidates.append((j, mj.start(1), mj.end(1)))
+            for k, begin, end in candidates:
+                if k in done or k in found:
+                    continue
+                value = text[begin:end].strip()
+                if value:
+                    found[k] = (begin, end, value)
+            # resume right after the start of the match, not its end, so text inside
+            # this match is still seen by the other rules
+            pos = m.start() + 1
+        return found
+
+    def extract(self, ctx: PdfContext):
+        """Returns ({field: value}, citations)."""
+        fields: Dict[str, object] = {}
+        citations = []
+        done = set()
+        prev = None  # (page, words, starts, text) of the previous page
+        for p in range(len(ctx)):
+            if len(done) == len(self.rules):
+                break
+            words = ctx.words(p)
+            text, starts = page_text_index(words)
+            carry = prev[3][-RULE_CARRY_CHARS:] if prev else ""
+            shift = len(carry) + 1 if carry else 0
+            scanned = f"{carry}\n{text}" if carry else text
+            for i, (begin, end, value) in sorted(self._hits(scanned, done).items(), key=lambda h: h[1][0]):
+                rule = self.rules[i]
+                done.add(i)
+                if rule.kind == "number":
+                    value = _number(value)
+                for field in rule.fields:
+                    fields.setdefault(field, value)
+                if not rule.cite:
+                    continue
+                if begin >= shift:
+                    page, bbox = p, _span_bbox(words, starts, begin - shift, end - shift)
+                else:
+                    # starts on the previous page: cite the part printed there
+                    base = len(prev[3]) - len(carry)
+                    page, bbox = prev[0], _span_bbox(prev[1], prev[2], base + begin, base + min(end, len(carry)))
+                if bbox:
+                    for field in rule.fields:
+                        citations.append({"field": field, "page": page, "bbox": bbox, "snippet": value})
+            prev = (p, words, starts, text)
+        return fields, citations
+
+
+RULE_SETS: Dict[str, RuleSet] = {}
+
+
+def register_rule_set(doc_type: str, rules: List[FieldRule]) -> RuleSet:
+    RULE_SETS[doc_type] = RuleSet(rules)
+    return RULE_SETS[doc_type]
+
+
+def get_rule_set(doc_type: str) -> Optional[RuleSet]:
+    return RULE_SETS.get(doc_type)
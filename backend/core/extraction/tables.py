@@ -1,15 +1,119 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
 import camelot
 
-def extract_tables(path: str):
-    tables = []
-    try:
-        t1 = camelot.read_pdf(path, pages="all", flavor="lattice")
-        tables.extend(list(t1))
-    except Exception:
-        pass
+from .context import PdfContext
+from .cache import PIPELINE_VERSION, cache_key, get_cache
+from .utils import visual_lines
+
+logger = logging.getLogger(__name__)
+
+# worker processes for per-page Camelot runs; 1 runs them inline
+TABLE_WORKERS = int(os.getenv("TABLE_WORKERS", str(os.cpu_count() or 1)))
+
+def _rulings(ctx: PdfContext, i: int):
+    """Count horizontal and vertical ruling lines drawn on the page."""
+    h = v = 0
+    for d in ctx.drawings(i):
+        for item in d.get("items", []):
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                if abs(p1.y - p2.y) < 1 and abs(p1.x - p2.x) > 10:
+                    h += 1
+                elif abs(p1.x - p2.x) < 1 and abs(p1.y - p2.y) > 10:
+                    v += 1
+            elif item[0] == "re":
+                r = item[1]
+                if r.height < 2 and r.width > 10:
+                    h += 1
+                elif r.width < 2 and r.height > 10:
+                    v += 1
+                elif r.width > 10 and r.height > 10 and not d.get("fill"):
+                    # stroked cell outline
+                    h += 2
+                    v += 2
+    return h, v
+
+def _tabular_lines(ctx: PdfContext, i: int, gap=15.0):
+    """Number of text lines split into 3+ cells by wide horizontal gaps."""
+    count = 0
+    for ws in visual_lines(ctx.words(i)):
+        ws.sort(key=lambda w: w[0])
+        cells = 1 + sum(1 for a, b in zip(ws, ws[1:]) if b[0] - a[2] > gap)
+        if cells >= 3:
+            count += 1
+    return count
+
+def classify_page(ctx: PdfContext, i: int):
+    """
+    "lattice" when the page has ruling lines around a table, "stream" when it has
+    column-aligned text without rulings, None when it does not look like a table.
+    """
+    h, v = _rulings(ctx, i)
+    tabular = _tabular_lines(ctx, i)
+    if h >= 3 and v >= 2:
+        return "lattice"
+    if tabular >= 3:
+        return "stream"
+    return None
+
+def _read_page_tables(path: str, page_no: int, flavor: str):
+    """Camelot on one 1-based page; runs in pool workers."""
     try:
-        t2 = camelot.read_pdf(path, pages="all", flavor="stream")
-        tables.extend(list(t2))
-    except Exception:
-        pass
-    return tables
+        tables = camelot.read_pdf(path, pages=str(page_no), flavor=flavor)
+    except Exception as e:
+        logger.warning("camelot %s failed on page %s: %s", flavor, page_no, e)
+        return []
+    return [
+        {"page": page_no - 1, "flavor": flavor, "bbox": list(getattr(t, "_bbox", (0, 0, 0, 0))), "df": t.df}
+        for t in tables
+    ]
+
+def _iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def dedupe_tables(tables, threshold=0.5):
+    """Drop tables that overlap a larger table on the same page by more than `threshold` IoU."""
+    kept = []
+    for t in sorted(tables, key=lambda t: (t["page"], -t["df"].size)):
+        if any(k["page"] == t["page"] and _iou(k["bbox"], t["bbox"]) > threshold for k in kept):
+            continue
+        kept.append(t)
+    return sorted(kept, key=lambda t: (t["page"], -t["bbox"][3]))
+
+def extract_tables(ctx: PdfContext, workers=None):
+    """
+    Classify every page, then run only the matching Camelot flavor on pages that
+    look like tables, one page per task across a process pool. When no page is
+    classified, stream is tried on pages that have any text.
+    Returns [{"page", "flavor", "bbox", "df"}] in page order.
+    """
+    workers = TABLE_WORKERS if workers is None else workers
+    plan = [(i, classify_page(ctx, i)) for i in range(len(ctx))]
+    plan = [(i, f) for i, f in plan if f]
+    if not plan:
+        plan = [(i, "stream") for i in range(len(ctx)) if ctx.words(i)]
+
+    if workers > 1 and len(plan) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(plan))) as pool:
+            futs = [pool.submit(_read_page_tables, ctx.path, i + 1, f) for i, f in plan]
+            found = [t for fut in futs for t in fut.result()]
+    else:
+        found = [t for i, f in plan for t in _read_page_tables(ctx.path, i + 1, f)]
+    return dedupe_tables(found)
+
+def extract_table_frames(ctx: PdfContext):
+    """extract_tables(), cached by file hash (recomputed when "tables" is in ctx.refresh)."""
+    key = cache_key(ctx.sha256, PIPELINE_VERSION)
+    with ctx.timed("tables"):
+        if "tables" in ctx.refresh:
+            tables = extract_tables(ctx)
+            get_cache().set("tables", key, tables)
+            return tables
+        return get_cache().get_or_compute("tables", key, lambda: extract_tables(ctx))
@@ -1,25 +1,108 @@
-import fitz
+import re
+
+from .context import PdfContext
+
+# first number in a cell: "$1,250.00", "700 sf", "1,000 - 1,100" (-> 1,000)
+NUMBER_RE = re.compile(r"[-+]?\d{1,3}(?:,\d{3})+(?:\.\d+)?|[-+]?\d+(?:\.\d+)?")
+# unit columns returned as numbers by every rent-roll extractor
+UNIT_NUMBER_FIELDS = ("rent", "sqft")
+
+
+def first_number(v):
+    """The first number in a cell as a float, or None (same rule as persistence.to_float)."""
+    m = NUMBER_RE.search(str(v)) if v is not None else None
+    return float(m.group(0).replace(",", "")) if m else None
+
+_PUNCT = ".,:;#()[]{}*\"'"
+
+def normalize_token(text: str) -> str:
+    return (text or "").strip().strip(_PUNCT).lower()
+
+class LabelMatcher:
+    """
+    Labels compiled once into normalized token sequences keyed by their first token,
+    so one scan over a page's lines finds every label, including multi-word ones
+    such as "Year Built" that never equal a single word.
+    """
+
+    def __init__(self, labels):
+        self.by_first = {}
+        for order, label in enumerate(labels):
+            tokens = [normalize_token(t) for t in label.split()]
+            tokens = [t for t in tokens if t]
+            if tokens:
+                self.by_first.setdefault(tokens[0], []).append((tokens, label, order))
+
+    def scan(self, lines):
+        """Yield (label, [words]) for every label occurrence, in reading order."""
+        for line in lines:
+            norm = [normalize_token(w[4]) for w in line]
+            for i, tok in enumerate(norm):
+                for tokens, label, _ in self.by_first.get(tok, ()):
+                    if norm[i:i + len(tokens)] == tokens:
+                        yield label, line[i:i + len(tokens)]
+
+class WordIndex:
+    """
+    Per-page spatial index over PyMuPDF word tuples: words are bucketed into
+    horizontal bands of `band` points, so the value next to a label is found by
+    looking only at the bands the label spans instead of every word on the page.
+    """
+
+    def __init__(self, words, band: float = 12.0):
+        self.band = band
+        self.lines = [sorted(line, key=lambda w: w[0]) for line in visual_lines(words)]
+        self.bands = {}
+        for w in words:
+            self.bands.setdefault(int(w[1] // band), []).append(w)
+
+    def value_right_of(self, x1, y0, y1, ypad=12, max_dx=400, exclude=()):
+        best = None
+        for b in range(int((y0 - ypad) // self.band), int((y1 + ypad) // self.band) + 1):
+            for w in self.bands.get(b, ()):
+                if w[1] >= y0 - ypad and w[3] <= y1 + ypad and x1 <= w[0] <= x1 + max_dx:
+                    if any(w is e for e in exclude):
+                        continue
+                    if best is None or w[0] < best[0]:
+                        best = w
+        return best
+
+    def find_values(self, labels, ypad=12, matcher=None):
+        """
+        {label: {"value", "bbox"}} for every label that has a word to its right,
+        taking the first occurrence in reading order. All labels resolve in one scan.
+        """
+        matcher = matcher or LabelMatcher(labels)
+        found = {}
+        for label, hit in matcher.scan(self.lines):
+            if label in found:
+                continue
+            x1 = max(w[2] for w in hit)
+            y0 = min(w[1] for w in hit)
+            y1 = max(w[3] for w in hit)
+            best = self.value_right_of(x1, y0, y1, ypad=ypad, exclude=hit)
+            if best is not None:
+                found[label] = {"value": best[4], "bbox": [best[0], best[1], best[2], best[3]]}
+        return found
 
 def find_value_near(words, label_text: str, xpad=40, ypad=12):
-    label_hits = [w for w in words if w[4].strip().lower() == label_text.lower()]
-    for w in label_hits:
-        x0,y0,x1,y1,_,_,_,_ = w
-        candidates = []
-        for ww in words:
-            X0,Y0,X1,Y1,txt, *_ = ww
-            if Y0 >= y0 - ypad and Y1 <= y1 + ypad and X0 >= x1 and X0 <= x1 + 400:
-                candidates.append(ww)
-        if candidates:
-            best = sorted(candidates, key=lambda c: c[0])[0]
-            return {"value": best[4], "bbox": [best[0], best[1], best[2], best[3]]}
-    return None
-
-def sections_from_layout(path: str):
-    doc = fitz.open(path)
+    return WordIndex(words).find_values([label_text], ypad=ypad).get(label_text)
+
+def visual_lines(words):
+    """Group words into lines by vertical center, regardless of PDF block/line numbering."""
+    lines = []
+    for w in sorted(words, key=lambda w: (w[1] + w[3]) / 2):
+        cy, h = (w[1] + w[3]) / 2, max(1.0, w[3] - w[1])
+        if lines and abs(cy - lines[-1][0]) < h / 2:
+            lines[-1][1].append(w)
+        else:
+            lines.append([cy, [w]])
+    return [ws for _, ws in lines]
+
+def sections_from_layout(ctx: PdfContext):
     sections = []
-    for i, page in enumerate(doc):
-        blocks = page.get_text("blocks")
-        for b in blocks:
+    for i in range(len(ctx)):
+        for b in ctx.blocks(i):
             x0, y0, x1, y1, text, *rest = b
             if text and len(text.strip()) > 40:  
                 sections.append({
@@ -0,0 +1,268 @@
+"""
+Batch ingest of PDF folders or manifests (`manage.py ingest`).
+
+Local mode stores each file as a Document, queues an ExtractionJob and drains the
+queue with the extraction workers from core.jobs. Remote mode uploads through the
+API over one pooled HTTP session. Both checkpoint every file to a JSON-lines state
+file, so an interrupted run resumes where it stopped: finished files are skipped
+and files already uploaded are not uploaded again.
+"""
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+from django.core.files import File
+from django.db import connections
+
+from .jobs import start_workers, work
+from .models import Document, ExtractionJob
+from .serializers import ExtractionJobSerializer
+
+STATE_FILE = ".ingest_state.jsonl"
+DONE_STATUSES = (ExtractionJob.DONE, ExtractionJob.FAILED)
+
+
+@dataclass(frozen=True)
+class IngestItem:
+    path: str
+    doc_type: str = "auto"
+
+    @property
+    def key(self):
+        st = os.stat(self.path)
+        return f"{os.path.abspath(self.path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def discover(source: str, doc_type: str = "auto"):
+    """
+    Items to ingest from a folder (every *.pdf below it, sorted) or a manifest:
+    a .csv with a `path` column and optional `doc_type` column, a .jsonl of
+    {"path", "doc_type"} objects, or a plain list of paths. Relative manifest
+    paths are resolved against the manifest's folder.
+    """
+    if os.path.isdir(source):
+        found = []
+        for root, dirs, files in os.walk(source):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            found.extend(os.path.join(root, f) for f in files if f.lower().endswith(".pdf"))
+        return [IngestItem(p, doc_type) for p in sorted(found)]
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, newline="") as f:
+        if source.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        elif source.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = [{"path": line.strip()} for line in f if line.strip() and not line.startswith("#")]
+    return [
+        IngestItem(os.path.join(base, r["path"]), (r.get("doc_type") or doc_type).lower())
+        for r in rows
+    ]
+
+
+class IngestState:
+    """
+    Append-only JSON-lines checkpoint; the last line for a file wins. A file is
+    keyed by absolute path, size and mtime, so an edited file is ingested again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line of an interrupted run
+                    self.entries[entry["key"]] = entry
+
+    def get(self, item: IngestItem):
+        return self.entries.get(item.key)
+
+    def record(self, item: IngestItem, **fields):
+        entry = {**(self.get(item) or {}), "key": item.key, "path": item.path, **fields}
+        with self._lock:
+            self.entries[item.key] = entry
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+        return entry
+
+
+class IngestStats:
+    """Throughput and per-stage timing of one ingest run."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.missing = []
+        self.pages = 0
+        self.stages = {}
+
+    def add(self, job: dict):
+        if job["status"] != ExtractionJob.DONE:
+            self.failed += 1
+            return
+        self.done += 1
+        self.pages += job.get("pages") or 0
+        for stage, seconds in (job.get("timings") or {}).items():
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def summary(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "missing": self.missing,
+            "pages": self.pages,
+            "seconds": round(elapsed, 2),
+            "docs_per_sec": round(self.done / elapsed, 3),
+            "pages_per_sec": round(self.pages / elapsed, 3),
+            "stages": {
+                stage: {"total": round(s, 3), "per_doc": round(s / max(self.done, 1), 3)}
+                for stage, s in sorted(self.stages.items())
+            },
+        }
+
+
+def _todo(items, state, stats, retry_failed):
+    for item in items:
+        if not os.path.isfile(item.path):
+            stats.missing.append(item.path)
+            continue
+        entry = state.get(item) or {}
+        if entry.get("status") == ExtractionJob.DONE or (entry.get("status") == ExtractionJob.FAILED and not retry_failed):
+            stats.skipped += 1
+            continue
+        yield item, entry
+
+
+def _queue_local(item, entry):
+    """
+    Reuse the Document and the unfinished job of an earlier run, else store the
+    file. A job still RUNNING is left alone: its worker may be alive, and if it
+    is not, claim_next_job reclaims the job once EXTRACTION_JOB_TIMEOUT passes.
+    """
+    doc = Document.objects.filter(pk=entry.get("document_id")).first() if entry.get("document_id") else None
+    if doc is None:
+        with open(item.path, "rb") as f:
+            doc = Document.objects.create(
+                file=File(f, name=os.path.basename(item.path)),
+                doc_type=item.doc_type if item.doc_type != "auto" else Document.FLYER,
+            )
+    job = ExtractionJob.objects.filter(pk=entry.get("job_id"), document=doc).first() if entry.get("job_id") else None
+    if job is None or job.status not in (ExtractionJob.QUEUED, ExtractionJob.RUNNING):
+        job = ExtractionJob.objects.create(document=doc, doc_type=item.doc_type)
+    return doc, job
+
+
+def ingest_local(items, state: IngestState, workers: int = 2, poll: float = 0.5,
+                 retry_failed: bool = False, on_result=None):
+    """
+    Queue every unfinished item and drain the queue with `workers` extraction
+    processes (in this process when workers <= 1). Workers also pick up jobs
+    queued by others. Returns IngestStats.
+    """
+    stats = IngestStats()
+    pending = {}
+    for item, entry in _todo(items, state, stats, retry_failed):
+        doc, job = _queue_local(item, entry)
+        state.record(item, status=ExtractionJob.QUEUED, document_id=doc.pk, job_id=job.pk)
+        pending[job.pk] = item
+
+    procs = [] if workers <= 1 or not pending else start_workers(workers, poll_interval=poll, once=True)
+    if workers <= 1:
+        work(once=True)
+    while pending:
+        alive = any(p.is_alive() for p in procs)
+        finished = ExtractionJob.objects.filter(pk__in=list(pending), status__in=DONE_STATUSES).select_related("document")
+        for job in finished:
+            data = ExtractionJobSerializer(job).data
+            item = pending.pop(job.pk)
+            state.record(item, status=data["status"], pages=data["pages"], timings=data["timings"],
+                         seconds=data["run_seconds"], error=data["error"])
+            stats.add(data)
+            if on_result:
+                on_result(item, data)
+        if pending and not alive:
+            break  # queue drained but jobs still running elsewhere; a rerun picks them up
+        if pending:
+            time.sleep(poll)
+    for p in procs:
+        p.join()
+    connections.close_all()
+    return stats
+
+
+def _session(workers: int):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=3)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _upload_and_wait(session, api, item, entry, state, poll, timeout):
+    job_id = entry.get("job_id")
+    if not job_id:
+        with open(item.path, "rb") as f:
+            r = session.post(f"{api}/upload/", files={"file": (os.path.basename(item.path), f, "application/pdf")},
+                             data={"doc_type": item.doc_type}, timeout=timeout)
+        r.raise_for_status()
+        body = r.json()
+        job_id = body["job_id"]
+        state.record(item, status=ExtractionJob.QUEUED, document_id=body["document_id"], job_id=job_id)
+    while True:
+        r = session.get(f"{api}/jobs/{job_id}/", timeout=timeout)
+        if r.status_code == 404:
+            # the server lost the job: upload again next run
+            state.record(item, status=None, job_id=None)
+        r.raise_for_status()
+        job = r.json()
+        if job["status"] in DONE_STATUSES:
+            return job
+        time.sleep(poll)
+
+
+def ingest_remote(items, state: IngestState, api: str, workers: int = 4, poll: float = 1.0,
+                  retry_failed: bool = False, timeout: float = 120.0, on_result=None):
+    """
+    Upload unfinished items to `api` from `workers` threads sharing one pooled
+    session and wait for their jobs. Returns IngestStats.
+    """
+    stats = IngestStats()
+    api = api.rstrip("/")
+    session = _session(workers)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futs = {
+            pool.submit(_upload_and_wait, session, api, item, entry, state, poll, timeout): item
+            for item, entry in _todo(items, state, stats, retry_failed)
+        }
+        for fut in as_completed(futs):
+            item = futs[fut]
+            try:
+                job = fut.result()
+            except Exception as e:
+                # transport errors leave the file unfinished so a rerun retries it
+                job = {"status": ExtractionJob.FAILED, "error": f"{type(e).__name__}: {e}"}
+            else:
+                state.record(item, status=job["status"], pages=job.get("pages"), timings=job.get("timings"),
+                             seconds=job.get("run_seconds"), error=job.get("error"))
+            stats.add(job)
+            if on_result:
+                on_result(item, job)
+    session.close()
+    return stats
@@ -0,0 +1,153 @@
+"""
+DB-backed extraction queue.
+
+UploadView only stores the file and enqueues an ExtractionJob; worker processes
+started by `manage.py extraction_worker` claim queued jobs and run the extraction
+pipeline plus persistence. No external broker is needed: the jobs table is the queue.
+"""
+import json
+import logging
+import multiprocessing
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import ExtractionJob
+from .persistence import apply_result, persist_result
+from .search import index_document
+from .tiles import pregenerate_thumbnail
+from .extraction.pipeline import REEXTRACT_STAGES, extract
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(document, doc_type: str) -> ExtractionJob:
+    job = ExtractionJob.objects.create(document=document, doc_type=doc_type)
+    if getattr(settings, "EXTRACTION_EAGER", False):
+        run_job(job)
+    return job
+
+
+def enqueue_reextract(documents, stages=(), batch_size: int = 1000):
+    """
+    Queue a re-extraction of each document, recomputing `stages` (a subset of
+    REEXTRACT_STAGES) and reusing every other cached artifact. The document's
+    last requested doc_type is reused. Returns the number of jobs queued.
+    """
+    unknown = set(stages) - set(REEXTRACT_STAGES)
+    if unknown:
+        raise ValueError(f"unknown stages {sorted(unknown)}; choose from {list(REEXTRACT_STAGES)}")
+    last_type = ExtractionJob.objects.filter(document=OuterRef("pk")).order_by("-id").values("doc_type")[:1]
+    docs = documents.annotate(requested_type=Subquery(last_type)).values_list("pk", "requested_type", "doc_type")
+    jobs = [
+        ExtractionJob(document_id=pk, doc_type=requested or doc_type, stages=",".join(stages), reextract=True)
+        for pk, requested, doc_type in docs.iterator(chunk_size=batch_size)
+    ]
+    ExtractionJob.objects.bulk_create(jobs, batch_size=batch_size)
+    if getattr(settings, "EXTRACTION_EAGER", False):
+        for job in ExtractionJob.objects.filter(pk__in=[j.pk for j in jobs]):
+            run_job(job)
+    return len(jobs)
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest claimable job to RUNNING and return it.
+    Claimable are queued jobs and jobs left RUNNING for longer than
+    EXTRACTION_JOB_TIMEOUT seconds, whose worker crashed or was restarted.
+    The conditional UPDATE acts as a compare-and-set on (status, started_at),
+    so several worker processes can poll the same table without picking the
+    same job, and a reclaimed job is taken by one of them only.
+    """
+    while True:
+        cutoff = timezone.now() - timedelta(seconds=settings.EXTRACTION_JOB_TIMEOUT)
+        job = (
+            ExtractionJob.objects
+            .filter(Q(status=ExtractionJob.QUEUED) | Q(status=ExtractionJob.RUNNING, started_at__lt=cutoff))
+            .order_by("id")
+            .first()
+        )
+        if job is None:
+            return None
+        claimed = ExtractionJob.objects.filter(pk=job.pk, status=job.status, started_at=job.started_at).update(
+            status=ExtractionJob.RUNNING, started_at=timezone.now()
+        )
+        if claimed:
+            if job.status == ExtractionJob.RUNNING:
+                logger.warning("reclaiming extraction job %s, running since %s", job.pk, job.started_at)
+            job.refresh_from_db()
+            return job
+
+
+def run_job(job: ExtractionJob) -> ExtractionJob:
+    if job.status == ExtractionJob.QUEUED:
+        job.status = ExtractionJob.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at"])
+
+    d = job.document
+    try:
+        res = extract(d.file.path, job.doc_type, refresh=job.stage_list() if job.reextract else None)
+        logger.info("EXTRACT RESULT (doc %s): %s", d.id, json.dumps(res, indent=2, default=str))
+        if isinstance(res, dict) and res.get("doc_type"):
+            d.doc_type = res["doc_type"]
+        d.pages = res.get("pages") or 0
+        d.save()
+        job.timings = res.get("timings")
+
+        with transaction.atomic():
+            if job.reextract:
+                prop, job.changes = apply_result(d, res)
+            else:
+                prop = persist_result(d, res)
+            index_document(d.pk)
+
+        job.property = prop
+        job.status = ExtractionJob.DONE
+        try:
+            pregenerate_thumbnail(d)
+        except Exception as e:
+            # the viewer renders it on demand instead
+            logger.warning("thumbnail for document %s failed: %s", d.id, e)
+    except Exception as e:
+        logger.exception("extraction job %s failed: %s", job.id, e)
+        job.status = ExtractionJob.FAILED
+        job.error = f"{type(e).__name__}: {e}"
+
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def work(poll_interval: float = 1.0, once: bool = False):
+    """Claim and run jobs until the queue is empty (once=True) or forever."""
+    while True:
+        job = claim_next_job()
+        if job is not None:
+            run_job(job)
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+def _worker_main(poll_interval: float, once: bool):
+    # forked children must not reuse the parent's DB connection
+    connections.close_all()
+    work(poll_interval=poll_interval, once=once)
+
+
+def start_workers(count: int, poll_interval: float = 1.0, once: bool = False):
+    connections.close_all()
+    procs = []
+    for i in range(count):
+        p = multiprocessing.Process(
+            target=_worker_main, args=(poll_interval, once), name=f"extraction-worker-{i}"
+        )
+        p.start()
+        procs.append(p)
+    return procs
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from core.extraction.cache import get_cache
+from core.extraction.llm import cost_usd
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters of the extraction cache, or clear it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clear", action="store_true", help="drop cached entries and counters")
+        parser.add_argument("--namespace", help="limit --clear to one namespace (result, ocr, tables, llm, llm_response)")
+
+    def handle(self, *args, **opts):
+        cache = get_cache()
+        if opts["clear"]:
+            cache.clear(opts["namespace"])
+            self.stdout.write("Cleared extraction cache")
+            return
+
+        self.stdout.write(f"{cache.path} (max {cache.max_bytes // (1024 * 1024)} MB)")
+        for ns, s in sorted(cache.stats().items()):
+            lookups = s["hits"] + s["misses"]
+            rate = (100.0 * s["hits"] / lookups) if lookups else 0.0
+            self.stdout.write(
+                f"{ns:8} hits={s['hits']} misses={s['misses']} hit_rate={rate:.1f}% "
+                f"entries={s['entries']} bytes={s['bytes']}"
+            )
+            saved_in, saved_out = s["saved_input_tokens"], s["saved_output_tokens"]
+            if saved_in or saved_out:
+                self.stdout.write(
+                    f"{'':8} saved tokens in={saved_in} out={saved_out} (~${cost_usd(saved_in, saved_out):.2f})"
+                )
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.jobs import start_workers, work
+
+
+class Command(BaseCommand):
+    help = "Run extraction worker processes that drain the ExtractionJob queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=getattr(settings, "EXTRACTION_WORKERS", 2))
+        parser.add_argument("--poll", type=float, default=1.0, help="seconds to sleep when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="exit when the queue is empty")
+
+    def handle(self, *args, **opts):
+        workers = max(1, opts["workers"])
+        if workers == 1:
+            self.stdout.write("Starting 1 extraction worker (in-process)")
+            work(poll_interval=opts["poll"], once=opts["once"])
+            return
+
+        self.stdout.write(f"Starting {workers} extraction workers")
+        procs = start_workers(workers, poll_interval=opts["poll"], once=opts["once"])
+        try:
+            for p in procs:
+                p.join()
+        except KeyboardInterrupt:
+            for p in procs:
+                p.terminate()
@@ -0,0 +1,62 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ingest import STATE_FILE, IngestState, discover, ingest_local, ingest_remote
+
+
+class Command(BaseCommand):
+    help = (
+        "Ingest a folder of PDFs (recursively) or a manifest (.csv/.jsonl/list of paths). "
+        "Runs extraction in local worker processes, or uploads to --api over a pooled HTTP "
+        "session. Progress is checkpointed to a state file so an interrupted run resumes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="folder of PDFs or manifest file")
+        parser.add_argument("--doc-type", default="auto", help="doc_type for files the manifest does not type")
+        parser.add_argument("--workers", type=int, default=getattr(settings, "EXTRACTION_WORKERS", 2))
+        parser.add_argument("--api", help="upload to this API base URL (e.g. http://host:8000/api) instead of running locally")
+        parser.add_argument("--state", help=f"checkpoint file (default: {STATE_FILE} next to the source)")
+        parser.add_argument("--retry-failed", action="store_true", help="run files that failed last time again")
+        parser.add_argument("--poll", type=float, default=0.5, help="seconds between job status checks")
+
+    def handle(self, *args, **opts):
+        source = opts["source"]
+        if not os.path.exists(source):
+            raise CommandError(f"{source} does not exist")
+        items = discover(source, opts["doc_type"].lower())
+        folder = source if os.path.isdir(source) else os.path.dirname(os.path.abspath(source))
+        state = IngestState(opts["state"] or os.path.join(folder, STATE_FILE))
+        self.stdout.write(f"{len(items)} files in {source}; checkpointing to {state.path}")
+
+        seen = [0]
+
+        def progress(item, job):
+            seen[0] += 1
+            line = f"[{seen[0]}] {item.path}: {job['status']}"
+            if job.get("pages"):
+                line += f", {job['pages']} pages"
+            if job.get("run_seconds") is not None:
+                line += f", {job['run_seconds']:.2f}s"
+            if job.get("error"):
+                line += f" ({job['error']})"
+            self.stdout.write(line)
+
+        kwargs = dict(workers=opts["workers"], poll=opts["poll"], retry_failed=opts["retry_failed"], on_result=progress)
+        if opts["api"]:
+            stats = ingest_remote(items, state, opts["api"], **kwargs)
+        else:
+            stats = ingest_local(items, state, **kwargs)
+
+        s = stats.summary()
+        self.stdout.write(
+            f"Done: {s['done']} ingested, {s['failed']} failed, {s['skipped']} skipped, "
+            f"{len(s['missing'])} missing in {s['seconds']}s "
+            f"({s['docs_per_sec']} docs/s, {s['pages']} pages, {s['pages_per_sec']} pages/s)"
+        )
+        for path in s["missing"]:
+            self.stdout.write(f"  missing: {path}")
+        for stage, t in s["stages"].items():
+            self.stdout.write(f"  {stage:<7} {t['total']:>9.2f}s total  {t['per_doc']:>7.2f}s/doc")
@@ -0,0 +1,116 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+
+from core.models import Document, FieldCitation, Property, Unit
+from core.views import _contains_filter
+
+INDEXED_MODELS = (Property, Unit, FieldCitation)
+
+
+def _cases(unit_id: int, property_id: int):
+    """(label, query before migration 0007, query now) for each hot lookup."""
+    return [
+        ("citations for a record",
+         FieldCitation.objects.filter(model_name="Unit", record_id=unit_id),
+         FieldCitation.objects.filter(model_name="Unit", record_id=unit_id)),
+        ("properties ?city=aus",
+         Property.objects.filter(city__icontains="aus").order_by("id")[:25],
+         _contains_filter(Property.objects.all(), "city_norm", "aus").order_by("id")[:25]),
+        ("properties ?state=tx&city=aus",
+         Property.objects.filter(state__icontains="tx", city__icontains="aus").order_by("id")[:25],
+         _contains_filter(_contains_filter(Property.objects.all(), "state_norm", "tx"), "city_norm", "aus").order_by("id")[:25]),
+        ("properties ?name=oak",
+         Property.objects.filter(name__icontains="oak").order_by("id")[:25],
+         _contains_filter(Property.objects.all(), "name_norm", "oak").order_by("id")[:25]),
+        ("properties ?min_units=400",
+         Property.objects.filter(unit_count__gte=400).order_by("id")[:25],
+         Property.objects.filter(unit_count__gte=400).order_by("id")[:25]),
+        ("properties ?max_rent=600",
+         Property.objects.filter(units__rent__lte=600).distinct().order_by("id")[:25],
+         Property.objects.filter(Exists(Unit.objects.filter(property=OuterRef("pk"), rent__lte=600))).order_by("id")[:25]),
+        ("units ?property_id=&beds=3",
+         Unit.objects.filter(property_id=property_id, beds__icontains="3").order_by("id"),
+         _contains_filter(Unit.objects.filter(property_id=property_id), "beds_norm", "3").order_by("id")),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Show query plans and timings of the filter and citation lookups with and without the "
+        "indexes of migration 0007. Runs in a transaction that is rolled back; --seed adds "
+        "synthetic rows for the duration of the run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="synthetic properties to add (10 units, 20 citations each)")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **opts):
+        with transaction.atomic():
+            if opts["seed"]:
+                self._seed(opts["seed"])
+            unit = Unit.objects.order_by("-id").first()
+            cases = _cases(unit.pk, unit.property_id) if unit else _cases(0, 0)
+            # not entered as a context manager: only used to render CREATE INDEX statements
+            editor = connection.schema_editor(collect_sql=True)
+            indexes = [(model, index) for model in INDEXED_MODELS for index in model._meta.indexes]
+            with connection.cursor() as cursor:
+                for model, index in indexes:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
+                before = [self._measure(old, opts["repeat"]) for _, old, _ in cases]
+                for model, index in indexes:
+                    cursor.execute(str(index.create_sql(model, editor)))
+                cursor.execute("ANALYZE")
+                after = [self._measure(now, opts["repeat"]) for _, _, now in cases]
+            transaction.set_rollback(True)
+
+        for (label, _, _), (b_ms, b_plan), (a_ms, a_plan) in zip(cases, before, after):
+            self.stdout.write(f"\n== {label}: {b_ms:.2f} ms -> {a_ms:.2f} ms")
+            self.stdout.write(f"  before: {b_plan}")
+            self.stdout.write(f"  after:  {a_plan}")
+
+    def _measure(self, qs, repeat):
+        plan = " | ".join(line.strip() for line in qs.explain().splitlines() if line.strip())
+        runs = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            list(qs.all())
+            runs.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(runs), plan
+
+    def _seed(self, n):
+        rnd = random.Random(0)
+        cities = ["Austin", "Dallas", "Houston", "Phoenix", "Denver", "Atlanta", "Boston", "Seattle"]
+        states = ["TX", "AZ", "CO", "GA", "MA", "WA"]
+        doc = Document.objects.create(file="uploads/query_plans.pdf", doc_type=Document.FLYER)
+        props = Property.objects.bulk_create(
+            [
+                Property(name=f"Property {i}", city=rnd.choice(cities), state=rnd.choice(states),
+                         unit_count=rnd.randint(1, 500), source_document=doc)
+                for i in range(n)
+            ],
+            batch_size=1000,
+        )
+        for start in range(0, n, 1000):
+            chunk = props[start:start + 1000]
+            units = Unit.objects.bulk_create(
+                [
+                    Unit(property=p, unit_number=str(u), beds=str(rnd.randint(0, 4)), rent=rnd.randint(500, 4000))
+                    for p in chunk for u in range(10)
+                ],
+                batch_size=1000,
+            )
+            FieldCitation.objects.bulk_create(
+                [
+                    FieldCitation(document=doc, model_name="Unit", record_id=u.pk, field_name=f, page=0,
+                                  x0=0, y0=0, x1=1, y1=1)
+                    for u in units for f in ("rent", "beds")
+                ],
+                batch_size=1000,
+            )
+        self.stdout.write(f"Seeded {n} properties, {10 * n} units, {20 * n} citations")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from core.search import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from the stored properties, units, sections and citations."
+
+    def handle(self, *args, **opts):
+        self.stdout.write(f"Indexed {rebuild()} records")
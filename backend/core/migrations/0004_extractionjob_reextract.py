@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_extractionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractionjob',
+            name='changes',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='extractionjob',
+            name='reextract',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='extractionjob',
+            name='stages',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_extractionjob_reextract'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractionjob',
+            name='timings',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.0.6 on 2026-10-18 01:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of the index DDL and backfill as they were when this migration was
+# written; later changes to core.search must not change what it does.
+FTS_TABLE = "core_search_fts"
+
+
+def _ddl(entry):
+    sqlite = [
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"title, body, kind, content='{entry}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER {entry}_ai AFTER INSERT ON {entry} BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, body, kind) VALUES (new.id, new.title, new.body, new.kind); END",
+        f"CREATE TRIGGER {entry}_ad AFTER DELETE ON {entry} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body, kind) "
+        f"VALUES ('delete', old.id, old.title, old.body, old.kind); END",
+        f"CREATE TRIGGER {entry}_au AFTER UPDATE ON {entry} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body, kind) "
+        f"VALUES ('delete', old.id, old.title, old.body, old.kind); "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, body, kind) VALUES (new.id, new.title, new.body, new.kind); END",
+    ]
+    postgres = [
+        f"ALTER TABLE {entry} ADD COLUMN tsv tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(body, '')), 'B')) STORED",
+        f"CREATE INDEX {entry}_tsv ON {entry} USING GIN (tsv)",
+    ]
+    return {"sqlite": sqlite, "postgresql": postgres}
+
+
+def _drop(entry):
+    sqlite = [
+        f"DROP TRIGGER IF EXISTS {entry}_ai",
+        f"DROP TRIGGER IF EXISTS {entry}_ad",
+        f"DROP TRIGGER IF EXISTS {entry}_au",
+        f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    ]
+    postgres = [
+        f"DROP INDEX IF EXISTS {entry}_tsv",
+        f"ALTER TABLE {entry} DROP COLUMN IF EXISTS tsv",
+    ]
+    return {"sqlite": sqlite, "postgresql": postgres}
+
+
+def create_index(apps, schema_editor):
+    entry = apps.get_model("core", "SearchEntry")._meta.db_table
+    for sql in _ddl(entry).get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    entry = apps.get_model("core", "SearchEntry")._meta.db_table
+    for sql in _drop(entry).get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def _cat(*cols):
+    return " || ' ' || ".join(f"COALESCE({c}, '')" for c in cols)
+
+
+def backfill(apps, schema_editor):
+    table = lambda name: apps.get_model("core", name)._meta.db_table
+    e, p, u = table("SearchEntry"), table("Property"), table("Unit")
+    s, c = table("Section"), table("FieldCitation")
+    cols = f"INSERT INTO {e} (kind, record_id, document_id, page, title, body)"
+    unit_body = _cat("p.name", "u.unit_type", "u.beds", "u.baths", "u.status", "CAST(u.rent AS TEXT)",
+                     "u.lease_start", "u.lease_end")
+    statements = [
+        f"{cols} SELECT 'property', p.id, p.source_document_id, NULL, p.name, "
+        f"{_cat('p.address', 'p.city', 'p.state', 'p.zipcode')} FROM {p} p",
+        f"{cols} SELECT 'unit', u.id, p.source_document_id, NULL, u.unit_number, {unit_body} "
+        f"FROM {u} u JOIN {p} p ON p.id = u.property_id",
+        f"{cols} SELECT 'section', s.id, s.document_id, s.page, s.title, s.text FROM {s} s",
+        f"{cols} SELECT 'citation', c.id, c.document_id, c.page, c.field_name, c.snippet FROM {c} c",
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_extractionjob_timings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16)),
+                ('record_id', models.IntegerField()),
+                ('page', models.IntegerField(null=True)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('document', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.document')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'record_id'], name='core_search_kind_ea6edb_idx')],
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
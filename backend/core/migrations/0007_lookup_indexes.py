@@ -0,0 +1,66 @@
+# Generated by Django 5.0.6 on 2026-10-18 01:49
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='city_norm',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('city')), output_field=models.CharField(max_length=128)),
+        ),
+        migrations.AddField(
+            model_name='property',
+            name='name_norm',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('name')), output_field=models.CharField(max_length=255)),
+        ),
+        migrations.AddField(
+            model_name='property',
+            name='state_norm',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('state')), output_field=models.CharField(max_length=64)),
+        ),
+        migrations.AddField(
+            model_name='unit',
+            name='beds_norm',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('beds')), output_field=models.CharField(max_length=16)),
+        ),
+        migrations.AddIndex(
+            model_name='fieldcitation',
+            index=models.Index(fields=['model_name', 'record_id'], name='core_cite_record_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['name_norm'], name='core_prop_name_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['city_norm'], name='core_prop_city_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['state_norm', 'city_norm'], name='core_prop_state_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('unit_count__isnull', False)), fields=['unit_count'], name='core_prop_unit_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(fields=['beds_norm'], name='core_unit_beds_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(fields=['property', 'beds_norm'], name='core_unit_prop_beds_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(condition=models.Q(('rent__isnull', False)), fields=['property', 'rent'], name='core_unit_prop_rent_idx'),
+        ),
+    ]
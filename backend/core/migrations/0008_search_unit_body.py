@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def _cat(*cols):
+    return " || ' ' || ".join(f"COALESCE({c}, '')" for c in cols)
+
+
+def reindex_unit_bodies(apps, schema_editor):
+    """Drop the parent property's name from indexed unit bodies; the triggers update the FTS table."""
+    entry = apps.get_model("core", "SearchEntry")._meta.db_table
+    unit = apps.get_model("core", "Unit")._meta.db_table
+    body = _cat("u.unit_type", "u.beds", "u.baths", "u.status", "CAST(u.rent AS TEXT)",
+                "u.lease_start", "u.lease_end")
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {entry} SET body = (SELECT {body} FROM {unit} u WHERE u.id = {entry}.record_id) "
+            f"WHERE kind = 'unit' AND record_id IN (SELECT id FROM {unit})"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(reindex_unit_bodies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# (model, column) of the substring filters of PropertiesList, UnitsList and ExportView
+TRIGRAM_COLUMNS = [("Property", "name_norm"), ("Property", "city_norm"), ("Property", "state_norm"), ("Unit", "beds_norm")]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """GIN trigram indexes serve LIKE '%...%' on Postgres; other backends have no equivalent and scan."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for model, column in TRIGRAM_COLUMNS:
+        table = apps.get_model("core", model)._meta.db_table
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {table} USING GIN ({column} gin_trgm_ops)")
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for model, column in TRIGRAM_COLUMNS:
+        table = apps.get_model("core", model)._meta.db_table
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_{column}_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_search_unit_body'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
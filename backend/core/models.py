@@ -1,4 +1,15 @@
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower, Trim
+
+
+def normalized(field: str, max_length: int):
+    """Lower-cased, trimmed copy of `field`, computed and stored by the database, for indexed filters."""
+    return models.GeneratedField(
+        expression=Lower(Trim(field)),
+        output_field=models.CharField(max_length=max_length),
+        db_persist=True,
+    )
 
 class Document(models.Model):
     RENT_ROLL = "rent_roll"
@@ -34,6 +45,17 @@ class Property(models.Model):
     unit_count = models.IntegerField(null=True, blank=True)
     cap_rate = models.FloatField(null=True, blank=True)
     source_document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, related_name="properties")
+    name_norm = normalized("name", 255)
+    city_norm = normalized("city", 128)
+    state_norm = normalized("state", 64)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["name_norm"], name="core_prop_name_norm_idx"),
+            models.Index(fields=["city_norm"], name="core_prop_city_norm_idx"),
+            models.Index(fields=["state_norm", "city_norm"], name="core_prop_state_city_idx"),
+            models.Index(fields=["unit_count"], name="core_prop_unit_count_idx", condition=Q(unit_count__isnull=False)),
+        ]
 
 class Unit(models.Model):
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="units")
@@ -46,6 +68,15 @@ class Unit(models.Model):
     status = models.CharField(max_length=64, blank=True)
     lease_start = models.CharField(max_length=64, blank=True)
     lease_end = models.CharField(max_length=64, blank=True)
+    beds_norm = normalized("beds", 16)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["beds_norm"], name="core_unit_beds_norm_idx"),
+            models.Index(fields=["property", "beds_norm"], name="core_unit_prop_beds_idx"),
+            # serves the correlated EXISTS behind PropertiesList's max_rent filter
+            models.Index(fields=["property", "rent"], name="core_unit_prop_rent_idx", condition=Q(rent__isnull=False)),
+        ]
 
 
 class FieldCitation(models.Model):
@@ -58,4 +89,52 @@ class FieldCitation(models.Model):
     y0 = models.FloatField()
     x1 = models.FloatField()
     y1 = models.FloatField()
-    snippet = models.CharField(max_length=500, blank=True)
\ No newline at end of file
+    snippet = models.CharField(max_length=500, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["model_name", "record_id"], name="core_cite_record_idx")]
+
+
+class SearchEntry(models.Model):
+    """
+    One searchable record (property, unit, section or citation snippet). Rows are
+    rebuilt per document by core.search.index_document; the full-text index over
+    them (FTS5 on SQLite, a tsvector column with a GIN index on Postgres) is
+    created by migration 0006 and kept in step by the database.
+    """
+    kind = models.CharField(max_length=16)  # "property", "unit", "section" or "citation"
+    record_id = models.IntegerField()
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, null=True, related_name="+")
+    page = models.IntegerField(null=True)
+    title = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["kind", "record_id"])]
+
+
+class ExtractionJob(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name="jobs")
+    doc_type = models.CharField(max_length=20)  # requested type, may be "auto" or "lease"
+    status = models.CharField(max_length=16, choices=STATUSES, default=QUEUED, db_index=True)
+    error = models.TextField(blank=True)
+    property = models.ForeignKey(Property, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    # comma-separated stages to recompute ("ocr,tables,llm"); blank for a first extraction
+    stages = models.CharField(max_length=64, blank=True)
+    reextract = models.BooleanField(default=False)
+    # per-model created/updated/deleted counts of a re-extraction
+    changes = models.JSONField(null=True, blank=True)
+    # wall seconds per pipeline stage (parse, ocr, tables, llm, cache) of the last run
+    timings = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def stage_list(self):
+        return [s for s in self.stages.split(",") if s]
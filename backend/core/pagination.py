@@ -0,0 +1,30 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key: each page is `WHERE id > <cursor> ORDER BY id
+    LIMIT n`, so deep pages cost the same as the first and no OFFSET scan is needed.
+    The total `count` is a separate COUNT(*) and is only computed when `?count=1`.
+    """
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if (request.query_params.get("count") or "").lower() in ("1", "true", "yes"):
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        body = {"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data}
+        if self.count is not None:
+            body["count"] = self.count
+        return Response(body)
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema["properties"]["count"] = {"type": "integer", "example": 123}
+        return schema
@@ -0,0 +1,264 @@
+from django.conf import settings
+
+from .models import Property, Unit, Section, FieldCitation
+from .extraction.utils import NUMBER_RE as _num_re
+
+def to_str(v) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, (int, float)):
+        return str(v)
+    return str(v).strip()
+
+def to_int(v):
+    if v is None or v == "":
+        return None
+    if isinstance(v, bool):
+        return int(v)
+    if isinstance(v, (int,)):
+        return v
+    s = str(v)
+    m = _num_re.search(s)
+    if not m:
+        return None
+    try:
+        return int(float(m.group(0).replace(",", "")))
+    except Exception:
+        return None
+
+def to_float(v):
+    if v is None or v == "":
+        return None
+    if isinstance(v, bool):
+        return float(v)
+    if isinstance(v, (int, float)):
+        return float(v)
+    s = str(v)
+    m = _num_re.search(s)
+    if not m:
+        return None
+    try:
+        return float(m.group(0).replace(",", ""))
+    except Exception:
+        return None
+
+def as_plain_str(v) -> str:
+    return "" if v is None else str(v).strip()
+
+
+def _bbox(v):
+    if not isinstance(v, (list, tuple)) or len(v) != 4:
+        return [0.0, 0.0, 0.0, 0.0]
+    try:
+        return [float(b) for b in v]
+    except Exception:
+        return [0.0, 0.0, 0.0, 0.0]
+
+def _clip(model, **values):
+    """Trim string values to their CharField max_length so bulk INSERTs never fail mid-batch."""
+    for name, v in values.items():
+        max_length = model._meta.get_field(name).max_length
+        if max_length and isinstance(v, str) and len(v) > max_length:
+            values[name] = v[:max_length]
+    return values
+
+def property_row(p_in, d):
+    return Property(
+        **_clip(
+            Property,
+            name=to_str(p_in.get("name")),
+            address=to_str(p_in.get("address")),
+            city=to_str(p_in.get("city")),
+            state=to_str(p_in.get("state")),
+            zipcode=as_plain_str(p_in.get("zipcode")),
+            year_built=to_str(p_in.get("year_built")),
+        ),
+        sqft=to_int(p_in.get("sqft")),
+        unit_count=to_int(p_in.get("unit_count")),
+        cap_rate=to_float(p_in.get("cap_rate")),
+        source_document=d,
+    )
+
+def unit_row(u, prop):
+    return Unit(
+        **_clip(
+            Unit,
+            unit_number=to_str(u.get("unit_number")),
+            unit_type=to_str(u.get("unit_type")),
+            beds=to_str(u.get("beds")),
+            baths=to_str(u.get("baths")),
+            status=to_str(u.get("status")),
+            lease_start=to_str(u.get("lease_start")),
+            lease_end=to_str(u.get("lease_end")),
+        ),
+        property=prop,
+        sqft=to_int(u.get("sqft")),
+        rent=to_float(u.get("rent")),
+    )
+
+def section_row(s, d):
+    x0, y0, x1, y1 = _bbox(s.get("bbox"))
+    return Section(
+        **_clip(Section, title=to_str(s.get("title"))),
+        document=d,
+        page=to_int(s.get("page")) or 0,
+        text=to_str(s.get("text")),
+        bbox_x0=x0, bbox_y0=y0, bbox_x1=x1, bbox_y1=y1,
+    )
+
+def citation_row(c, d, model_name, record_id):
+    x0, y0, x1, y1 = _bbox(c.get("bbox"))
+    return FieldCitation(
+        **_clip(FieldCitation, field_name=to_str(c.get("field")), snippet=to_str(c.get("snippet"))),
+        document=d,
+        model_name=model_name,
+        record_id=record_id,
+        page=to_int(c.get("page")) or 0,
+        x0=x0, y0=y0, x1=x1, y1=y1,
+    )
+
+
+def persist_result(d, res):
+    """
+    Write an extraction result for document `d` as Property/Unit/Section/FieldCitation rows.
+
+    Rows are coerced up front and written with bulk_create in PERSIST_BATCH_SIZE chunks,
+    so the number of INSERTs depends on batch size, not row count. A citation carrying
+    "unit_index" (position in res["units"]) is attached to that Unit's pk; all others
+    belong to the Property. Callers are expected to wrap this in a transaction.
+    """
+    batch_size = getattr(settings, "PERSIST_BATCH_SIZE", 500)
+    units_in = res.get("units") or []
+
+    prop = None
+    p_in = res.get("property") or {}
+    if p_in or units_in:
+        prop = property_row(p_in, d)
+        prop.save()
+
+    units = Unit.objects.bulk_create([unit_row(u, prop) for u in units_in], batch_size=batch_size)
+
+    Section.objects.bulk_create(
+        [section_row(s, d) for s in res.get("sections") or []], batch_size=batch_size
+    )
+
+    citations = []
+    for c in res.get("citations") or []:
+        idx = c.get("unit_index")
+        if isinstance(idx, int) and 0 <= idx < len(units):
+            citations.append(citation_row(c, d, "Unit", units[idx].pk))
+        else:
+            citations.append(citation_row(c, d, "Property", prop.id if prop else 0))
+    FieldCitation.objects.bulk_create(citations, batch_size=batch_size)
+
+    return prop
+
+
+def _fields(model, exclude=()):
+    return [
+        f.attname for f in model._meta.concrete_fields
+        if not f.primary_key and not f.generated and f.name not in exclude and f.attname not in exclude
+    ]
+
+PROPERTY_FIELDS = _fields(Property, exclude=("source_document",))
+UNIT_FIELDS = _fields(Unit, exclude=("property",))
+SECTION_FIELDS = _fields(Section, exclude=("document",))
+CITATION_FIELDS = _fields(FieldCitation, exclude=("document",))
+
+def _copy_changes(old, new, fields):
+    """Copy differing field values from `new` onto `old`; returns the changed field names."""
+    changed = [f for f in fields if getattr(old, f) != getattr(new, f)]
+    for f in changed:
+        setattr(old, f, getattr(new, f))
+    return changed
+
+def _sync(model, existing, wanted, key, fields, batch_size, counts):
+    """
+    Match `wanted` (unsaved rows) to `existing` rows by `key`, in order among equal
+    keys; bulk-update rows that differ, bulk-create the unmatched wanted rows and
+    delete the unmatched existing ones. Returns the saved row for each wanted row.
+    """
+    pool = {}
+    for row in existing:
+        pool.setdefault(key(row), []).append(row)
+
+    saved, to_update, to_create = [], [], []
+    for row in wanted:
+        candidates = pool.get(key(row))
+        if candidates:
+            old = candidates.pop(0)
+            if _copy_changes(old, row, fields):
+                to_update.append(old)
+            saved.append(old)
+        else:
+            to_create.append(row)
+            saved.append(row)
+
+    if to_update:
+        model.objects.bulk_update(to_update, fields, batch_size=batch_size)
+    if to_create:
+        model.objects.bulk_create(to_create, batch_size=batch_size)
+    stale = [row.pk for rows in pool.values() for row in rows]
+    if stale:
+        model.objects.filter(pk__in=stale).delete()
+    counts[model.__name__] = {"created": len(to_create), "updated": len(to_update), "deleted": len(stale)}
+    return saved
+
+def apply_result(d, res):
+    """
+    Bring the rows stored for document `d` in line with a new extraction result,
+    writing only what changed: units are matched by unit_number, sections by
+    (page, title) and citations by (record, field, page); matched rows are updated
+    only when a value differs, the rest are created or deleted. Row ids of unchanged
+    records survive a re-extraction. Returns (property, counts per model).
+    """
+    batch_size = getattr(settings, "PERSIST_BATCH_SIZE", 500)
+    counts = {}
+    units_in = res.get("units") or []
+    p_in = res.get("property") or {}
+
+    prop = Property.objects.filter(source_document=d).order_by("id").first()
+    counts["Property"] = {"created": 0, "updated": 0, "deleted": 0}
+    if p_in or units_in:
+        new = property_row(p_in, d)
+        if prop is None:
+            new.save()
+            prop = new
+            counts["Property"]["created"] = 1
+        else:
+            changed = _copy_changes(prop, new, PROPERTY_FIELDS)
+            if changed:
+                prop.save(update_fields=changed)
+                counts["Property"]["updated"] = 1
+
+    units = _sync(
+        Unit,
+        list(prop.units.order_by("id")) if prop else [],
+        [unit_row(u, prop) for u in units_in] if prop else [],
+        key=lambda u: u.unit_number.strip().upper(),
+        fields=UNIT_FIELDS, batch_size=batch_size, counts=counts,
+    )
+
+    _sync(
+        Section,
+        list(Section.objects.filter(document=d).order_by("id")),
+        [section_row(s, d) for s in res.get("sections") or []],
+        key=lambda s: (s.page, s.title),
+        fields=SECTION_FIELDS, batch_size=batch_size, counts=counts,
+    )
+
+    citations = []
+    for c in res.get("citations") or []:
+        idx = c.get("unit_index")
+        if isinstance(idx, int) and 0 <= idx < len(units):
+            citations.append(citation_row(c, d, "Unit", units[idx].pk))
+        else:
+            citations.append(citation_row(c, d, "Property", prop.id if prop else 0))
+    _sync(
+        FieldCitation,
+        list(FieldCitation.objects.filter(document=d).order_by("id")),
+        citations,
+        key=lambda c: (c.model_name, c.record_id, c.field_name, c.page),
+        fields=CITATION_FIELDS, batch_size=batch_size, counts=counts,
+    )
+    return prop, counts
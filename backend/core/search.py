@@ -0,0 +1,178 @@
+"""
+Full-text search over properties, units, sections and citation snippets.
+
+Every searchable record is copied into a SearchEntry row. The database indexes
+those rows itself: on SQLite an external-content FTS5 table kept in step by
+triggers, on Postgres a generated tsvector column with a GIN index. Queries go
+through the inverted index and are ranked (bm25 / ts_rank), so latency tracks
+the number of matches rather than the number of rows. Other backends fall back
+to substring matching over SearchEntry.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Length
+
+from .models import FieldCitation, Property, SearchEntry, Section, Unit
+
+FTS_TABLE = "core_search_fts"
+SEARCH_KINDS = ("property", "unit", "section", "citation")
+SEARCH_MAX_LIMIT = 200
+HIGHLIGHT = ("<mark>", "</mark>")
+
+# the FTS5 table, its triggers and the Postgres tsvector column are created by
+# migration 0006_search_index
+
+
+def _cat(*cols):
+    return " || ' ' || ".join(f"COALESCE({c}, '')" for c in cols)
+
+
+def _populate_sql():
+    """(INSERT ... SELECT, document column) per searchable model; `{where}` filters the rows."""
+    e, p, u = SearchEntry._meta.db_table, Property._meta.db_table, Unit._meta.db_table
+    s, c = Section._meta.db_table, FieldCitation._meta.db_table
+    cols = f"INSERT INTO {e} (kind, record_id, document_id, page, title, body)"
+    # the property name stays out of the unit body, or every unit would match it
+    unit_body = _cat("u.unit_type", "u.beds", "u.baths", "u.status", "CAST(u.rent AS TEXT)",
+                     "u.lease_start", "u.lease_end")
+    return [
+        (f"{cols} SELECT 'property', p.id, p.source_document_id, NULL, p.name, "
+         f"{_cat('p.address', 'p.city', 'p.state', 'p.zipcode')} FROM {p} p WHERE {{where}}", "p.source_document_id"),
+        (f"{cols} SELECT 'unit', u.id, p.source_document_id, NULL, u.unit_number, {unit_body} "
+         f"FROM {u} u JOIN {p} p ON p.id = u.property_id WHERE {{where}}", "p.source_document_id"),
+        (f"{cols} SELECT 'section', s.id, s.document_id, s.page, s.title, s.text FROM {s} s WHERE {{where}}",
+         "s.document_id"),
+        (f"{cols} SELECT 'citation', c.id, c.document_id, c.page, c.field_name, c.snippet FROM {c} c WHERE {{where}}",
+         "c.document_id"),
+    ]
+
+
+def _populate(cursor, document_id=None):
+    for sql, col in _populate_sql():
+        if document_id is None:
+            cursor.execute(sql.format(where="1 = 1"))
+        else:
+            cursor.execute(sql.format(where=f"{col} = %s"), [document_id])
+
+
+def index_document(document_id: int):
+    """Replace the search entries of one document with its current rows (4 INSERT ... SELECTs)."""
+    SearchEntry.objects.filter(document_id=document_id).delete()
+    with connection.cursor() as cursor:
+        _populate(cursor, document_id)
+
+
+def rebuild():
+    """Re-index every record, including properties without a source document."""
+    SearchEntry.objects.all().delete()
+    with connection.cursor() as cursor:
+        _populate(cursor)
+        if connection.vendor == "sqlite":
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return SearchEntry.objects.count()
+
+
+def _terms(q: str):
+    return re.findall(r"\w+", q.lower())
+
+
+def fts5_query(q: str, kind=None):
+    """
+    Every term must match the title or body. Only the last term, the one still
+    being typed, is a prefix: a short prefix matches many rows and every match is
+    ranked, so finished words are kept exact.
+    """
+    terms = _terms(q)
+    if not terms:
+        return None
+    phrases = [f'"{t}"' for t in terms[:-1]] + [f'"{terms[-1]}"*']
+    expr = "{title body} : (" + " ".join(phrases) + ")"
+    return f'kind : "{kind}" AND {expr}' if kind else expr
+
+
+def tsquery(q: str):
+    terms = _terms(q)
+    return " & ".join(terms[:-1] + [f"{terms[-1]}:*"]) if terms else None
+
+
+def _rows(cursor):
+    keys = ("kind", "id", "document", "page", "title", "score", "snippet")
+    return [dict(zip(keys, row)) for row in cursor.fetchall()]
+
+
+def _unit_number_hits(q: str, limit: int):
+    """
+    Units whose number contains `q` anywhere ("01" finds "101"), shortest number
+    first. The inverted index only matches whole tokens and their prefixes.
+    """
+    qs = SearchEntry.objects.filter(kind="unit", title__icontains=q).order_by(Length("title"), "title", "id")
+    return [
+        {"kind": e.kind, "id": e.record_id, "document": e.document_id, "page": e.page,
+         "title": e.title, "score": None, "snippet": e.body[:200]}
+        for e in qs[:limit]
+    ]
+
+
+def search(q: str, kind=None, limit: int = 50):
+    """
+    Ranked hits for `q`, best first: [{"kind", "id", "document", "page", "title",
+    "score", "snippet"}]. `id` is the pk of the record of that kind; matched terms
+    in the snippet are wrapped in HIGHLIGHT. For kind="unit", units whose number
+    contains `q` come first (score None), then the ranked full-text matches.
+    """
+    limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+    if kind != "unit" or not q.strip():
+        return _ranked(q, kind, limit)
+    by_number = _unit_number_hits(q.strip(), limit)
+    seen = {h["id"] for h in by_number}
+    return (by_number + [h for h in _ranked(q, kind, limit) if h["id"] not in seen])[:limit]
+
+
+def _ranked(q: str, kind, limit: int):
+    start, stop = HIGHLIGHT
+    if connection.vendor == "sqlite":
+        match = fts5_query(q, kind)
+        if match is None:
+            return []
+        sql = (
+            f"SELECT e.kind, e.record_id, e.document_id, e.page, e.title, "
+            f"-bm25({FTS_TABLE}, 5.0, 1.0, 0.0) AS score, "
+            f"snippet({FTS_TABLE}, -1, %s, %s, '…', 12) "
+            f"FROM {FTS_TABLE} JOIN core_searchentry e ON e.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s ORDER BY score DESC LIMIT %s"
+        )
+        params = [start, stop, match, limit]
+    elif connection.vendor == "postgresql":
+        tq = tsquery(q)
+        if tq is None:
+            return []
+        sql = (
+            "SELECT kind, record_id, document_id, page, title, score, "
+            "ts_headline('simple', coalesce(nullif(body, ''), title), query, %s) FROM ("
+            "SELECT e.*, ts_rank(e.tsv, query) AS score, query "
+            "FROM core_searchentry e, to_tsquery('simple', %s) query "
+            f"WHERE e.tsv @@ query {'AND e.kind = %s ' if kind else ''}"
+            "ORDER BY score DESC LIMIT %s) hits ORDER BY score DESC"
+        )
+        opts = f"StartSel={start},StopSel={stop},MaxWords=24,MinWords=8"
+        params = [opts, tq] + ([kind] if kind else []) + [limit]
+    else:
+        terms = _terms(q)
+        if not terms:
+            return []
+        qs = SearchEntry.objects.all()
+        for t in terms:
+            qs = qs.filter(Q(title__icontains=t) | Q(body__icontains=t))
+        if kind:
+            qs = qs.filter(kind=kind)
+        return [
+            {"kind": e.kind, "id": e.record_id, "document": e.document_id, "page": e.page,
+             "title": e.title, "score": 0.0, "snippet": e.body[:200]}
+            for e in qs.order_by("id")[:limit]
+        ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return _rows(cursor)
+
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Document, Section, Property, Unit, FieldCitation
+from .models import Document, Section, Property, Unit, FieldCitation, ExtractionJob
 
 
 class FieldCitationSerializer(serializers.ModelSerializer):
@@ -11,14 +11,21 @@ class FieldCitationSerializer(serializers.ModelSerializer):
 class UnitSerializer(serializers.ModelSerializer):
     class Meta:
         model = Unit
-        fields = "__all__"
+        exclude = ["beds_norm"]
 
 
 class PropertySerializer(serializers.ModelSerializer):
     units = UnitSerializer(many=True, read_only=True)
     class Meta:
         model = Property
-        fields = "__all__"
+        exclude = ["name_norm", "city_norm", "state_norm"]
+
+
+class PropertySummarySerializer(serializers.ModelSerializer):
+    """PropertySerializer without the embedded units (`?lean=1`); fetch them from /units/."""
+    class Meta:
+        model = Property
+        exclude = ["name_norm", "city_norm", "state_norm"]
 
 
 class SectionSerializer(serializers.ModelSerializer):
@@ -31,4 +38,33 @@ class DocumentSerializer(serializers.ModelSerializer):
     sections = SectionSerializer(many=True, read_only=True)
     class Meta:
         model = Document
-        fields = ["id", "doc_type", "uploaded_at", "pages", "file", "sections"]
\ No newline at end of file
+        fields = ["id", "doc_type", "uploaded_at", "pages", "file", "sections"]
+
+
+class DocumentSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Document
+        fields = ["id", "doc_type", "uploaded_at", "pages", "file"]
+
+
+class ExtractionJobSerializer(serializers.ModelSerializer):
+    queue_seconds = serializers.SerializerMethodField()
+    run_seconds = serializers.SerializerMethodField()
+    pages = serializers.IntegerField(source="document.pages", read_only=True)
+
+    class Meta:
+        model = ExtractionJob
+        fields = [
+            "id", "document", "doc_type", "status", "error", "property", "reextract", "stages", "changes",
+            "pages", "timings", "created_at", "started_at", "finished_at", "queue_seconds", "run_seconds",
+        ]
+
+    def get_queue_seconds(self, obj):
+        if not obj.started_at:
+            return None
+        return (obj.started_at - obj.created_at).total_seconds()
+
+    def get_run_seconds(self, obj):
+        if not obj.started_at or not obj.finished_at:
+            return None
+        return (obj.finished_at - obj.started_at).total_seconds()
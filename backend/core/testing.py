@@ -0,0 +1,40 @@
+"""
+Test runner that keeps a test run away from the developer's on-disk state.
+
+The extraction cache, uploaded files (MEDIA_ROOT) and rendered page tiles
+(TILE_CACHE_DIR) all point into one temporary directory for the whole run, so
+results never depend on an earlier run and nothing is left in backend/.
+"""
+import os
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .extraction import cache as cache_module
+
+
+class IsolatedTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._tmp = tempfile.TemporaryDirectory(prefix="newmark-test-")
+        root = self._tmp.name
+        self._env = os.environ.get("EXTRACTION_CACHE_PATH")
+        os.environ["EXTRACTION_CACHE_PATH"] = os.path.join(root, "extraction_cache.sqlite3")
+        # built lazily from the environment on first use
+        cache_module._cache = None
+        self._settings = override_settings(
+            MEDIA_ROOT=os.path.join(root, "media"),
+            TILE_CACHE_DIR=os.path.join(root, "tile_cache"),
+        )
+        self._settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._settings.disable()
+        if self._env is None:
+            os.environ.pop("EXTRACTION_CACHE_PATH", None)
+        else:
+            os.environ["EXTRACTION_CACHE_PATH"] = self._env
+        cache_module._cache = None
+        self._tmp.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -1,6 +1,11 @@
+from contextlib import contextmanager
+from unittest.mock import patch
+
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 class UploadTests(APITestCase):
     def test_missing_file(self):
@@ -11,3 +16,499 @@ class UploadTests(APITestCase):
         fake = SimpleUploadedFile("test.pdf", b"%PDF-1.4\n%...", content_type="application/pdf")
         resp = self.client.post("/api/upload/", {"file": fake, "doc_type": "flyer"})
         self.assertIn(resp.status_code, [201, 400]) 
+
+
+class ExtractionJobTests(APITestCase):
+    def test_upload_enqueues_job(self):
+        fake = SimpleUploadedFile("test.pdf", b"%PDF-1.4\n%...", content_type="application/pdf")
+        resp = self.client.post("/api/upload/", {"file": fake, "doc_type": "flyer"})
+        self.assertEqual(resp.status_code, 201)
+        doc_id, job_id = resp.data["document_id"], resp.data["job_id"]
+
+        resp = self.client.get(f"/api/jobs/{job_id}/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["status"], "queued")
+        self.assertEqual(resp.data["document"], doc_id)
+        self.assertIsNone(resp.data["run_seconds"])
+
+    def test_worker_marks_broken_pdf_failed(self):
+        from core.jobs import work
+        fake = SimpleUploadedFile("broken.pdf", b"%PDF-1.4\n%...", content_type="application/pdf")
+        resp = self.client.post("/api/upload/", {"file": fake, "doc_type": "flyer"})
+        work(once=True)
+
+        resp = self.client.get(f"/api/jobs/{resp.data['job_id']}/")
+        self.assertEqual(resp.data["status"], "failed")
+        self.assertTrue(resp.data["error"])
+        self.assertIsNotNone(resp.data["run_seconds"])
+
+
+    def test_stale_running_job_is_reclaimed(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.jobs import claim_next_job
+        from core.models import Document, ExtractionJob
+
+        d = Document.objects.create(file="uploads/x.pdf", doc_type="flyer")
+        now = timezone.now()
+        live = ExtractionJob.objects.create(document=d, doc_type="flyer", status="running", started_at=now)
+        stale = ExtractionJob.objects.create(document=d, doc_type="flyer", status="running",
+                                             started_at=now - timedelta(hours=2))
+        with self.settings(EXTRACTION_JOB_TIMEOUT=3600):
+            job = claim_next_job()
+            self.assertEqual(job.pk, stale.pk)
+            self.assertGreater(job.started_at, now)
+            # a live job, and the one just reclaimed, are left to their workers
+            self.assertIsNone(claim_next_job())
+        live.refresh_from_db()
+        self.assertEqual(live.started_at, now)
+
+class PersistenceTests(APITestCase):
+    def test_bulk_persist_links_unit_citations(self):
+        from core.models import Document, Unit, FieldCitation
+        from core.persistence import persist_result
+
+        d = Document.objects.create(file="uploads/rr.pdf", doc_type="rent_roll")
+        res = {
+            "property": {"name": "Oak Plaza", "unit_count": "1,150"},
+            "units": [{"unit_number": str(i), "rent": f"${1000 + i}", "sqft": "750 sf"} for i in range(150)],
+            "sections": [{"page": 0, "title": "Summary", "text": "x", "bbox": [0, 0, 10, 10]}],
+            "citations": [
+                {"field": "name", "page": 0, "bbox": [1, 2, 3, 4], "snippet": "Oak Plaza"},
+                {"field": "rent", "page": 3, "bbox": [1, 2, 3, 4], "snippet": "$1007", "unit_index": 7},
+            ],
+        }
+        with self.settings(PERSIST_BATCH_SIZE=50):
+            with self.assertNumQueries(6):  # property + 3 unit batches + sections + citations
+                prop = persist_result(d, res)
+
+        self.assertEqual(prop.unit_count, 1150)
+        self.assertEqual(prop.units.count(), 150)
+        unit = Unit.objects.get(property=prop, unit_number="7")
+        self.assertEqual(unit.rent, 1007.0)
+        cite = FieldCitation.objects.get(field_name="rent")
+        self.assertEqual((cite.model_name, cite.record_id), ("Unit", unit.pk))
+        self.assertEqual(FieldCitation.objects.get(field_name="name").record_id, prop.pk)
+
+
+class ReextractTests(APITestCase):
+    def _result(self, rents):
+        return {
+            "doc_type": "rent_roll", "pages": 1,
+            "property": {"name": "Oak Plaza"},
+            "units": [{"unit_number": n, "rent": r} for n, r in rents.items()],
+            "sections": [],
+            "citations": [{"field": "rent", "page": 0, "bbox": [1, 2, 3, 4], "snippet": "x", "unit_index": 0}],
+        }
+
+    def test_apply_result_keeps_unchanged_rows(self):
+        from core.models import Document, Unit
+        from core.persistence import apply_result, persist_result
+
+        d = Document.objects.create(file="uploads/rr.pdf", doc_type="rent_roll")
+        prop = persist_result(d, self._result({"1": 1000, "2": 1100, "3": 1200}))
+        ids = dict(Unit.objects.filter(property=prop).values_list("unit_number", "id"))
+
+        prop2, counts = apply_result(d, self._result({"1": 1000, "2": 1150, "4": 900}))
+        self.assertEqual(prop2.pk, prop.pk)
+        self.assertEqual(counts["Unit"], {"created": 1, "updated": 1, "deleted": 1})
+        self.assertEqual(counts["FieldCitation"], {"created": 0, "updated": 0, "deleted": 0})
+        after = dict(Unit.objects.filter(property=prop).values_list("unit_number", "id"))
+        self.assertEqual(after["1"], ids["1"])
+        self.assertEqual(after["2"], ids["2"])
+        self.assertNotIn("3", after)
+        self.assertEqual(Unit.objects.get(pk=ids["2"]).rent, 1150)
+
+    def test_reextract_endpoint_runs_with_stages(self):
+        from core.models import Document, ExtractionJob
+
+        d = Document.objects.create(file="uploads/rr.pdf", doc_type="rent_roll")
+        ExtractionJob.objects.create(document=d, doc_type="auto")
+        with self.settings(EXTRACTION_EAGER=True), \
+                patch("core.jobs.extract", return_value=self._result({"1": 1000})) as ex:
+            resp = self.client.post(f"/api/documents/{d.pk}/reextract/", {"stages": ["llm"]}, format="json")
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp.data["status"], "done")
+        self.assertEqual(resp.data["doc_type"], "auto")
+        self.assertEqual(resp.data["changes"]["Unit"]["created"], 1)
+        self.assertEqual(ex.call_args.kwargs["refresh"], ["llm"])
+
+        resp = self.client.post(f"/api/documents/{d.pk}/reextract/", {"stages": ["pixels"]}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+
+class IngestTests(APITestCase):
+    def test_ingest_folder_resumes_from_state(self):
+        import os
+        import shutil
+        import tempfile
+        import fitz
+        from django.core.management import call_command
+        from core.models import Document, ExtractionJob
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        os.makedirs(os.path.join(tmp, "sub"))
+        for name in ("a.pdf", "sub/b.pdf"):
+            doc = fitz.open()
+            doc.new_page().insert_text((72, 72), "Oak Plaza")
+            doc.save(os.path.join(tmp, name))
+        result = {"property": {"name": "Oak Plaza"}, "units": [], "sections": [], "citations": [],
+                  "pages": 1, "timings": {"parse": 0.25, "llm": 0.5}}
+        state = os.path.join(tmp, "state.jsonl")
+
+        with patch("core.jobs.extract", return_value=result) as ex:
+            call_command("ingest", tmp, "--workers", "1", "--state", state, stdout=open(os.devnull, "w"))
+            self.assertEqual(ex.call_count, 2)
+            job = ExtractionJob.objects.filter(status="done").first()
+            self.assertEqual(job.timings, {"parse": 0.25, "llm": 0.5})
+
+            # a second run skips finished files; a new file is picked up
+            doc = fitz.open()
+            doc.new_page()
+            doc.save(os.path.join(tmp, "c.pdf"))
+            call_command("ingest", tmp, "--workers", "1", "--state", state, stdout=open(os.devnull, "w"))
+            self.assertEqual(ex.call_count, 3)
+        self.assertEqual(Document.objects.count(), 3)
+
+    def test_resume_leaves_running_job_to_its_worker(self):
+        import os
+        import tempfile
+        from django.utils import timezone
+        from core.ingest import IngestItem, _queue_local
+        from core.models import Document, ExtractionJob
+
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        d = Document.objects.create(file="uploads/x.pdf", doc_type="flyer")
+        running = ExtractionJob.objects.create(document=d, doc_type="flyer", status="running", started_at=timezone.now())
+
+        doc, job = _queue_local(IngestItem(path), {"document_id": d.pk, "job_id": running.pk})
+        self.assertEqual((doc.pk, job.pk), (d.pk, running.pk))
+        running.refresh_from_db()
+        self.assertEqual(running.status, "running")
+        self.assertEqual(ExtractionJob.objects.count(), 1)
+
+    def test_ingest_stats(self):
+        from core.ingest import IngestStats
+
+        stats = IngestStats()
+        stats.add({"status": "done", "pages": 4, "timings": {"ocr": 2.0}})
+        stats.add({"status": "done", "pages": 6, "timings": {"ocr": 1.0, "llm": 1.0}})
+        stats.add({"status": "failed"})
+        s = stats.summary()
+        self.assertEqual((s["done"], s["failed"], s["pages"]), (2, 1, 10))
+        self.assertEqual(s["stages"]["ocr"], {"total": 3.0, "per_doc": 1.5})
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        from core.models import Document
+        from core.persistence import persist_result
+        from core.search import index_document
+
+        self.doc = Document.objects.create(file="uploads/om.pdf", doc_type="flyer")
+        self.prop = persist_result(self.doc, {
+            "property": {"name": "Oak Plaza", "address": "12 Main St", "city": "Austin"},
+            "units": [{"unit_number": "B-204", "status": "Vacant"}, {"unit_number": "B-205", "status": "Occupied"}],
+            "sections": [{"page": 3, "title": "Investment Highlights", "text": "Recently renovated clubhouse and pool"}],
+            "citations": [{"field": "name", "page": 0, "bbox": [1, 2, 3, 4], "snippet": "Oak Plaza"}],
+        })
+        index_document(self.doc.pk)
+
+    def test_prefix_search_ranks_properties_and_units(self):
+        resp = self.client.get("/api/search/", {"q": "oak pla"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([p["name"] for p in resp.data["properties"]], ["Oak Plaza"])
+        self.assertEqual(resp.data["units"], [])  # the property name does not match its units
+        self.assertEqual(resp.data["hits"][0]["kind"], "property")
+
+    def test_units_match_on_any_part_of_their_number_and_on_status(self):
+        units = lambda q: [u["unit_number"] for u in self.client.get("/api/search/", {"q": q}).data["units"]]
+        self.assertEqual(units("04"), ["B-204"])
+        self.assertEqual(units("b-20"), ["B-204", "B-205"])
+        self.assertEqual(units("vacant"), ["B-204"])
+        self.assertEqual(units("occupied"), ["B-205"])
+
+    def test_section_and_citation_hits_carry_page(self):
+        resp = self.client.get("/api/search/", {"q": "renovated club", "kind": "section"})
+        (hit,) = resp.data["hits"]
+        self.assertEqual((hit["document"], hit["page"], hit["title"]), (self.doc.pk, 3, "Investment Highlights"))
+        self.assertIn("<mark>renovated</mark>", hit["snippet"])
+
+        resp = self.client.get("/api/search/", {"q": "oak", "kind": "citation"})
+        (hit,) = resp.data["hits"]
+        self.assertEqual((hit["model_name"], hit["record_id"], hit["page"]), ("Property", self.prop.pk, 0))
+
+        self.assertEqual(self.client.get("/api/search/", {"q": "oak", "kind": "nope"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/search/", {"q": "  "}).data["hits"], [])
+
+    def test_reindex_replaces_stale_entries(self):
+        from core.models import SearchEntry
+        from core.persistence import apply_result
+        from core.search import index_document, search
+
+        apply_result(self.doc, {"property": {"name": "Elm Court"}, "units": [], "sections": [], "citations": []})
+        index_document(self.doc.pk)
+        self.assertEqual(search("oak"), [])
+        self.assertEqual([h["id"] for h in search("elm")], [self.prop.pk])
+        self.assertEqual(SearchEntry.objects.filter(document=self.doc).count(), 1)
+
+
+class QueryBudgetMixin:
+    @contextmanager
+    def assertMaxQueries(self, budget, label=""):
+        """Like assertNumQueries, but an upper bound; the executed SQL is listed on failure."""
+        with CaptureQueriesContext(connection) as ctx:
+            yield ctx
+        if len(ctx) > budget:
+            sql = "\n".join(q["sql"] for q in ctx.captured_queries)
+            self.fail(f"{label} ran {len(ctx)} queries, budget is {budget}:\n{sql}")
+
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    # max queries per request; must not depend on how many rows are on the page
+    BUDGETS = {
+        "/api/properties/": 2,  # page, units prefetch
+        "/api/properties/?lean=1": 1,
+        "/api/properties/?count=1": 3,
+        "/api/properties/?max_rent=5000": 2,
+        "/api/properties/{prop}/": 2,
+        "/api/documents/{doc}/": 2,
+        "/api/documents/{doc}/?lean=1": 1,
+        "/api/units/?property_id={prop}": 1,
+        "/api/jobs/{job}/": 1,
+        "/api/citations/Property/{prop}/": 1,
+        "/api/search/?q=oak": 7,  # 3 ranked lookups, properties + units prefetch, units, citations
+        "/api/search/?q=oak&lean=1": 6,
+    }
+
+    def _seed(self, n):
+        from core.models import Document, ExtractionJob
+        from core.persistence import persist_result
+        from core.search import index_document
+
+        for i in range(n):
+            d = Document.objects.create(file=f"uploads/om{i}.pdf", doc_type="flyer")
+            prop = persist_result(d, {
+                "property": {"name": f"Oak Plaza {i}"},
+                "units": [{"unit_number": str(u), "rent": 1000 + u} for u in range(5)],
+                "sections": [{"page": p, "title": f"Section {p}", "text": "oak trees"} for p in range(3)],
+                "citations": [{"field": "name", "page": 0, "bbox": [0, 0, 1, 1], "snippet": "Oak Plaza"}],
+            })
+            index_document(d.pk)
+            job = ExtractionJob.objects.create(document=d, doc_type="flyer", property=prop)
+        return {"prop": prop.pk, "doc": d.pk, "job": job.pk}
+
+    def test_endpoints_stay_within_query_budget(self):
+        for n in (1, 20):
+            ids = self._seed(n)
+            for url, budget in self.BUDGETS.items():
+                url = url.format(**ids)
+                with self.assertMaxQueries(budget, url):
+                    resp = self.client.get(url)
+                self.assertEqual(resp.status_code, 200, url)
+
+    def test_lean_variants_drop_nested_rows(self):
+        ids = self._seed(2)
+        full = self.client.get("/api/properties/").data["results"][0]
+        lean = self.client.get("/api/properties/?lean=1").data["results"][0]
+        self.assertEqual(len(full["units"]), 5)
+        self.assertNotIn("units", lean)
+        self.assertEqual({k: v for k, v in full.items() if k != "units"}, lean)
+        self.assertNotIn("sections", self.client.get(f"/api/documents/{ids['doc']}/?lean=1").data)
+        self.assertNotIn("units", self.client.get("/api/search/?q=oak&lean=1").data["properties"][0])
+
+
+class FilterIndexTests(APITestCase):
+    def test_normalized_substring_filters(self):
+        from core.models import Document, Property
+        from core.persistence import persist_result
+
+        d = Document.objects.create(file="uploads/rr.pdf", doc_type="rent_roll")
+        persist_result(d, {"property": {"name": "OAK Plaza", "city": "AUSTIN", "state": "TX"},
+                           "units": [{"unit_number": "1", "beds": "2 BR", "rent": 900},
+                                     {"unit_number": "2", "beds": "3", "rent": 1500}]})
+        persist_result(d, {"property": {"name": "Elm Court", "city": "Dallas", "state": "TX"},
+                           "units": [{"unit_number": "1", "beds": "2", "rent": 2000}]})
+        self.assertEqual(Property.objects.get(name="OAK Plaza").name_norm, "oak plaza")
+
+        def names(**params):
+            return [p["name"] for p in self.client.get("/api/properties/", params).data["results"]]
+
+        self.assertEqual(names(name="oak"), ["OAK Plaza"])
+        self.assertEqual(names(city="Aus", state="tx"), ["OAK Plaza"])
+        self.assertEqual(names(name="plaza"), ["OAK Plaza"])
+        self.assertEqual(names(city="las"), ["Elm Court"])
+        self.assertEqual(names(state="TX"), ["OAK Plaza", "Elm Court"])
+        self.assertEqual(names(max_rent="1000"), ["OAK Plaza"])
+        self.assertEqual(names(max_rent="2500"), ["OAK Plaza", "Elm Court"])  # one row per property
+        self.assertNotIn("name_norm", self.client.get("/api/properties/").data["results"][0])
+
+        units = self.client.get("/api/units/", {"beds": "2"}).data["results"]
+        self.assertEqual([u["beds"] for u in units], ["2 BR", "2"])
+        units = self.client.get("/api/units/", {"beds": "br"}).data["results"]
+        self.assertEqual([u["beds"] for u in units], ["2 BR"])
+
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        from core.models import Document
+        from core.persistence import persist_result
+
+        d = Document.objects.create(file="uploads/rr.pdf", doc_type="rent_roll")
+        self.prop = persist_result(d, {
+            "property": {"name": "Oak Plaza"},
+            "units": [{"unit_number": str(i), "beds": "2" if i % 2 else "1", "rent": 1000 + i} for i in range(7)],
+        })
+
+    def test_walks_units_by_cursor_with_optional_count(self):
+        seen = []
+        url = "/api/units/?page_size=3"
+        while url:
+            resp = self.client.get(url)
+            self.assertNotIn("count", resp.data)
+            seen += [u["unit_number"] for u in resp.data["results"]]
+            url = resp.data["next"]
+        self.assertEqual(seen, [str(i) for i in range(7)])
+
+        resp = self.client.get("/api/units/", {"count": "1", "beds": "2"})
+        self.assertEqual(resp.data["count"], 3)
+        self.assertIsNone(resp.data["next"])
+
+    def test_export_streams_csv_and_ndjson(self):
+        import csv
+        import io
+        import json
+
+        resp = self.client.get("/api/export/units.csv", {"beds": "2"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp["Content-Type"], "text/csv")
+        rows = list(csv.DictReader(io.StringIO(b"".join(resp.streaming_content).decode())))
+        self.assertEqual([r["unit_number"] for r in rows], ["1", "3", "5"])
+        self.assertEqual(rows[0]["property"], str(self.prop.pk))
+        self.assertNotIn("beds_norm", rows[0])
+
+        with self.settings(EXPORT_CHUNK_SIZE=2):
+            resp = self.client.get("/api/export/units.ndjson")
+            lines = [json.loads(line) for line in b"".join(resp.streaming_content).splitlines()]
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(lines[-1]["rent"], 1006.0)
+
+        resp = self.client.get("/api/export/properties.ndjson", {"name": "plaza"})
+        self.assertEqual(json.loads(b"".join(resp.streaming_content))["name"], "Oak Plaza")
+        self.assertEqual(self.client.get("/api/export/jobs.csv").status_code, 404)
+
+
+class PageTileTests(APITestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        import fitz
+        from django.core.files.base import ContentFile
+        from core.models import Document
+
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, True)
+        overrides = self.settings(TILE_CACHE_DIR=self.cache_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        pdf = fitz.open()
+        for text in ("Oak Plaza", "Rent roll"):
+            pdf.new_page(width=612, height=792).insert_text((72, 72), text)
+        self.doc = Document.objects.create(doc_type="flyer")
+        self.doc.file.save("tiles.pdf", ContentFile(pdf.tobytes()))
+        self.addCleanup(self.doc.file.delete, False)
+
+    def test_page_sizes_and_images(self):
+        resp = self.client.get(f"/api/documents/{self.doc.pk}/pages/")
+        self.assertEqual(resp.data["pages"], [{"page": 0, "width": 612.0, "height": 792.0},
+                                              {"page": 1, "width": 612.0, "height": 792.0}])
+
+        resp = self.client.get(f"/api/documents/{self.doc.pk}/pages/1.png", {"scale": "0.5"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "image/png")
+        self.assertTrue(resp.content.startswith(b"\x89PNG"))
+        self.assertIn("max-age=", resp["Cache-Control"])
+
+        resp = self.client.get(f"/api/documents/{self.doc.pk}/pages/0.webp")
+        self.assertEqual(resp.content[8:12], b"WEBP")
+        crop = self.client.get(f"/api/documents/{self.doc.pk}/pages/0.webp", {"bbox": "72,50,200,80", "margin": "8"})
+        self.assertLess(len(crop.content), len(resp.content))
+
+        self.assertEqual(self.client.get(f"/api/documents/{self.doc.pk}/pages/2.png").status_code, 404)
+        self.assertEqual(self.client.get(f"/api/documents/{self.doc.pk}/pages/0.gif").status_code, 404)
+        self.assertEqual(self.client.get(f"/api/documents/{self.doc.pk}/pages/0.png", {"bbox": "1,2"}).status_code, 400)
+        self.assertEqual(
+            self.client.get(f"/api/documents/{self.doc.pk}/pages/0.png", {"bbox": "700,800,900,900"}).status_code, 400
+        )
+        for params in ({"scale": "nan"}, {"scale": "inf"}, {"bbox": "0,0,nan,10"}, {"bbox": "0,0,10,10", "margin": "nan"}):
+            self.assertEqual(self.client.get(f"/api/documents/{self.doc.pk}/pages/0.png", params).status_code, 400)
+
+    def test_etag_and_cache_hit(self):
+        url = f"/api/documents/{self.doc.pk}/pages/0.png"
+        first = self.client.get(url)
+        with patch("core.tiles.render_page") as render:
+            again = self.client.get(url)
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        render.assert_not_called()
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+
+    def test_lru_eviction(self):
+        import os
+        import time
+        from core.tiles import TileCache
+
+        cache = TileCache(self.cache_dir, max_bytes=250)
+        now = time.time()
+        for age, key in ((30, "aa01"), (20, "bb02")):
+            cache.put(key, "png", b"x" * 100)
+            os.utime(cache.path(key, "png"), (now - age, now - age))
+        # reading aa01 makes bb02 the least recently used
+        cache.get("aa01", "png")
+        cache.put("cc03", "png", b"x" * 100)
+        self.assertIsNotNone(cache.get("aa01", "png"))
+        self.assertIsNone(cache.get("bb02", "png"))
+        self.assertIsNotNone(cache.get("cc03", "png"))
+
+    def test_eviction_skips_in_progress_and_vanished_files(self):
+        import os
+        from core.tiles import TileCache
+
+        cache = TileCache(self.cache_dir, max_bytes=150)
+        cache.put("aa01", "png", b"x" * 100)
+        # a concurrent writer's temp file is neither counted nor evicted
+        tmp = os.path.join(self.cache_dir, "aa", "pending.tmp")
+        with open(tmp, "wb") as f:
+            f.write(b"x" * 1000)
+        real_scandir = os.scandir
+
+        def racing_scandir(path):
+            entries = list(real_scandir(path))
+            if path.endswith("aa"):
+                os.remove(cache.path("aa01", "png"))  # evicted by another process after listing
+            return iter(entries)
+
+        with patch("core.tiles.os.scandir", racing_scandir):
+            cache.put("bb02", "png", b"x" * 100)
+        self.assertTrue(os.path.exists(tmp))
+        self.assertIsNotNone(cache.get("bb02", "png"))
+
+    def test_thumbnail_pregenerated_by_job(self):
+        from core.jobs import run_job
+        from core.models import ExtractionJob
+
+        job = ExtractionJob.objects.create(document=self.doc, doc_type="flyer")
+        result = {"property": {"name": "Oak Plaza"}, "units": [], "sections": [], "citations": [], "pages": 2}
+        with patch("core.jobs.extract", return_value=result):
+            run_job(job)
+        with patch("core.tiles.render_page") as render:
+            resp = self.client.get(f"/api/documents/{self.doc.pk}/thumbnail.webp")
+        render.assert_not_called()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content[8:12], b"WEBP")
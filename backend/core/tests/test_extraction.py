@@ -0,0 +1,654 @@
+import os
+import tempfile
+from unittest import mock
+
+import fitz
+import numpy as np
+from django.test import SimpleTestCase
+
+from core.extraction import cache as cache_module
+from core.extraction.cache import ExtractionCache
+from core.extraction.context import PdfContext
+
+
+def make_pdf(pages):
+    """Write a PDF whose pages hold the given lines of native text; returns its path."""
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page()
+        y = 72
+        for line in lines:
+            page.insert_text((72, y), line)
+            y += 20
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+class TempCacheMixin:
+    """Point the process-wide extraction cache at a throwaway file."""
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = ExtractionCache(path=os.path.join(tmp.name, "cache.sqlite3"))
+        patcher = mock.patch.object(cache_module, "_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class PdfContextTests(SimpleTestCase):
+    def setUp(self):
+        self.path = make_pdf([["Property Name Oak Plaza", "Units 42"], ["Second page"]])
+        self.addCleanup(os.remove, self.path)
+
+    def test_page_artifacts_are_cached(self):
+        with PdfContext(self.path) as ctx:
+            self.assertEqual(len(ctx), 2)
+            self.assertIs(ctx.words(0), ctx.words(0))
+            self.assertIs(ctx.page(1), ctx.page(1))
+            self.assertIn("Oak Plaza", ctx.text(0))
+            self.assertIn("Second page", ctx.fulltext())
+
+    def test_text_is_streamed_per_page(self):
+        from core.extraction.ocr import iter_page_texts, text_head
+        with PdfContext(self.path, page_cache_size=1) as ctx:
+            records = list(iter_page_texts(ctx, pages=[1]))
+            self.assertEqual([(r.page, r.source) for r in records], [(1, "native")])
+            self.assertEqual(text_head(ctx.iter_text(), 10), "Property N")
+            self.assertEqual(len(ctx._pages), 1)
+
+    def test_pixmap_cache_is_bounded(self):
+        with PdfContext(self.path, pixmap_cache_size=1) as ctx:
+            first = ctx.pixmap(0, dpi=50)
+            self.assertIs(ctx.pixmap(0, dpi=50), first)
+            ctx.pixmap(1, dpi=50)
+            self.assertIsNot(ctx.pixmap(0, dpi=50), first)
+
+
+def _fake_ocr(bgr, dpi=400, lang="eng"):
+    # report the rasterized width so callers can tell pages apart
+    return {"words": [[0, 0, 1, 1, str(bgr.shape[1]), 0, 0, 0]], "psm": 6, "conf": 90.0, "passes": 1}
+
+
+class OcrPagesTests(TempCacheMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        doc = fitz.open()
+        for width in (100, 200, 300, 400, 500):
+            doc.new_page(width=width, height=100)
+        fd, self.path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        doc.save(self.path)
+        self.addCleanup(os.remove, self.path)
+
+    def test_pool_keeps_page_order(self):
+        from core.extraction import ocr
+
+        with mock.patch.object(ocr, "ocr_page_for_image", _fake_ocr), PdfContext(self.path) as ctx:
+            out = list(ocr.ocr_pages(ctx, [4, 0, 2, 1], dpi=72, workers=2))
+            self.assertEqual([p for p, _ in out], [4, 0, 2, 1])
+            self.assertEqual([ws[0][4] for _, ws in out], ["500", "100", "300", "200"])
+            # results are memoized on the context
+            self.assertIn((2, 72, "eng"), ctx.ocr_words)
+            self.assertEqual(ctx.ocr_meta[(2, 72, "eng")]["psm"], 6)
+
+
+    def test_early_stop_bounds_ocr_work(self):
+        from core.extraction import ocr
+
+        doc = fitz.open()
+        for _ in range(12):
+            doc.new_page(width=100, height=100)
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        doc.save(path)
+        self.addCleanup(os.remove, path)
+
+        rasterized = []
+        page_tasks = ocr._page_tasks
+
+        def counting_tasks(ctx, p, dpi):
+            rasterized.append(p)
+            return page_tasks(ctx, p, dpi)
+
+        with mock.patch.object(ocr, "ocr_page_for_image", _fake_ocr), \
+                mock.patch.object(ocr, "_page_tasks", counting_tasks), \
+                mock.patch.object(ocr, "OCR_WORKERS", 2), PdfContext(path) as ctx:
+            self.assertEqual(ocr.text_head(ocr.iter_page_texts(ctx, dpi=72), 3), "100")
+        # the first page plus at most 2 * workers pages of read-ahead
+        self.assertLessEqual(len(rasterized), 5)
+        self.assertEqual(rasterized[0], 0)
+
+def _tess_data(words, conf):
+    n = len(words)
+    return {
+        "text": words, "conf": [conf] * n, "left": [10] * n, "top": [10] * n,
+        "width": [5] * n, "height": [5] * n, "block_num": [1] * n, "line_num": [1] * n, "word_num": list(range(n)),
+    }
+
+
+class PsmSelectionTests(SimpleTestCase):
+    def setUp(self):
+        from core.extraction import ocr
+        self.ocr = ocr
+        self.page = np.full((800, 600, 3), 255, dtype=np.uint8)
+        for patcher in (
+            mock.patch.object(ocr, "_osd_rotation", return_value=0),
+            mock.patch.object(ocr, "_deskew", side_effect=lambda img: img),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_probe_detects_sparse_and_columns(self):
+        blank = np.full((800, 600), 255, dtype=np.uint8)
+        self.assertEqual(self.ocr._layout_probe(blank), (0.0, 0))
+
+        two_cols = blank.copy()
+        two_cols[100:700, 40:260] = 0
+        two_cols[100:700, 340:560] = 0
+        density, columns = self.ocr._layout_probe(two_cols)
+        self.assertEqual(columns, 2)
+        self.assertEqual(self.ocr._choose_psm(density, columns), 3)
+
+    def test_confident_first_pass_runs_tesseract_once(self):
+        with mock.patch.object(self.ocr.pytesseract, "image_to_data", return_value=_tess_data(["Units", "42"], 92)) as tess:
+            page = self.ocr.ocr_page_for_image(self.page, dpi=72)
+        self.assertEqual(tess.call_count, 1)
+        self.assertEqual((page["psm"], page["passes"]), (11, 1))
+        self.assertEqual([w[4] for w in page["words"]], ["Units", "42"])
+
+    def test_low_confidence_falls_back_once_and_keeps_best(self):
+        passes = [_tess_data(["Un1ts"], 20), _tess_data(["Units", "42"], 85)]
+        with mock.patch.object(self.ocr.pytesseract, "image_to_data", side_effect=passes) as tess:
+            page = self.ocr.ocr_page_for_image(self.page, dpi=72)
+        self.assertEqual(tess.call_count, 2)
+        self.assertEqual((page["psm"], page["conf"], page["passes"]), (6, 85.0, 2))
+        self.assertEqual(len(page["words"]), 2)  # no words carried over from the rejected pass
+
+
+class ExtractionCacheTests(TempCacheMixin, SimpleTestCase):
+    def test_lru_eviction_and_counters(self):
+        cache = self.cache
+        cache.max_bytes = 200
+        cache.set("ocr", "a", "x" * 80)
+        cache.set("ocr", "b", "y" * 80)
+        self.assertIsNotNone(cache.get("ocr", "a"))  # a is now most recently used
+        cache.set("ocr", "c", "z" * 80)
+        self.assertIsNone(cache.get("ocr", "b"))
+        self.assertEqual(cache.get("ocr", "a"), "x" * 80)
+        stats = cache.stats()["ocr"]
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    def test_duplicate_extract_is_served_from_cache(self):
+        from core.extraction import pipeline
+
+        path = make_pdf([["Units 42"]])
+        self.addCleanup(os.remove, path)
+        with mock.patch.dict(os.environ, {"GENAI_PROVIDER": ""}):
+            first = pipeline.extract(path, "flyer")
+            with mock.patch.object(pipeline, "parse_flyer", side_effect=AssertionError("not cached")):
+                second = pipeline.extract(path, "flyer")
+        self.assertEqual(set(second.pop("timings")), {"cache"})
+        self.assertIn("parse", first.pop("timings"))
+        self.assertEqual(first, second)
+        self.assertEqual(self.cache.stats()["result"]["hits"], 1)
+
+
+class RoiOcrTests(SimpleTestCase):
+    def setUp(self):
+        doc = fitz.open()
+        scan = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 200, 100), False)
+        scan.clear_with(255)
+        # mixed page: native text on top, a pasted "scan" below it
+        page = doc.new_page()
+        page.insert_text((72, 72), "Native heading for the offering memorandum page")
+        page.insert_image(fitz.Rect(72, 300, 472, 500), pixmap=scan)
+        # fully native page
+        doc.new_page().insert_text((72, 72), "Nothing but native text on this page at all")
+        # large and small glyphs for the DPI estimate
+        doc.new_page().insert_text((72, 200), "BIG TEXT " * 3, fontsize=40)
+        small = doc.new_page()
+        for i in range(20):
+            small.insert_text((72, 72 + 12 * i), "small print " * 8, fontsize=7)
+        # scanned page: nothing but the image
+        doc.new_page().insert_image(fitz.Rect(72, 300, 472, 500), pixmap=scan)
+        fd, self.path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        doc.save(self.path)
+        self.addCleanup(os.remove, self.path)
+
+    def test_regions_are_images_of_pages_without_text(self):
+        from core.extraction.ocr import ocr_regions
+        with PdfContext(self.path) as ctx:
+            regions = ocr_regions(ctx, 4)
+            self.assertEqual(len(regions), 1)
+            self.assertEqual(tuple(round(v) for v in regions[0]), (72, 300, 472, 500))
+            # a picture on a page with native text is a photo, not a scan
+            self.assertEqual(ocr_regions(ctx, 0), [])
+            self.assertEqual(ocr_regions(ctx, 1), [])
+
+    def test_native_flyer_with_photos_is_not_ocred(self):
+        import numpy as np
+        from core.extraction import ocr
+
+        rng = np.random.default_rng(0)
+        photo = fitz.Pixmap(fitz.csRGB, 600, 400, rng.integers(0, 255, 600 * 400 * 3, dtype=np.uint8).tobytes(), False)
+        doc = fitz.open()
+        for _ in range(2):
+            page = doc.new_page()
+            page.insert_text((72, 72), "Oak Plaza  Units 42  Year Built 1998")
+            page.insert_image(fitz.Rect(72, 100, 540, 420), pixmap=photo)
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        doc.save(path)
+        self.addCleanup(os.remove, path)
+
+        with mock.patch.object(ocr, "ocr_page_for_image", wraps=_fake_ocr) as tesseract, \
+                mock.patch.object(ocr, "OCR_WORKERS", 1), PdfContext(path) as ctx:
+            records = list(ocr.iter_page_texts(ctx, dpi=300))
+            words = ocr.get_words_with_ocr_fallback(ctx, range(len(ctx)), dpi=300)
+        self.assertEqual(tesseract.call_count, 0)
+        self.assertEqual([r.source for r in records], ["native", "native"])
+        self.assertEqual({w[4] for w in words[0]}, {"Oak", "Plaza", "Units", "42", "Year", "Built", "1998"})
+
+    def test_dpi_follows_glyph_size(self):
+        from core.extraction.ocr import estimate_dpi
+        with PdfContext(self.path) as ctx:
+            big = estimate_dpi(ctx, 2, ctx.page(2).rect, max_dpi=400)
+            small = estimate_dpi(ctx, 3, ctx.page(3).rect, max_dpi=400)
+        self.assertLess(big, small)
+        self.assertLessEqual(small, 400)
+
+
+class TableEngineTests(SimpleTestCase):
+    def setUp(self):
+        doc = fitz.open()
+        ruled = doc.new_page()
+        for k in range(5):
+            ruled.draw_line((72, 100 + 20 * k), (472, 100 + 20 * k))
+        for x in (72, 272, 472):
+            ruled.draw_line((x, 100), (x, 180))
+        stream = doc.new_page()
+        for k, row in enumerate([("Unit", "Beds", "Rent"), ("101", "2", "1500"), ("102", "1", "1200"), ("103", "3", "1900")]):
+            for col, cell in enumerate(row):
+                stream.insert_text((72 + 150 * col, 100 + 20 * k), cell)
+        doc.new_page().insert_text((72, 72), "Just a paragraph of prose, nothing tabular about it.")
+        fd, self.path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        doc.save(self.path)
+        self.addCleanup(os.remove, self.path)
+
+    def test_pages_are_classified(self):
+        from core.extraction.tables import classify_page
+        with PdfContext(self.path) as ctx:
+            self.assertEqual([classify_page(ctx, i) for i in range(3)], ["lattice", "stream", None])
+
+    def test_overlapping_tables_are_deduplicated(self):
+        import pandas as pd
+        from core.extraction.tables import dedupe_tables
+        big = {"page": 0, "bbox": [0, 0, 100, 100], "df": pd.DataFrame([[1, 2], [3, 4]])}
+        dup = {"page": 0, "bbox": [5, 5, 100, 95], "df": pd.DataFrame([[1]])}
+        other_page = {"page": 1, "bbox": [5, 5, 100, 95], "df": pd.DataFrame([[1]])}
+        self.assertEqual(dedupe_tables([dup, big, other_page]), [big, other_page])
+
+
+def make_rent_roll(rows_per_page, pages=2, header=("Unit", "Unit Type", "Beds", "Rent", "Lease End")):
+    """Rent roll with native text whose header appears only on the first page."""
+    doc = fitz.open()
+    xs = [40, 110, 220, 300, 400]
+    n = 0
+    for p in range(pages):
+        page = doc.new_page()
+        page.insert_text((40, 40), "Oak Plaza Rent Roll", fontsize=14)
+        y = 80
+        if p == 0:
+            for x, h in zip(xs, header):
+                page.insert_text((x, y), h)
+            y += 18
+        for _ in range(rows_per_page):
+            n += 1
+            for x, cell in zip(xs, (str(100 + n), "2BR/1BA", "2", f"${1000 + n:,}.00", "12/31/2026")):
+                page.insert_text((x, y), cell)
+            y += 14
+        page.insert_text((40, y + 20), f"Page {p + 1}")
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    doc.save(path)
+    return path
+
+
+class WordGridTests(TempCacheMixin, SimpleTestCase):
+    def test_rows_across_pages_with_single_header(self):
+        from core.extraction.parsers import parse_rent_roll
+        path = make_rent_roll(rows_per_page=30)
+        self.addCleanup(os.remove, path)
+        with PdfContext(path) as ctx, mock.patch("core.extraction.parsers.extract_table_frames") as camelot:
+            res = parse_rent_roll(ctx)
+        camelot.assert_not_called()
+        units = res["units"]
+        self.assertEqual(len(units), 60)
+        self.assertEqual(units[0], {
+            "unit_number": "101", "unit_type": "2BR/1BA", "beds": "2", "rent": 1001.0, "lease_end": "12/31/2026",
+        })
+        self.assertEqual(units[-1]["unit_number"], "160")
+        cite = res["citations"][45]
+        self.assertEqual((cite["unit_index"], cite["page"]), (45, 1))
+        self.assertTrue(cite["snippet"].startswith("146 "))
+
+    def test_prose_falls_back_to_camelot(self):
+        from core.extraction.parsers import parse_rent_roll
+        path = make_pdf([["Nothing here looks like a rent roll header."]])
+        self.addCleanup(os.remove, path)
+        with PdfContext(path) as ctx, mock.patch("core.extraction.parsers.extract_table_frames", return_value=[]) as camelot:
+            res = parse_rent_roll(ctx)
+        camelot.assert_called_once()
+        self.assertEqual(res["units"], [])
+
+
+class RentRollFrameMappingTests(SimpleTestCase):
+    def test_header_continuation_and_coercion(self):
+        import pandas as pd
+        from core.extraction.parsers import RENT_ROLL_HEADERS, map_rent_roll_frame
+
+        first = pd.DataFrame([
+            ["Unit", "Unit Type", "Market Rent", "SqFt"],
+            [" 101 ", "1x1", "$1,250.00", "700 sf"],
+            ["", "", "", ""],
+        ])
+        second = pd.DataFrame([["102", "2x2", "-", "950"]])
+        records, columns = map_rent_roll_frame(first, RENT_ROLL_HEADERS)
+        more, _ = map_rent_roll_frame(second, RENT_ROLL_HEADERS, columns)
+
+        self.assertEqual(records, [{"unit_number": "101", "unit_type": "1x1", "rent": 1250.0, "sqft": 700.0}])
+        self.assertEqual(more, [{"unit_number": "102", "unit_type": "2x2", "rent": None, "sqft": 950.0}])
+
+    def test_numeric_cells_keep_first_number(self):
+        import pandas as pd
+        from core.extraction.parsers import RENT_ROLL_HEADERS, map_rent_roll_frame
+        from core.persistence import to_float
+
+        cells = ["$1,000.00.", "1,000 - 1,100", "approx. 950 sf", "n/a"]
+        frame = pd.DataFrame([["Unit", "Market Rent", "SqFt"]] + [[str(i), c, c] for i, c in enumerate(cells)])
+        records, _ = map_rent_roll_frame(frame, RENT_ROLL_HEADERS)
+        self.assertEqual([r["rent"] for r in records], [to_float(c) for c in cells])
+        self.assertEqual([r["sqft"] for r in records], [1000.0, 1000.0, 950.0, None])
+
+
+class LabelIndexTests(SimpleTestCase):
+    def test_multi_word_labels_resolve_in_one_pass(self):
+        from core.extraction.utils import WordIndex
+        words = [
+            [72, 100, 100, 112, "Year", 0, 0, 0],
+            [104, 100, 130, 112, "Built:", 0, 0, 1],
+            [200, 100, 230, 112, "1998", 0, 0, 2],
+            [72, 140, 110, 152, "Units", 1, 0, 0],
+            [200, 141, 215, 153, "48", 1, 0, 1],
+            [300, 400, 330, 412, "Built", 2, 0, 0],
+        ]
+        hits = WordIndex(words).find_values(["Year Built", "Units", "Cap Rate"])
+        self.assertEqual(hits["Year Built"], {"value": "1998", "bbox": [200, 100, 230, 112]})
+        self.assertEqual(hits["Units"]["value"], "48")
+        self.assertNotIn("Cap Rate", hits)
+
+
+class LeaseRuleTests(SimpleTestCase):
+    def test_fields_cite_page_and_value_bbox(self):
+        from core.extraction.lease import parse_lease
+        path = make_pdf([
+            ["Landlord: Acme Holdings LLC", "Tenant: Widget Co"],
+            ["The term commences on 1/1/2025 and expires on 12/31/2029.",
+             "Tenant shall pay base monthly rent of $12,500.00 monthly."],
+        ])
+        self.addCleanup(os.remove, path)
+        with PdfContext(path) as ctx:
+            res = parse_lease(ctx)
+            end_rect = ctx.page(1).search_for("12/31/2029")[0]
+        prop = res["property"]
+        self.assertEqual((prop["tenant"], prop["name"], prop["landlord"]), ("Widget Co", "Widget Co", "Acme Holdings LLC"))
+        self.assertEqual((prop["lease_start"], prop["lease_end"]), ("1/1/2025", "12/31/2029"))
+        self.assertEqual(prop["base_rent_monthly"], 12500.0)
+        cite = next(c for c in res["citations"] if c["field"] == "lease_end")
+        self.assertEqual(cite["page"], 1)
+        self.assertAlmostEqual(cite["bbox"][0], end_rect.x0, delta=1)
+
+    def test_overlapping_rules_all_match(self):
+        from core.extraction.lease import parse_lease
+        path = make_pdf([
+            ["Landlord: Acme LLC    Tenant: Widget Co",
+             "Security Deposit: $5,000 and base monthly rent of $2,000.",
+             "The Premises shall be used for office purposes and Tenant may renew for one additional five year term."],
+        ])
+        self.addCleanup(os.remove, path)
+        with PdfContext(path) as ctx:
+            prop = parse_lease(ctx)["property"]
+        self.assertEqual((prop["tenant"], prop["name"]), ("Widget Co", "Widget Co"))
+        self.assertTrue(prop["landlord"].startswith("Acme LLC"))
+        self.assertEqual(prop["security_deposit"], "$5,000 and base monthly rent of $2,000")
+        self.assertEqual(prop["base_rent_monthly"], 2000.0)
+        self.assertTrue(prop["use"].startswith("office purposes"))
+        self.assertEqual(prop["renewal"], "additional five year term")
+
+    def test_value_split_by_page_break(self):
+        from core.extraction.lease import parse_lease
+        path = make_pdf([
+            ["Tenant: Widget Co", "Tenant may renew for one additional"],
+            ["five year term.", "Security Deposit: $5,000"],
+        ])
+        self.addCleanup(os.remove, path)
+        with PdfContext(path) as ctx:
+            res = parse_lease(ctx)
+        prop = res["property"]
+        self.assertEqual(prop["renewal"].split(), ["additional", "five", "year", "term"])
+        self.assertEqual(prop["security_deposit"], "$5,000")
+        pages = {c["field"]: c["page"] for c in res["citations"]}
+        self.assertEqual((pages["renewal"], pages["security_deposit"], pages["tenant"]), (0, 1, 0))
+
+    def test_rules_matching_at_the_same_offset(self):
+        from core.extraction.rules import FieldRule, RuleSet
+        rules = RuleSet([FieldRule(("rent",), r"Rent: (\d+)", kind="number"), FieldRule(("period",), r"Rent: \d+ per (\w+)")])
+        path = make_pdf([["Rent: 900 per month"]])
+        self.addCleanup(os.remove, path)
+        with PdfContext(path) as ctx:
+            fields, _ = rules.extract(ctx)
+        self.assertEqual(fields, {"rent": 900.0, "period": "month"})
+
+    def test_rules_need_one_value_group(self):
+        from core.extraction.rules import FieldRule, RuleSet
+        with self.assertRaises(ValueError):
+            RuleSet([FieldRule(("x",), r"X: \d+")])
+
+
+class LlmMapReduceTests(SimpleTestCase):
+    def test_chunks_break_between_pages(self):
+        from core.extraction.genai import chunk_pages
+        pages = ["a" * 300, "b" * 300, "c" * 300]
+        chunks = chunk_pages(pages, max_tokens=200)
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(chunks[0].startswith("--- page 1 ---"))
+        self.assertIn("--- page 3 ---", chunks[1])
+
+    def test_all_chunks_are_called_and_merged(self):
+        from core.extraction import genai
+
+        async def fake_call(text, missing=None):
+            page = int(text.split("--- page ")[1].split(" ")[0])
+            return {
+                "property": {"name": "Oak Plaza" if page != 3 else "Oak Plaza Apts", "city": "Austin" if page == 1 else None},
+                "units": [{"unit_number": str(100 + page), "rent": 1000 + page}, {"unit_number": "101", "beds": "2"}],
+                "sections": [],
+            }
+
+        pages = [f"rent roll page {i}\n" + "x" * 300 for i in range(1, 6)]
+        with mock.patch.object(genai, "acall_openai_structured", side_effect=fake_call) as call:
+            out = genai.map_reduce_structured("openai", pages, max_tokens=100, concurrency=2)
+
+        self.assertEqual(call.call_count, 5)
+        self.assertEqual(out["property"]["name"], "Oak Plaza")
+        self.assertEqual(out["property"]["city"], "Austin")
+        by_number = {u["unit_number"]: u for u in out["units"]}
+        self.assertEqual(sorted(by_number), ["101", "102", "103", "104", "105"])
+        self.assertEqual((by_number["101"]["rent"], by_number["101"]["beds"]), (1001.0, "2"))
+
+
+class LlmClientTests(SimpleTestCase):
+    def test_token_bucket_waits_for_refill(self):
+        from core.extraction.llm import TokenBucket
+        now = [0.0]
+        bucket = TokenBucket(60, clock=lambda: now[0])
+        self.assertEqual(bucket.wait_time(60), 0)
+        bucket.take(60)
+        self.assertAlmostEqual(bucket.wait_time(30), 30.0)
+        now[0] = 30.0
+        self.assertEqual(bucket.wait_time(30), 0)
+
+    def test_retries_transient_errors_only(self):
+        import asyncio
+        from core.extraction.llm import LLMClient
+
+        client = LLMClient(rpm=1000, tpm=1_000_000, timeout=5, max_retries=3)
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise asyncio.TimeoutError()
+            return "ok"
+
+        async def broken():
+            raise ValueError("bad request")
+
+        with mock.patch("core.extraction.llm.random.uniform", return_value=0):
+            self.assertEqual(client.run(client.call(flaky, tokens=10)), "ok")
+            with self.assertRaises(ValueError):
+                client.run(client.call(broken, tokens=10))
+        self.assertEqual(len(attempts), 3)
+
+
+class LlmResponseCacheTests(TempCacheMixin, SimpleTestCase):
+    def test_repeated_prompt_is_served_from_cache(self):
+        from core.extraction.llm import FakeLLM, LLMClient
+
+        fake = FakeLLM(lambda messages: '{"property": {"name": "Oak"}}')
+        client = LLMClient(backend=fake)
+        messages = [{"role": "system", "content": "extract"}, {"role": "user", "content": "page text"}]
+        first = client.run(client.chat(messages))
+        second = client.run(client.chat(messages))
+        client.run(client.chat([messages[0], {"role": "user", "content": "other text"}]))
+
+        self.assertEqual(first, second)
+        self.assertEqual(fake.calls, 2)
+        stats = self.cache.stats()["llm_response"]
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertGreater(stats["saved_input_tokens"], 0)
+
+    def test_langchain_structured_output_runs_on_shared_client(self):
+        from core.extraction import genai, llm
+
+        fake = llm.FakeLLM(lambda messages: '{"property": {"name": "Oak"}, "units": [{"unit_number": "1"}]}')
+        with mock.patch.object(llm, "_client", llm.LLMClient(backend=fake)), \
+                mock.patch.object(llm, "_client_pid", os.getpid()):
+            out = genai.call_langchain_structured("Oak flyer")
+            again = genai.call_langchain_structured("Oak flyer")
+
+        self.assertEqual(out["property"]["name"], "Oak")
+        self.assertEqual(out["units"][0]["unit_number"], "1")
+        self.assertEqual(again, out)
+        self.assertEqual(fake.calls, 1)
+
+    def test_image_hashes_and_ttl(self):
+        from core.extraction.llm import fingerprint
+
+        def vision(url):
+            return [{"role": "user", "content": [{"type": "text", "text": "x"}, {"type": "image_url", "image_url": {"url": url}}]}]
+
+        self.assertNotEqual(fingerprint("m", vision("data:a")), fingerprint("m", vision("data:b")))
+        self.cache.set("llm_response", "k", "v", ttl=-1)
+        self.assertIsNone(self.cache.get("llm_response", "k"))
+
+
+class VisionPageTests(SimpleTestCase):
+    def test_picks_data_pages_and_shrinks_payload(self):
+        import base64
+        from core.extraction.genai import _page_image_url, select_vision_pages
+
+        path = make_pdf([
+            ["Investment Offering"],
+            ["Lorem ipsum dolor sit amet " * 3] * 30,
+            ["Rent Roll", "Unit 101 Rent $1,200 Sq Ft 700", "Unit 102 Rent $1,250 Sq Ft 720", "Cap Rate 6.1%"],
+        ])
+        self.addCleanup(os.remove, path)
+        with PdfContext(path) as ctx:
+            self.assertEqual(select_vision_pages(ctx, 1), [2])
+            self.assertEqual(select_vision_pages(ctx, 2), [0, 2])
+            url = _page_image_url(ctx, 2)
+            full_png = len(ctx.pixmap(2, 220).tobytes("png"))
+        self.assertTrue(url.startswith("data:image/png;base64,"))
+        self.assertLess(len(base64.b64decode(url.split(",", 1)[1])) * 5, full_png)
+
+
+class CoverageGateTests(TempCacheMixin, SimpleTestCase):
+    def test_complete_rent_roll_skips_llm(self):
+        from core.extraction import genai
+        result = {"property": {"name": "Oak Court", "address": "1 Main St"},
+                  "units": [{"unit_number": "101", "rent": 1200.0}], "confidence": 1.0}
+        with mock.patch.dict(os.environ, {"GENAI_PROVIDER": "openai"}), \
+                mock.patch.object(genai, "map_reduce_structured") as llm:
+            out = genai.genai_enrich(result, "", doc_type="rent_roll")
+        llm.assert_not_called()
+        self.assertEqual(out["genai"], {"skipped": True, "coverage": 1.0})
+
+    def test_rent_roll_without_property_name_asks_llm(self):
+        from core.extraction import genai
+        result = {"property": {}, "units": [{"unit_number": "101", "rent": 1200.0}], "confidence": 1.0}
+        llm_out = {"property": {"name": "Oak Court", "address": "1 Main St"}, "units": [], "sections": []}
+        with mock.patch.dict(os.environ, {"GENAI_PROVIDER": "openai"}), \
+                mock.patch.object(genai, "map_reduce_structured", return_value=llm_out) as llm:
+            out = genai.genai_enrich(result, "", doc_type="rent_roll")
+        self.assertEqual(llm.call_args.kwargs["missing"], ["name", "address"])
+        self.assertEqual(out["property"], {"name": "Oak Court", "address": "1 Main St"})
+        self.assertEqual(out["units"], [{"unit_number": "101", "rent": 1200.0}])
+
+    def test_missing_unit_rent_is_filled_by_unit_number(self):
+        from core.extraction import genai
+        result = {
+            "property": {"name": "Oak Court", "address": "1 Main St"},
+            "units": [{"unit_number": "101", "rent": None}, {"unit_number": "102", "rent": None}],
+            "confidence": 1.0,
+        }
+        llm_out = {"property": {}, "sections": [], "units": [
+            {"unit_number": "102", "rent": 1350},
+            {"rent": 999},
+            {"unit_number": "999", "rent": 5},
+        ]}
+        with mock.patch.dict(os.environ, {"GENAI_PROVIDER": "openai"}), \
+                mock.patch.object(genai, "map_reduce_structured", return_value=llm_out) as llm:
+            out = genai.genai_enrich(result, "", doc_type="rent_roll")
+        self.assertEqual(llm.call_args.kwargs["missing"], ["units[].rent"])
+        self.assertEqual([(u["unit_number"], u["rent"]) for u in out["units"]], [("101", None), ("102", 1350.0)])
+        prompt = genai._structured_messages("", ["units[].rent"])[0]["content"]
+        self.assertIn("only fill units[].rent", prompt)
+        self.assertIn("include unit_number for every unit", prompt)
+
+    def test_partial_flyer_asks_only_for_missing_fields_on_relevant_pages(self):
+        from core.extraction import genai
+        path = make_pdf([["Oak Plaza offering"], ["Built in 1998", "Cap Rate 6.5%"], ["Floor plans"]])
+        self.addCleanup(os.remove, path)
+        result = {"property": {"name": "Oak Plaza", "address": "1 Main St", "sqft": 5000, "unit_count": 10}}
+        llm_out = {"property": {"year_built": "1998", "cap_rate": 6.5, "name": "Other"}, "units": [], "sections": []}
+        sent = {}
+
+        def fake_map_reduce(provider, pages, missing=None):
+            sent.update(pages=[r.page for r in pages], missing=missing)
+            return llm_out
+
+        with PdfContext(path) as ctx, mock.patch.dict(os.environ, {"GENAI_PROVIDER": "openai"}), \
+                mock.patch.object(genai, "map_reduce_structured", side_effect=fake_map_reduce):
+            out = genai.genai_enrich(result, pdf=ctx, doc_type="flyer")
+        self.assertEqual(sent, {"pages": [1], "missing": ["year_built", "cap_rate"]})
+        self.assertEqual(out["property"]["year_built"], "1998")
+        self.assertEqual(out["property"]["name"], "Oak Plaza")
+        self.assertFalse(out["genai"]["skipped"])
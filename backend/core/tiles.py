@@ -0,0 +1,195 @@
+"""
+Rendered page images for the document viewer.
+
+Pages, or a bbox crop of a page plus a margin, are rendered with PyMuPDF at the
+requested scale and encoded as WebP (through OpenCV) or PNG. Encoded images are
+kept in an on-disk LRU cache keyed by the document file (size and mtime), page,
+scale, crop and format; the same key is the HTTP ETag. The viewer then loads a
+few page images instead of the whole original PDF.
+"""
+import hashlib
+import math
+import os
+import tempfile
+import threading
+
+import cv2
+import fitz
+import numpy as np
+from django.conf import settings
+
+from .extraction.context import PdfContext
+
+FORMATS = {"webp": "image/webp", "png": "image/png"}
+MIN_SCALE, MAX_SCALE = 0.1, 4.0
+# larger renders are scaled down to this many pixels
+MAX_PIXELS = 16_000_000
+# bump to invalidate every cached tile after a rendering change
+TILE_VERSION = "1"
+
+
+class TileCache:
+    """
+    Files under `root`, sharded by the first two hex digits of the key. A hit
+    refreshes the file's mtime. Writes add to a running size total taken from
+    one scan of the directory; only when it crosses `max_bytes` is the tree
+    rescanned (which also picks up other processes' writes) and the least
+    recently used files deleted until it is back under 90% of `max_bytes`.
+    """
+
+    def __init__(self, root, max_bytes: int):
+        self.root = str(root)
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    def path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.{fmt}")
+
+    def get(self, key: str, fmt: str):
+        path = self.path(key, fmt)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # evicted by another process in between
+        return data
+
+    def put(self, key: str, fmt: str, data: bytes):
+        path = self.path(key, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._scan())
+            else:
+                self._size += len(data)
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _scan(self):
+        """(mtime, size, path) of every cached file; in-progress writes and vanished files are skipped."""
+        files = []
+        try:
+            shards = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return files
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            try:
+                entries = list(os.scandir(shard.path))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue  # replaced or evicted by another writer
+                files.append((st.st_mtime, st.st_size, entry.path))
+        return files
+
+    def evict(self):
+        files = self._scan()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        if total > self.max_bytes:
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+        with self._lock:
+            self._size = total
+        return removed
+
+
+_caches = {}
+
+
+def tile_cache() -> TileCache:
+    """One TileCache per process and directory, so its running size survives between requests."""
+    key = (str(settings.TILE_CACHE_DIR), settings.TILE_CACHE_MAX_BYTES)
+    if key not in _caches:
+        _caches[key] = TileCache(*key)
+    return _caches[key]
+
+
+def parse_clip(bbox: str, margin: float = 0.0):
+    """'x0,y0,x1,y1' in PDF points, grown by `margin` points on every side. Raises ValueError."""
+    x0, y0, x1, y1 = (float(v) for v in bbox.split(","))
+    clip = (x0 - margin, y0 - margin, x1 + margin, y1 + margin)
+    if not all(math.isfinite(v) for v in clip):
+        raise ValueError("bbox and margin must be finite numbers")
+    return clip
+
+
+def tile_key(document, page: int, scale: float, clip=None, fmt: str = "webp") -> str:
+    st = os.stat(document.file.path)
+    clip_part = ",".join(f"{v:.1f}" for v in clip) if clip else "page"
+    raw = f"{TILE_VERSION}:{document.pk}:{document.file.name}:{st.st_size}:{st.st_mtime_ns}:{page}:{scale:.2f}:{clip_part}:{fmt}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def page_sizes(path: str):
+    """[{"page", "width", "height"}] in PDF points, for laying out the viewer before images load."""
+    with PdfContext(path) as ctx:
+        return [
+            {"page": i, "width": round(ctx.page(i).rect.width, 2), "height": round(ctx.page(i).rect.height, 2)}
+            for i in range(len(ctx))
+        ]
+
+
+def render_page(path: str, page: int, scale: float = 1.0, clip=None, fmt: str = "webp") -> bytes:
+    """Encoded image of one page, or of `clip` (PDF points, clamped to the page). Raises IndexError/ValueError."""
+    with PdfContext(path) as ctx:
+        if not 0 <= page < len(ctx):
+            raise IndexError(f"page {page} out of range (document has {len(ctx)} pages)")
+        pg = ctx.page(page)
+        rect = fitz.Rect(clip) & pg.rect if clip else pg.rect
+        if rect.is_empty:
+            raise ValueError("bbox does not overlap the page")
+        scale = min(scale, math.sqrt(MAX_PIXELS / max(rect.width * rect.height, 1.0)))
+        pix = pg.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=rect, alpha=False)
+    if fmt == "png":
+        return pix.tobytes("png")
+    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.h, pix.w, pix.n)
+    if pix.n == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    ok, buf = cv2.imencode(".webp", img, [cv2.IMWRITE_WEBP_QUALITY, settings.TILE_WEBP_QUALITY])
+    if not ok:
+        raise ValueError("WebP encoding failed")
+    return buf.tobytes()
+
+
+def get_tile(document, page: int, scale: float = 1.0, clip=None, fmt: str = "webp", key: str = None):
+    """Returns (image bytes, cache key), rendering and caching on a miss. Raises ValueError on a bad scale."""
+    if not math.isfinite(scale):
+        raise ValueError("scale must be a finite number")
+    scale = round(min(max(scale, MIN_SCALE), MAX_SCALE), 2)
+    key = key or tile_key(document, page, scale, clip, fmt)
+    cache = tile_cache()
+    data = cache.get(key, fmt)
+    if data is None:
+        data = render_page(document.file.path, page, scale, clip, fmt)
+        cache.put(key, fmt, data)
+    return data, key
+
+
+def pregenerate_thumbnail(document):
+    """Render the first-page thumbnail into the cache (called once a document is extracted)."""
+    return get_tile(document, 0, settings.THUMBNAIL_SCALE, fmt="webp")
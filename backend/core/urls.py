@@ -1,12 +1,18 @@
 from django.urls import path
-from .views import UploadView, DocumentDetail, PropertiesList, UnitsList, SearchView, CitationsView, PropertyDetail
+from .views import UploadView, DocumentDetail, ReextractView, JobDetail, PropertiesList, UnitsList, SearchView, CitationsView, PropertyDetail, ExportView, PageSizesView, PageImageView
 
 urlpatterns = [
     path("upload/", UploadView.as_view()),
     path("documents/<int:pk>/", DocumentDetail.as_view()),
+    path("documents/<int:pk>/reextract/", ReextractView.as_view()),
+    path("documents/<int:pk>/pages/", PageSizesView.as_view()),
+    path("documents/<int:pk>/pages/<int:page>.<str:fmt>", PageImageView.as_view()),
+    path("documents/<int:pk>/thumbnail.<str:fmt>", PageImageView.as_view(thumbnail=True)),
+    path("jobs/<int:pk>/", JobDetail.as_view()),
     path("properties/", PropertiesList.as_view()),
     path("properties/<int:pk>/", PropertyDetail.as_view()), 
     path("units/", UnitsList.as_view()),
     path("search/", SearchView.as_view()),
+    path("export/<str:resource>.<str:fmt>", ExportView.as_view()),
     path("citations/<str:model_name>/<int:record_id>/", CitationsView.as_view()),
 ]
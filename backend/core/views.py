@@ -1,24 +1,34 @@
+import csv
+import json
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
 from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.conf import settings
 
-from .models import Document, Property, Unit, Section, FieldCitation
+from .models import Document, Property, Unit, Section, FieldCitation, ExtractionJob
 from .serializers import (
     DocumentSerializer,
+    DocumentSummarySerializer,
+    ExtractionJobSerializer,
     PropertySerializer,
+    PropertySummarySerializer,
     UnitSerializer,
     SectionSerializer,
     FieldCitationSerializer,
 )
-import json
 import logging
 
-from .extraction.pipeline import extract
+from .jobs import enqueue, enqueue_reextract
+from .search import SEARCH_KINDS, search
+from . import tiles
 
 logger = logging.getLogger(__name__)
 
@@ -53,58 +63,48 @@ def _persisted_doc_type(requested: str) -> str:
     valid = {Document.RENT_ROLL, Document.FLYER}
     return requested if requested in valid else Document.FLYER
 
-VALID_DOC_TYPES = {
-    getattr(Document, "RENT_ROLL", "rent_roll"),
-    getattr(Document, "FLYER", "flyer"),
-    "lease",
-    "auto",
-}
+def _contains_filter(qs, field: str, value: str):
+    """
+    Case-insensitive substring match (as icontains) on a lower-cased `*_norm`
+    column, so the lookup is a plain LIKE that a trigram index serves on
+    Postgres (migration 0009); other backends scan the column.
+    """
+    v = value.strip().lower()
+    if not v:
+        return qs
+    return qs.filter(**{f"{field}__contains": v})
 
-import re
+def _is_lean(request) -> bool:
+    return (request.query_params.get("lean") or "").lower() in ("1", "true", "yes")
 
-_num_re = re.compile(r"[-+]?\d{1,3}(?:,\d{3})*(?:\.\d+)?|[-+]?\d+(?:\.\d+)?")
+UNITS_PREFETCH = Prefetch("units", queryset=Unit.objects.order_by("id"))
+SECTIONS_PREFETCH = Prefetch("sections", queryset=Section.objects.order_by("page", "id"))
 
-def to_str(v) -> str:
-    if v is None:
-        return ""
-    if isinstance(v, (int, float)):
-        return str(v)
-    return str(v).strip()
 
-def to_int(v):
-    if v is None or v == "":
-        return None
-    if isinstance(v, bool):
-        return int(v)
-    if isinstance(v, (int,)):
-        return v
-    s = str(v)
-    m = _num_re.search(s)
-    if not m:
-        return None
-    try:
-        return int(float(m.group(0).replace(",", "")))
-    except Exception:
-        return None
+class LeanMixin:
+    """
+    `?lean=1` serializes with `lean_serializer_class` (no nested rows) and skips
+    the prefetches; otherwise nested rows are loaded with one query per relation.
+    """
+    lean_serializer_class = None
+    prefetch = ()
 
-def to_float(v):
-    if v is None or v == "":
-        return None
-    if isinstance(v, bool):
-        return float(v)
-    if isinstance(v, (int, float)):
-        return float(v)
-    s = str(v)
-    m = _num_re.search(s)
-    if not m:
-        return None
-    try:
-        return float(m.group(0).replace(",", ""))
-    except Exception:
-        return None
+    def get_serializer_class(self):
+        return self.lean_serializer_class if _is_lean(self.request) else self.serializer_class
+
+    def with_prefetch(self, qs):
+        return qs if _is_lean(self.request) else qs.prefetch_related(*self.prefetch)
 
-def as_plain_str(v) -> str:
-    return "" if v is None else str(v).strip()
+    def get_queryset(self):
+        return self.with_prefetch(super().get_queryset())
+
+
+VALID_DOC_TYPES = {
+    getattr(Document, "RENT_ROLL", "rent_roll"),
+    getattr(Document, "FLYER", "flyer"),
+    "lease",
+    "auto",
+}
 
 
 @method_decorator(csrf_exempt, name="dispatch")
@@ -122,157 +122,249 @@ class UploadView(APIView):
             file=file,
             doc_type=doc_type if doc_type != "auto" else getattr(Document, "FLYER", "flyer"),
         )
-        d.pages = 0
-        d.save()
+        job = enqueue(d, doc_type)
+
+        return Response(
+            {
+                "document_id": d.id,
+                "job_id": job.id,
+                "status": job.status,
+                "property_id": job.property_id,
+            },
+            status=201,
+        )
+
+
+class DocumentDetail(LeanMixin, generics.RetrieveAPIView):
+    queryset = Document.objects.all()
+    serializer_class = DocumentSerializer
+    lean_serializer_class = DocumentSummarySerializer
+    prefetch = (SECTIONS_PREFETCH,)
 
-        res = extract(d.file.path, doc_type)
-        logger.info("EXTRACT RESULT (doc %s): %s", d.id, json.dumps(res, indent=2, default=str))
-        if isinstance(res, dict) and res.get("doc_type"):
-            d.doc_type = res["doc_type"]
 
+@method_decorator(csrf_exempt, name="dispatch")
+class ReextractView(APIView):
+    """POST {"stages": ["ocr", "tables", "llm"]} to re-extract one document; returns the queued job."""
+
+    def post(self, request, pk: int):
+        docs = Document.objects.filter(pk=pk)
+        if not docs.exists():
+            return Response({"detail": "not found"}, status=404)
+        stages = request.data.get("stages") or []
+        if isinstance(stages, str):
+            stages = [s for s in stages.split(",") if s]
         try:
-            d.pages = len(fitz.open(d.file.path))
+            enqueue_reextract(docs, stages)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+        job = ExtractionJob.objects.filter(document_id=pk).order_by("-id").first()
+        return Response(ExtractionJobSerializer(job).data, status=202)
+
+
+class PageSizesView(APIView):
+    """GET page sizes in PDF points, so the viewer can lay out pages before their images load."""
+
+    def get(self, request, pk: int):
+        doc = Document.objects.filter(pk=pk).first()
+        if doc is None or not doc.file:
+            return Response({"detail": "not found"}, status=404)
+        return Response({"document": doc.pk, "pages": tiles.page_sizes(doc.file.path)})
+
+
+class PageImageView(APIView):
+    """
+    GET /api/documents/<pk>/pages/<page>.<webp|png>?scale=1.5 renders one page;
+    &bbox=x0,y0,x1,y1 (PDF points) and &margin= crop it around a citation. Images
+    come from the tile cache and carry an ETag, so repeat requests are 304s.
+    /api/documents/<pk>/thumbnail.<fmt> is page 0 at THUMBNAIL_SCALE.
+    """
+    thumbnail = False
+
+    def get(self, request, pk: int, fmt: str, page: int = 0):
+        if fmt not in tiles.FORMATS:
+            return Response({"detail": f"format must be one of {', '.join(tiles.FORMATS)}"}, status=404)
+        doc = Document.objects.filter(pk=pk).first()
+        if doc is None or not doc.file:
+            return Response({"detail": "not found"}, status=404)
+        params = request.query_params
+        scale = settings.THUMBNAIL_SCALE if self.thumbnail else _coerce_float(params.get("scale"), 1.0)
+        clip = None
+        if params.get("bbox") and not self.thumbnail:
+            try:
+                clip = tiles.parse_clip(params["bbox"], _coerce_float(params.get("margin"), 0.0))
+            except ValueError:
+                return Response({"detail": "bbox must be x0,y0,x1,y1 in finite PDF points"}, status=400)
+        try:
+            data, key = tiles.get_tile(doc, page, scale, clip, fmt)
+        except (IndexError, FileNotFoundError) as e:
+            return Response({"detail": str(e)}, status=404)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        etag = f'"{key}"'
+        if etag in [t.strip() for t in request.headers.get("If-None-Match", "").split(",")]:
+            resp = HttpResponse(status=304)
+        else:
+            resp = HttpResponse(data, content_type=tiles.FORMATS[fmt])
+        resp["ETag"] = etag
+        patch_cache_control(resp, public=True, max_age=settings.TILE_MAX_AGE)
+        return resp
+
+
+class JobDetail(generics.RetrieveAPIView):
+    queryset = ExtractionJob.objects.select_related("document")
+    serializer_class = ExtractionJobSerializer
+
+
+def _filter_properties(qs, params):
+    src = params.get("source_document")
+    if src:
+        try:
+            qs = qs.filter(source_document_id=int(src))
         except Exception:
+            qs = qs.none()
+
+    name = params.get("name")
+    city = params.get("city")
+    state = params.get("state")
+    min_units = params.get("min_units")
+    max_rent = params.get("max_rent")
+    if name:
+        qs = _contains_filter(qs, "name_norm", name)
+    if city:
+        qs = _contains_filter(qs, "city_norm", city)
+    if state:
+        qs = _contains_filter(qs, "state_norm", state)
+    if min_units:
+        try: qs = qs.filter(unit_count__gte=int(min_units))
+        except: pass
+    if max_rent:
+        try:
+            cheap = Unit.objects.filter(property=OuterRef("pk"), rent__lte=float(max_rent))
+            qs = qs.filter(Exists(cheap))
+        except ValueError:
             pass
-        d.save()
-
-        with transaction.atomic():
-            prop = None
-            p_in = res.get("property") or {}
-            if p_in:
-                pdata = {
-                    "name": to_str(p_in.get("name")),
-                    "address": to_str(p_in.get("address")),
-                    "city": to_str(p_in.get("city")),
-                    "state": to_str(p_in.get("state")),
-                    "zipcode": as_plain_str(p_in.get("zipcode")),
-                    "year_built": to_str(p_in.get("year_built")),  
-                    "sqft": to_int(p_in.get("sqft")),
-                    "unit_count": to_int(p_in.get("unit_count")),
-                    "cap_rate": to_float(p_in.get("cap_rate")),
-                }
-                prop = Property.objects.create(**pdata, source_document=d)
-
-            
-            for u in res.get("units", []):
-                if prop is None:
-                    prop = Property.objects.create(source_document=d)
-                Unit.objects.create(
-                    property=prop,
-                    unit_number=to_str(u.get("unit_number")),
-                    beds=to_str(u.get("beds")),
-                    baths=to_str(u.get("baths")),
-                    sqft=to_int(u.get("sqft")),
-                    rent=to_float(u.get("rent")),
-                    status=to_str(u.get("status")),
-                    lease_start=to_str(u.get("lease_start")),  
-                    lease_end=to_str(u.get("lease_end")),
-                )
-
-            
-            for s in res.get("sections", []):
-                bbox = s.get("bbox") or [0, 0, 0, 0]
-                if not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
-                    bbox = [0, 0, 0, 0]
-                Section.objects.create(
-                    document=d,
-                    page=s.get("page", 0) or 0,
-                    title=to_str(s.get("title")),
-                    text=to_str(s.get("text")),
-                    bbox_x0=float(bbox[0]),
-                    bbox_y0=float(bbox[1]),
-                    bbox_x1=float(bbox[2]),
-                    bbox_y1=float(bbox[3]),
-                )
-
-            
-            for c in res.get("citations", []):
-                bbox = c.get("bbox") or [0, 0, 0, 0]
-                if not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
-                    bbox = [0, 0, 0, 0]
-                FieldCitation.objects.create(
-                    document=d,
-                    model_name="Property",
-                    record_id=prop.id if prop else 0,
-                    field_name=to_str(c.get("field")),
-                    page=c.get("page", 0) or 0,
-                    x0=float(bbox[0]),
-                    y0=float(bbox[1]),
-                    x1=float(bbox[2]),
-                    y1=float(bbox[3]),
-                    snippet=to_str(c.get("snippet")),
-                )
-
-        return Response({"document_id": d.id, "property_id": prop.id if prop else None}, status=201)
-
-
-class DocumentDetail(generics.RetrieveAPIView):
-    queryset = Document.objects.all()
-    serializer_class = DocumentSerializer
+    return qs
+
+def _filter_units(qs, params):
+    prop = params.get("property_id")
+    beds = params.get("beds")
+    if prop:
+        try:
+            qs = qs.filter(property_id=int(prop))
+        except Exception:
+            qs = qs.none()
+    if beds:
+        qs = _contains_filter(qs, "beds_norm", beds)
+    return qs
 
 
-class PropertiesList(generics.ListAPIView):
+class PropertiesList(LeanMixin, generics.ListAPIView):
     serializer_class = PropertySerializer
-    def get_queryset(self):
-        qs = Property.objects.all().order_by("id")
+    lean_serializer_class = PropertySummarySerializer
+    prefetch = (UNITS_PREFETCH,)
 
-        
-        src = self.request.query_params.get("source_document")
-        if src:
-            try:
-                qs = qs.filter(source_document_id=int(src))
-            except Exception:
-                qs = qs.none()
-
-        name = self.request.query_params.get("name")
-        city = self.request.query_params.get("city")
-        state = self.request.query_params.get("state")
-        min_units = self.request.query_params.get("min_units")
-        max_rent = self.request.query_params.get("max_rent")
-        if name:
-            qs = qs.filter(name__icontains=name)
-        if city:
-            qs = qs.filter(city__icontains=city)
-        if state:
-            qs = qs.filter(state__icontains=state)
-        if min_units:
-            try: qs = qs.filter(unit_count__gte=int(min_units))
-            except: pass
-        if max_rent:
-            try: qs = qs.filter(units__rent__lte=float(max_rent)).distinct()
-            except: pass
-        return qs
+    def get_queryset(self):
+        qs = self.with_prefetch(Property.objects.all().order_by("id"))
+        return _filter_properties(qs, self.request.query_params)
 
 
 class UnitsList(generics.ListAPIView):
     serializer_class = UnitSerializer
 
     def get_queryset(self):
-        qs = Unit.objects.all().order_by("id")
-        prop = self.request.query_params.get("property_id")
-        beds = self.request.query_params.get("beds")
-        if prop:
-            try:
-                qs = qs.filter(property_id=int(prop))
-            except Exception:
-                qs = qs.none()
-        if beds:
-            qs = qs.filter(beds__icontains=beds)
-        return qs
+        return _filter_units(Unit.objects.all().order_by("id"), self.request.query_params)
+
+
+class ExportView(APIView):
+    """
+    GET /api/export/<properties|units>.<csv|ndjson> streams every row matching the
+    list endpoint's filters. Rows are read with .iterator(chunk_size) as plain value
+    tuples and written as they are produced, so memory stays flat for any table size.
+    """
+    RESOURCES = {
+        "properties": (Property, _filter_properties),
+        "units": (Unit, _filter_units),
+    }
+    CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+    def get(self, request, resource: str, fmt: str):
+        if resource not in self.RESOURCES or fmt not in self.CONTENT_TYPES:
+            return Response(
+                {"detail": f"use /export/<{'|'.join(self.RESOURCES)}>.<{'|'.join(self.CONTENT_TYPES)}>"},
+                status=404,
+            )
+        model, filter_rows = self.RESOURCES[resource]
+        fields = [f for f in model._meta.concrete_fields if not f.generated]
+        names = [f.name for f in fields]
+        rows = (
+            filter_rows(model.objects.all(), request.query_params)
+            .order_by("id")
+            .values_list(*[f.attname for f in fields])
+            .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+        )
+        lines = _csv_lines(names, rows) if fmt == "csv" else _ndjson_lines(names, rows)
+        resp = StreamingHttpResponse(lines, content_type=self.CONTENT_TYPES[fmt])
+        resp["Content-Disposition"] = f'attachment; filename="{resource}.{fmt}"'
+        return resp
+
+
+class _Echo:
+    def write(self, value):
+        return value
 
-class PropertyDetail(generics.RetrieveAPIView):
+def _csv_lines(names, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(names)
+    for row in rows:
+        yield writer.writerow(row)
+
+def _ndjson_lines(names, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), default=str) + "\n"
+
+class PropertyDetail(LeanMixin, generics.RetrieveAPIView):
     queryset = Property.objects.all()
     serializer_class = PropertySerializer
+    lean_serializer_class = PropertySummarySerializer
+    prefetch = (UNITS_PREFETCH,)
 
 class SearchView(APIView):
+    """
+    Ranked full-text search (core.search). `properties` and `units` are the best
+    matching records; `hits` lists matches of every kind, sections and citation
+    snippets included, with document, page and a highlighted snippet.
+    Optional `kind` narrows `hits` to one of SEARCH_KINDS and `limit` caps it;
+    `lean=1` leaves the units out of `properties`.
+    """
+
     def get(self, request):
         q = (request.query_params.get("q") or "").strip()
-        props = Property.objects.filter(name__icontains=q) | Property.objects.filter(address__icontains=q)
-        units = Unit.objects.filter(unit_number__icontains=q) | Unit.objects.filter(status__icontains=q)
+        kind = request.query_params.get("kind") or None
+        if kind is not None and kind not in SEARCH_KINDS:
+            return Response({"detail": f"kind must be one of {list(SEARCH_KINDS)}"}, status=400)
+        limit = _coerce_int(request.query_params.get("limit"), 50)
+
+        prop_hits = search(q, "property", 50)
+        unit_hits = search(q, "unit", 100)
+        hits = search(q, kind, limit)
+
+        lean = _is_lean(request)
+        props = Property.objects.all() if lean else Property.objects.prefetch_related(UNITS_PREFETCH)
+        props = props.in_bulk([h["id"] for h in prop_hits])
+        units = Unit.objects.in_bulk([h["id"] for h in unit_hits])
+        cited = FieldCitation.objects.in_bulk([h["id"] for h in hits if h["kind"] == "citation"])
+        for h in hits:
+            c = cited.get(h["id"]) if h["kind"] == "citation" else None
+            if c is not None:
+                h["model_name"], h["record_id"] = c.model_name, c.record_id
         return Response(
             {
-                "properties": PropertySerializer(props[:50], many=True).data,
-                "units": UnitSerializer(units[:100], many=True).data,
+                "properties": (PropertySummarySerializer if lean else PropertySerializer)(
+                    [props[h["id"]] for h in prop_hits if h["id"] in props], many=True
+                ).data,
+                "units": UnitSerializer([units[h["id"]] for h in unit_hits if h["id"] in units], many=True).data,
+                "hits": hits,
             }
         )
 
@@ -125,10 +125,33 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REST_FRAMEWORK = {
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination", 
+    # keyset pages ordered by id; ?count=1 adds the total, ?page_size= up to 500
+    "DEFAULT_PAGINATION_CLASS": "core.pagination.IdCursorPagination",
     "PAGE_SIZE": 25
     }
 
+# tests run with the extraction cache, MEDIA_ROOT and TILE_CACHE_DIR in a temp directory
+TEST_RUNNER = "core.testing.IsolatedTestRunner"
+
+# Extraction queue: uploads enqueue an ExtractionJob drained by `manage.py extraction_worker`.
+# EXTRACTION_EAGER=1 runs the job inside the upload request (handy without a worker).
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "2"))
+EXTRACTION_EAGER = os.getenv("EXTRACTION_EAGER", "0") == "1"
+# a job RUNNING for longer than this (worker crashed or restarted) is claimed again;
+# keep it above the slowest extraction, or a live job is run twice
+EXTRACTION_JOB_TIMEOUT = int(os.getenv("EXTRACTION_JOB_TIMEOUT", "3600"))
+# rows per INSERT when persisting units/sections/citations
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "500"))
+# rows fetched per round trip by the streaming /api/export/ endpoint
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))
+# rendered page images for the viewer (core.tiles): on-disk LRU cache and HTTP caching
+TILE_CACHE_DIR = Path(os.getenv("TILE_CACHE_DIR", BASE_DIR / "tile_cache"))
+TILE_CACHE_MAX_BYTES = int(os.getenv("TILE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+TILE_MAX_AGE = int(os.getenv("TILE_MAX_AGE", "86400"))
+TILE_WEBP_QUALITY = int(os.getenv("TILE_WEBP_QUALITY", "80"))
+# first-page thumbnail rendered when a document finishes extracting
+THUMBNAIL_SCALE = float(os.getenv("THUMBNAIL_SCALE", "0.3"))
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
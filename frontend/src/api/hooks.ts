@@ -1,18 +1,19 @@
 import { useQuery, useMutation } from "@tanstack/react-query";
 import { api } from "./client";
-import type { Property, Unit, Citation } from "./types";
+import type { Property, Unit, Citation, ExtractionJob } from "./types";
 
 export function useProperties(params?: Record<string, any>) {
   return useQuery({
     queryKey: ["properties", params],
-    queryFn: async () => (await api.get<{results: Property[]; count: number}>("/properties/", { params })).data,
+    // lean: properties without embedded units; units are loaded through useUnits
+    queryFn: async () => (await api.get<{results: Property[]; next: string | null; count?: number}>("/properties/", { params: { lean: 1, ...params } })).data,
   });
 }
 
 export function useUnits(params?: Record<string, any>) {
   return useQuery({
     queryKey: ["units", params],
-    queryFn: async () => (await api.get<{results: Unit[]; count: number}>("/units/", { params })).data,
+    queryFn: async () => (await api.get<{results: Unit[]; next: string | null; count?: number}>("/units/", { params })).data,
   });
 }
 
@@ -22,7 +23,19 @@ export function useUpload() {
       const form = new FormData();
       form.append("file", payload.file);
       form.append("doc_type", payload.doc_type);
-      return (await api.post("/upload/", form)).data as { document_id: number };
+      return (await api.post("/upload/", form)).data as { document_id: number; job_id: number };
+    },
+  });
+}
+
+export function useJob(id?: number) {
+  return useQuery({
+    queryKey: ["job", id],
+    enabled: !!id,
+    queryFn: async () => (await api.get<ExtractionJob>(`/jobs/${id}/`)).data,
+    refetchInterval: (query) => {
+      const status = query.state.data?.status;
+      return status === "done" || status === "failed" ? false : 1500;
     },
   });
 }
@@ -41,7 +54,7 @@ export function useSearch(q: string) {
     enabled,
     queryKey: ["search", q],
     queryFn: async (): Promise<{ properties: Property[]; units: Unit[] }> => {
-      const { data } = await api.get("/search/", { params: { q } });
+      const { data } = await api.get("/search/", { params: { q, lean: 1 } });
       return data;
     },
     staleTime: 30_000,
@@ -43,4 +43,18 @@ export type Section = {
     bbox_y0: number | null;
     bbox_x1: number | null;
     bbox_y1: number | null;
-};
\ No newline at end of file
+};
+
+export type ExtractionJob = {
+    id: number;
+    document: number;
+    doc_type: string;
+    status: "queued" | "running" | "done" | "failed";
+    error?: string;
+    property: number | null;
+    created_at: string;
+    started_at: string | null;
+    finished_at: string | null;
+    queue_seconds: number | null;
+    run_seconds: number | null;
+};
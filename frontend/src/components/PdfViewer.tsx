@@ -1,98 +1,68 @@
-import { useEffect, useRef, useState } from "react";
-import { getDocument, GlobalWorkerOptions, type PDFDocumentProxy } from "pdfjs-dist";
-import pdfjsWorker from "pdfjs-dist/build/pdf.worker?url";
-GlobalWorkerOptions.workerSrc = pdfjsWorker;
+import { useQuery } from "@tanstack/react-query";
+import { api } from "../api/client";
 
 export type Highlight = { page: number; bbox: [number, number, number, number] };
 
+type PageSize = { page: number; width: number; height: number };
+
+// CSS pixels per PDF point
+const SCALE = 1.2;
+
 export default function PdfViewer({
-  url,
+  documentId,
   highlights,
 }: {
-  url: string;
+  documentId: number;
   highlights: Highlight[];
 }) {
-  const [sizes, setSizes] = useState<{ width: number; height: number }[]>([]);
-  const canvasRefs = useRef<(HTMLCanvasElement | null)[]>([]);
-
-  useEffect(() => {
-    let cancelled = false;
-
-    (async () => {
-      const doc: PDFDocumentProxy = await getDocument(url).promise;
-
-      const pageSizes: { width: number; height: number }[] = [];
-      const viewports: any[] = [];
-
-      // compute sizes first
-      for (let i = 1; i <= doc.numPages; i++) {
-        const page = await doc.getPage(i);
-        const viewport = page.getViewport({ scale: 1.2 });
-        pageSizes.push({
-          width: Math.ceil(viewport.width),
-          height: Math.ceil(viewport.height),
-        });
-        viewports.push(viewport);
-      }
-      if (cancelled) return;
-
-      setSizes(pageSizes); 
-
-      requestAnimationFrame(async () => {
-        for (let i = 1; i <= doc.numPages; i++) {
-          const page = await doc.getPage(i);
-          const canvas = canvasRefs.current[i - 1];
-          if (!canvas) continue;
-          const viewport = viewports[i - 1];
-          canvas.width = Math.ceil(viewport.width);
-          canvas.height = Math.ceil(viewport.height);
-          await page.render({ canvas, viewport }).promise;
-        }
-      });
-    })();
-
-    return () => {
-      cancelled = true;
-    };
-  }, [url]);
-
-  // draw highlight overlays
-  useEffect(() => {
-    sizes.forEach((_, idx) => {
-      const canvas = canvasRefs.current[idx];
-      const ctx = canvas?.getContext("2d");
-      if (!canvas || !ctx) return;
-
-      ctx.save();
-      highlights
-        .filter((h) => h.page === idx)
-        .forEach((h) => {
-          const [x0, y0, x1, y1] = h.bbox;
-          ctx.globalAlpha = 0.2;
-          ctx.fillStyle = "yellow";
-          ctx.fillRect(x0, y0, x1 - x0, y1 - y0);
-          ctx.globalAlpha = 1.0;
-          ctx.lineWidth = 2;
-          ctx.strokeStyle = "orange";
-          ctx.strokeRect(x0, y0, x1 - x0, y1 - y0);
-        });
-      ctx.restore();
-    });
-  }, [sizes, highlights]);
+  // page sizes only; each page is a cached server-rendered image loaded as it scrolls into view
+  const { data } = useQuery({
+    queryKey: ["doc-pages", documentId],
+    queryFn: async () => (await api.get<{ pages: PageSize[] }>(`/documents/${documentId}/pages/`)).data,
+  });
+  const base = api.defaults.baseURL?.replace(/\/$/, "");
+  // render at device resolution, rounded so every client shares the same cached tiles
+  const renderScale = Math.round(SCALE * (window.devicePixelRatio || 1) * 10) / 10;
 
   return (
     <div className="flex flex-col gap-2">
-      {sizes.map((s, i) => (
-        <canvas
-          key={i}
-          width={s.width}
-          height={s.height}
-          ref={(el) => {
-            canvasRefs.current[i] = el;
-          }}
-          style={{ display: "block" }}
-        />
-      ))}
+      {(data?.pages || []).map((p) => {
+        const width = Math.ceil(p.width * SCALE);
+        const height = Math.ceil(p.height * SCALE);
+        return (
+          <div key={p.page} style={{ position: "relative", width, height, background: "#fafafa" }}>
+            <img
+              src={`${base}/documents/${documentId}/pages/${p.page}.webp?scale=${renderScale}`}
+              width={width}
+              height={height}
+              loading="lazy"
+              decoding="async"
+              alt={`Page ${p.page + 1}`}
+              style={{ display: "block" }}
+            />
+            {highlights
+              .filter((h) => h.page === p.page)
+              .map((h, i) => {
+                const [x0, y0, x1, y1] = h.bbox;
+                return (
+                  <div
+                    key={i}
+                    style={{
+                      position: "absolute",
+                      left: x0 * SCALE,
+                      top: y0 * SCALE,
+                      width: (x1 - x0) * SCALE,
+                      height: (y1 - y0) * SCALE,
+                      background: "rgba(255, 255, 0, 0.2)",
+                      border: "2px solid orange",
+                      pointerEvents: "none",
+                    }}
+                  />
+                );
+              })}
+          </div>
+        );
+      })}
     </div>
   );
 }
@@ -2,7 +2,7 @@ import PdfViewer from "./PdfViewer";
 import { type Property, type Section } from "../api/types";
 
 type Props = {
-  docUrl: string;
+  documentId: number;
   property?: Property;
   sections: Section[];
   highlights: {
@@ -13,7 +13,7 @@ type Props = {
   }[];
 };
 
-export default function SideBySide({ docUrl, property, sections, highlights }: Props) {
+export default function SideBySide({ documentId, property, sections, highlights }: Props) {
   const containerStyle: React.CSSProperties = {
     display: "flex",
     flexDirection: "row",
@@ -61,7 +61,7 @@ export default function SideBySide({ docUrl, property, sections, highlights }: P
       {/* Left: PDF Viewer */}
       <div style={pdfContainerStyle}>
         <h3 style={{ margin: "8px 0", fontWeight: "bold" }}>PDF View</h3>
-        <PdfViewer url={docUrl} highlights={highlights} />
+        <PdfViewer documentId={documentId} highlights={highlights} />
       </div>
 
       {/* Right: Property + Sections */}
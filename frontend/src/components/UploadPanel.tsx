@@ -1,11 +1,22 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { Button, ToggleButton, ToggleButtonGroup } from "@mui/material";
-import { useUpload } from "../api/hooks";
+import { useJob, useUpload } from "../api/hooks";
 
 export default function UploadPanel({ onUploaded }: { onUploaded: (docId: number) => void }) {
   const [type, setType] = useState<"flyer" | "rent_roll">("flyer");
   const [file, setFile] = useState<File | null>(null);
+  const [jobId, setJobId] = useState<number | undefined>();
   const upload = useUpload();
+  const { data: job } = useJob(jobId);
+
+  useEffect(() => {
+    if (job?.status === "done") {
+      setJobId(undefined);
+      onUploaded(job.document);
+    }
+  }, [job, onUploaded]);
+
+  const busy = upload.isPending || (!!jobId && job?.status !== "failed");
   return (
     <div className="p-4 flex gap-3 items-center border rounded">
       <ToggleButtonGroup value={type} exclusive onChange={(_, v) => v && setType(v)}>
@@ -13,11 +24,12 @@ export default function UploadPanel({ onUploaded }: { onUploaded: (docId: number
         <ToggleButton value="rent_roll">Rent Roll</ToggleButton>
       </ToggleButtonGroup>
       <input type="file" accept="application/pdf" onChange={(e) => setFile(e.target.files?.[0] || null)} />
-      <Button variant="contained" disabled={!file || upload.isPending} onClick={async () => {
+      <Button variant="contained" disabled={!file || busy} onClick={async () => {
         if (!file) return;
         const res = await upload.mutateAsync({ file, doc_type: type });
-        onUploaded(res.document_id);
+        setJobId(res.job_id);
       }}>Upload & Extract</Button>
+      {job && <span>Extraction: {job.status}{job.error ? ` (${job.error})` : ""}</span>}
     </div>
   );
 }
\ No newline at end of file
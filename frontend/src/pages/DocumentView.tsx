@@ -4,12 +4,6 @@ import { useQuery } from "@tanstack/react-query";
 import { api } from "../api/client";
 import { type Property, type Section } from "../api/types";
 
-function normalizeDocUrl(fileField: string, apiBase = import.meta.env.VITE_API_URL || "http://localhost:8000/api") {
-  try { new URL(fileField); return fileField; } catch {}
-  const origin = apiBase.replace(/\/api\/?$/, "");
-  return fileField.startsWith("/") ? origin + fileField : `${origin}/${fileField}`;
-}
-
 function mapSectionsToHighlights(sections: Section[]) {
   return (sections || [])
     .filter(s => s.page !== null && s.bbox_x0 !== null)
@@ -42,13 +36,12 @@ export default function DocumentView() {
   const property = props?.results?.[0];
   if (!doc) return null;
 
-  const url = normalizeDocUrl(doc.file);
   const highlights = mapSectionsToHighlights(doc.sections || []);
 
   return (
     <div className="p-4">
       <SideBySide
-        docUrl={url}
+        documentId={docId}
         property={property}
         sections={doc.sections}        
         highlights={highlights}        